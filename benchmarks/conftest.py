@@ -0,0 +1,109 @@
+import functools
+import os
+import sys
+import threading
+import tracemalloc
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from datagen import write_farmacias_csv
+
+import pytest
+
+# : synthetic national file sizes, in rows.
+DEFAULT_SIZES = "10000,100000,1000000"
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+base = os.path.dirname(ROOT_DIR)
+# : share the fixtures of the test suite, e.g. ``sqlite_engine``.
+sys.path.insert(0, base)
+from tests.conftest import sqlite_engine  # noqa: E402,F401
+
+national_csv_path = os.path.join(
+    base,
+    "copypharm",
+    "data",
+    "farmacias",
+    "2022-03",
+    "farmacias-27-03-2022.csv",
+)
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--bench-sizes",
+        default=DEFAULT_SIZES,
+        help="Comma separated sizes, in rows, of the synthetic files.",
+    )
+
+
+def pytest_generate_tests(metafunc):
+    if "n_rows" in metafunc.fixturenames:
+        sizes = metafunc.config.getoption("--bench-sizes").split(",")
+        metafunc.parametrize(
+            "n_rows", [int(size) for size in sizes], scope="session"
+        )
+
+
+@pytest.fixture(scope="session")
+def synthetic_csv(tmp_path_factory, n_rows):
+    """A synthetic national file with ``n_rows`` pharmacies."""
+    path = tmp_path_factory.mktemp("synthetic") / f"farmacias-{n_rows}.csv"
+    return str(write_farmacias_csv(path, n_rows))
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="session")
+def file_server(synthetic_csv):
+    """Serve the directory of ``synthetic_csv`` over HTTP on localhost."""
+    handler = functools.partial(
+        QuietHandler, directory=os.path.dirname(synthetic_csv)
+    )
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.url = "http://127.0.0.1:{}/{}".format(
+        server.server_address[1], os.path.basename(synthetic_csv)
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(scope="session")
+def national_csv():
+    return national_csv_path
+
+
+@pytest.fixture(scope="session")
+def large_csv(tmp_path_factory):
+    """The national file repeated ten times (~137k rows)."""
+    path = tmp_path_factory.mktemp("raw") / "farmacias-large.csv"
+    with open(national_csv_path, "rb") as src:
+        header = src.readline()
+        body = src.read()
+    with open(path, "wb") as dst:
+        dst.write(header)
+        for _ in range(10):
+            dst.write(body)
+    return str(path)
+
+
+@pytest.fixture
+def peak_memory(benchmark):
+    """Run a callable under tracemalloc and record its peak allocation."""
+
+    def measure(func, *args, **kwargs):
+        tracemalloc.start()
+        try:
+            func(*args, **kwargs)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        benchmark.extra_info["peak_memory"] = peak
+        return peak
+
+    return measure
@@ -0,0 +1,157 @@
+"""Synthetic ``establecimientos-farmacias`` csv generator.
+
+The generated file has the header, column order, encoding (utf-8 with
+BOM) and provincia mix of the national file published on datos.gob.ar,
+so it exercises ``UrlExtractor`` exactly like the real source::
+
+    python benchmarks/datagen.py 1000000 farmacias-1M.csv
+"""
+
+import csv
+import sys
+
+import numpy as np
+
+import pandas as pd
+
+# : (provincia_id, provincia_nombre, rows in the 2022-03 national file).
+PROVINCIAS = [
+    (2, "CABA", 1024),
+    (6, "BUENOS AIRES", 5053),
+    (10, "CATAMARCA", 180),
+    (14, "CÓRDOBA", 566),
+    (18, "CORRIENTES", 303),
+    (22, "CHACO", 426),
+    (26, "CHUBUT", 185),
+    (30, "ENTRE RÍOS", 489),
+    (34, "FORMOSA", 162),
+    (38, "JUJUY", 184),
+    (42, "LA PAMPA", 262),
+    (46, "LA RIOJA", 155),
+    (50, "MENDOZA", 31),
+    (54, "MISIONES", 594),
+    (58, "NEUQUÉN", 192),
+    (62, "RÍO NEGRO", 273),
+    (66, "SALTA", 337),
+    (70, "SAN JUAN", 228),
+    (74, "SAN LUIS", 238),
+    (78, "SANTA CRUZ", 93),
+    (82, "SANTA FE", 1778),
+    (86, "SANTIAGO DEL ESTERO", 251),
+    (90, "TUCUMÁN", 611),
+    (94, "TIERRA DEL FUEGO", 62),
+]
+
+COLUMNS = [
+    "establecimiento_id",
+    "establecimiento_nombre",
+    "localidad_id",
+    "localidad_nombre",
+    "provincia_id",
+    "provincia_nombre",
+    "departamento_id",
+    "departamento_nombre",
+    "cod_loc",
+    "cod_ent\xa0",
+    "origen_financiamiento",
+    "tipologia_id",
+    "tipologia_nombre",
+    "tipologia",
+    "cp",
+    "domicilio",
+    "sitio_web",
+]
+
+NOMBRES = np.array(
+    [
+        "DEL PUEBLO",
+        "CENTRAL",
+        "SAN MARTIN",
+        "BELGRANO",
+        "SALUDFARMA",
+        "DEL CENTRO",
+        "NUEVA",
+        "ITALIANA",
+        "DEL ÁGUILA",
+        "PASTEUR",
+    ]
+)
+CALLES = np.array(
+    [
+        "Av. San Martín",
+        "Mitre",
+        "Belgrano",
+        "Rivadavia",
+        "Sarmiento",
+        "25 de Mayo",
+        "Güemes",
+        "Independencia",
+    ]
+)
+ORIGENES = np.array(["Privado", "Mutual", "Obra social", "Provincial"])
+
+# : departamentos per provincia and localidades per departamento.
+DEPARTAMENTOS = 8
+LOCALIDADES = 10
+
+
+def generate_farmacias(n_rows, seed=0):
+    """Return a synthetic national frame with ``n_rows`` pharmacies."""
+    rng = np.random.default_rng(seed)
+    weights = np.array([rows for _, _, rows in PROVINCIAS], dtype=float)
+    prov = rng.choice(len(PROVINCIAS), size=n_rows, p=weights / weights.sum())
+    prov_id = np.array([p[0] for p in PROVINCIAS])[prov]
+    prov_name = np.array([p[1] for p in PROVINCIAS])[prov]
+
+    dep = rng.integers(1, DEPARTAMENTOS + 1, size=n_rows) * 7
+    loc = rng.integers(1, LOCALIDADES + 1, size=n_rows) * 10
+    localidad_id = (prov_id * 1000 + dep) * 1_000_000 + loc * 1000
+    establecimiento_id = 70_000_000_000_000 + np.arange(n_rows) * 7 + prov_id
+
+    web = np.where(
+        rng.random(n_rows) < 0.01,
+        pd.Series(establecimiento_id).astype(str).radd("www.f").add(".com.ar"),
+        None,
+    )
+
+    return pd.DataFrame(
+        {
+            "establecimiento_id": establecimiento_id,
+            "establecimiento_nombre": NOMBRES[rng.integers(0, 10, n_rows)],
+            "localidad_id": localidad_id,
+            "localidad_nombre": pd.Series(localidad_id)
+            .astype(str)
+            .radd("LOCALIDAD "),
+            "provincia_id": prov_id,
+            "provincia_nombre": prov_name,
+            "departamento_id": dep,
+            "departamento_nombre": pd.Series(prov_id * 1000 + dep)
+            .astype(str)
+            .radd("DEPARTAMENTO "),
+            "cod_loc": loc,
+            "cod_ent\xa0": np.where(rng.random(n_rows) < 0.03, np.nan, 0.0),
+            "origen_financiamiento": ORIGENES[rng.integers(0, 4, n_rows)],
+            "tipologia_id": 70,
+            "tipologia_nombre": "FARMACIA",
+            "tipologia": "Farmacia ambulatoria comercial",
+            "cp": rng.integers(1000, 9500, size=n_rows),
+            "domicilio": pd.Series(CALLES[rng.integers(0, 8, n_rows)])
+            + " "
+            + pd.Series(rng.integers(1, 5000, n_rows)).astype(str),
+            "sitio_web": web,
+        },
+        columns=COLUMNS,
+    )
+
+
+def write_farmacias_csv(path, n_rows, seed=0):
+    """Write a synthetic national csv with ``n_rows`` pharmacies."""
+    df = generate_farmacias(n_rows, seed)
+    df.to_csv(
+        path, index=False, encoding="utf-8-sig", quoting=csv.QUOTE_NONNUMERIC
+    )
+    return path
+
+
+if __name__ == "__main__":
+    write_farmacias_csv(sys.argv[2], int(sys.argv[1]))
@@ -0,0 +1,28 @@
+"""Download of the synthetic national file from a local HTTP server.
+
+Every round extracts into a fresh ``base_dir``, so the conditional
+request never short-circuits to a ``304 Not Modified``.
+"""
+
+import itertools
+
+from copypharm.extractor import UrlExtractor
+
+
+def test_extract(benchmark, tmp_path, file_server, n_rows):
+    rounds = itertools.count()
+
+    def setup():
+        base_dir = tmp_path / str(next(rounds))
+        extractor = UrlExtractor(
+            "farmacias", file_server.url, base_dir=base_dir
+        )
+        return (extractor,), {}
+
+    def extract(extractor):
+        extractor.extract("2022-03-27")
+        return extractor
+
+    extractor = benchmark.pedantic(extract, setup=setup, rounds=3)
+    benchmark.extra_info.update(extractor.stats)
+    assert extractor.stats["status"] == 200
@@ -0,0 +1,41 @@
+"""Full and incremental loads of the synthetic tables into SQLite."""
+
+from copypharm import core, loaders
+from copypharm.extractor import UrlExtractor
+
+import pytest
+
+
+@pytest.fixture
+def tables(synthetic_csv):
+    """The tables of the largest provincia of the synthetic file."""
+    extractor = UrlExtractor("farmacias", url=None)
+    frames = extractor.read_provincias(synthetic_csv, ["BUENOS AIRES"])
+    df = extractor.transform(frames["BUENOS AIRES"])
+    farmacias, localidades, departamentos = core.split_provincia(df)
+    return [
+        (loaders.FarmaciasLoader(), farmacias),
+        (loaders.LocalidadesLoader(), localidades),
+        (loaders.DepartamentosLoader(), departamentos),
+    ]
+
+
+def test_load_tables(benchmark, sqlite_engine, tables, n_rows):
+    results = benchmark.pedantic(loaders.load_tables, args=(tables,), rounds=3)
+    assert results["farmacias"]["result"] == len(tables[0][1])
+
+
+def test_upsert_farmacias(benchmark, sqlite_engine, tables, n_rows):
+    loader, farmacias = tables[0]
+    loader.load_table(farmacias)
+
+    # one row in a hundred changes its address between snapshots.
+    changed = farmacias.copy()
+    changed.iloc[::100, changed.columns.get_loc("domicilio")] = "Nueva 123"
+
+    def setup():
+        loader.load_table(farmacias)
+        return (changed,), {}
+
+    changes = benchmark.pedantic(loader.upsert_table, setup=setup, rounds=3)
+    assert len(changes.updates) == len(changed.iloc[::100])
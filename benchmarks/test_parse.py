@@ -0,0 +1,54 @@
+"""Raw csv parsing: default ``read_csv`` versus ``UrlExtractor.read_raw``.
+
+Run with ``pytest benchmarks/test_parse.py``; the peak memory of every
+variant is stored in the ``extra_info`` of its benchmark.
+"""
+
+import importlib.util
+
+from copypharm.extractor import UrlExtractor
+
+import pandas as pd
+
+import pytest
+
+extractor = UrlExtractor("farmacias", url=None)
+
+has_pyarrow = importlib.util.find_spec("pyarrow") is not None
+
+
+def read_default(path):
+    return extractor.transform(pd.read_csv(path))
+
+
+def read_pruned(path):
+    return extractor.transform(extractor.read_raw(path))
+
+
+def read_pruned_pyarrow(path):
+    return extractor.transform(extractor.read_raw(path, engine="pyarrow"))
+
+
+VARIANTS = [
+    pytest.param(read_default, id="default"),
+    pytest.param(read_pruned, id="usecols-dtypes"),
+    pytest.param(
+        read_pruned_pyarrow,
+        id="usecols-dtypes-pyarrow",
+        marks=pytest.mark.skipif(not has_pyarrow, reason="needs pyarrow"),
+    ),
+]
+
+
+@pytest.mark.parametrize("read", VARIANTS)
+def test_parse_national(benchmark, peak_memory, national_csv, read):
+    peak_memory(read, national_csv)
+    df = benchmark(read, national_csv)
+    assert len(df) == 13677
+
+
+@pytest.mark.parametrize("read", VARIANTS)
+def test_parse_large(benchmark, peak_memory, large_csv, read):
+    peak_memory(read, large_csv)
+    df = benchmark(read, large_csv)
+    assert len(df) == 136770
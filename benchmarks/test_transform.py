@@ -0,0 +1,77 @@
+"""Transform of the synthetic national file for one provincia."""
+
+from copypharm import core
+from copypharm.dimensions import DIMENSIONS
+from copypharm.extractor import UrlExtractor
+
+import pytest
+
+PROVINCIAS = ["FORMOSA", "BUENOS AIRES"]
+
+
+@pytest.fixture
+def configured_core(monkeypatch, tmp_path):
+    extractor = UrlExtractor("farmacias", url=None, base_dir=tmp_path)
+    monkeypatch.setattr(core, "BASE_FILE_DIR", tmp_path)
+    monkeypatch.setattr(core, "data_extractors", {"farmacias": extractor})
+    return core
+
+
+def test_transform(benchmark, synthetic_csv, n_rows):
+    extractor = UrlExtractor("farmacias", url=None)
+    df = extractor.read_raw(synthetic_csv)
+
+    result = benchmark(extractor.transform, df)
+    assert len(result) == n_rows
+
+
+@pytest.mark.parametrize("provincia", PROVINCIAS)
+def test_trasform_raws(
+    benchmark, monkeypatch, configured_core, synthetic_csv, provincia
+):
+    monkeypatch.setattr(core, "provincia", provincia)
+    file_paths = {"farmacias": synthetic_csv}
+
+    paths = benchmark(core.trasform_raws, "2022-03-27", file_paths)
+    assert len(paths) == 3
+
+
+def groupby_split(df):
+    """The ``groupby().count()`` split replaced by ``build_dimension``."""
+    dimensions = [
+        df.groupby([key, name], as_index=False, observed=True)
+        .count()[[key, name]]
+        .set_index(key)
+        for key, name in DIMENSIONS.values()
+    ]
+    farmacias = df[
+        [
+            "id",
+            "nombre",
+            "id_localidad",
+            "id_departamento",
+            "codigo_postal",
+            "domicilio",
+        ]
+    ].set_index("id")
+    return [farmacias] + dimensions
+
+
+@pytest.mark.benchmark(group="split_provincia")
+def test_split_provincia(benchmark, synthetic_csv, n_rows):
+    extractor = UrlExtractor("farmacias", url=None)
+    df = extractor.transform(extractor.read_raw(synthetic_csv))
+
+    tables = benchmark(core.split_provincia, df)
+    assert len(tables[0]) == n_rows
+
+
+@pytest.mark.benchmark(group="split_provincia")
+def test_split_provincia_groupby(benchmark, synthetic_csv, n_rows):
+    extractor = UrlExtractor("farmacias", url=None)
+    df = extractor.transform(extractor.read_raw(synthetic_csv))
+
+    tables = benchmark(groupby_split, df)
+    assert len(tables[0]) == n_rows
+    for old, new in zip(tables[1:], core.split_provincia(df)[1:]):
+        assert old.index.unique().equals(new.index)
@@ -29,9 +29,157 @@ __version__ = "0.1a"
 # IMPORTS
 # =============================================================================
 
-from .constants import *  # noqa
-from .core import *  # noqa
-from .extractor import *  # noqa
-from .loaders import *  # noqa
-from .scripts import *  # noqa
-from .settings import *  # noqa
+import importlib
+
+# : the submodules and public names of the package. They are imported on
+# : first access (PEP 562), so ``import copypharm`` does not pay for
+# : pandas, requests, click or sqlalchemy.
+_SUBMODULES = {
+    "cache",
+    "changes",
+    "constants",
+    "core",
+    "db",
+    "dimensions",
+    "extractor",
+    "index",
+    "loaders",
+    "metrics",
+    "objects",
+    "profiling",
+    "rollups",
+    "scripts",
+    "search",
+    "settings",
+    "storage",
+    "versions",
+}
+
+_LAZY_ATTRS = {
+    "cache": [
+        "StageCache",
+        "code_version",
+        "content_digest",
+        "fingerprint",
+    ],
+    "changes": ["ChangeSet", "diff_frames"],
+    "constants": [
+        "BASE_FILE_DIR",
+        "ROOT_DIR",
+        "SQL_DIR",
+        "DEPARTAMENTOS_TABLE_NAME",
+        "LOCALIDADES_TABLE_NAME",
+        "FARMACIAS_TABLE_NAME",
+        "TABLE_NAMES",
+        "LOCALIDAD_ROLLUP_TABLE_NAME",
+        "DEPARTAMENTO_ROLLUP_TABLE_NAME",
+        "CODIGO_POSTAL_ROLLUP_TABLE_NAME",
+        "LOAD_VERSIONS_TABLE_NAME",
+        "DOWNLOAD_CHUNK_SIZE",
+        "EXTRACT_MAX_WORKERS",
+        "EXTRACT_PER_HOST",
+        "EXTRACT_RETRIES",
+        "EXTRACT_BACKOFF_FACTOR",
+        "EXTRACT_BUDGET",
+        "REQUEST_TIMEOUT",
+        "RAW_CHUNK_SIZE",
+        "LOAD_CHUNKSIZE",
+    ],
+    "core": [
+        "data_extractors",
+        "provincia",
+        "csv_engine",
+        "storage_format",
+        "extract_raws",
+        "dated_path",
+        "store_frame",
+        "split_provincia",
+        "keymap_path",
+        "build_provincia",
+        "trasform_raws",
+        "apply_keymaps",
+        "search_index_path",
+        "store_search_index",
+        "trasform_provincias",
+        "store_changes",
+        "previous_dated",
+        "store_rollups",
+        "load_rollups",
+        "date_range",
+        "backfill",
+        "run_pipeline",
+    ],
+    "db": ["get_engine", "dispose_engine"],
+    "dimensions": ["DIMENSIONS", "KeyMap", "build_dimension"],
+    "extractor": ["STRING_DTYPE", "build_session", "UrlExtractor"],
+    "index": ["PharmacyIndex", "save_arrays", "load_arrays"],
+    "loaders": [
+        "BaseLoader",
+        "FarmaciasLoader",
+        "LocalidadesLoader",
+        "DepartamentosLoader",
+        "RollupLoader",
+        "load_tables",
+    ],
+    "metrics": ["RunReport", "peak_rss", "file_size"],
+    "objects": ["ObjectStore", "file_sha256", "link_file"],
+    "profiling": ["StageProfiler"],
+    "rollups": [
+        "ROLLUPS",
+        "build_rollup",
+        "apply_changes",
+        "rollup_tables",
+    ],
+    "scripts": [
+        "FOREIGN_KEYS",
+        "LOOKUP_INDEXES",
+        "create_table",
+        "build_constraints",
+        "create_schema",
+    ],
+    "search": ["SearchIndex", "normalize", "trigrams"],
+    "settings": [
+        "config",
+        "cfg",
+        "cfg_data",
+        "setup_data",
+        "farmacias_ds",
+        "engine_options",
+    ],
+    "storage": [
+        "STORAGE_SUFFIXES",
+        "storage_path",
+        "write_frame",
+        "read_frame",
+    ],
+    "versions": [
+        "load_versions",
+        "ensure_versions_table",
+        "record_load",
+        "load_version",
+        "table_versions",
+    ],
+}
+
+_ATTR_MODULES = {
+    attr: module for module, attrs in _LAZY_ATTRS.items() for attr in attrs
+}
+
+__all__ = sorted(_ATTR_MODULES)
+
+
+def __getattr__(name):
+    """Import the submodules and their public names on first access."""
+    if name in _SUBMODULES:
+        return importlib.import_module(f".{name}", __name__)
+    if name in _ATTR_MODULES:
+        module = importlib.import_module(f".{_ATTR_MODULES[name]}", __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    """List the lazily imported names too."""
+    return sorted(set(globals()) | _SUBMODULES | set(_ATTR_MODULES))
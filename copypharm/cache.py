@@ -0,0 +1,167 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of the CoPyPharm Project
+#     https://github.com/juniors90/CoPyPharm.
+#
+# Copyright (c) 2022. Ferreira Juan David
+# License: MIT
+#   Full Text: https://github.com/pyCellID/CoPyPharm/blob/main/LICENSE
+
+# =============================================================================
+# DOCS
+# =============================================================================
+
+"""
+CoPyPharm.
+
+An extension that registers all pharmacies in Córdoba - Argentina.
+"""
+
+# =============================================================================
+# IMPORTS
+# =============================================================================
+
+import functools
+import hashlib
+import json
+import logging
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from .metrics import _write_atomic
+from .objects import file_sha256
+
+log = logging.getLogger()
+
+
+@functools.lru_cache(maxsize=None)
+def code_version() -> str:
+    """Return the package version and a digest of its source code.
+
+    Any edit of a module of the package changes the digest, so stage
+    outputs built by other code are never reused.
+    """
+    from . import __version__
+
+    digest = hashlib.sha256()
+    for path in sorted(Path(__file__).parent.glob("*.py")):
+        digest.update(path.name.encode())
+        digest.update(path.read_bytes())
+    return f"{__version__}+{digest.hexdigest()[:12]}"
+
+
+def content_digest(data) -> str:
+    """Return the sha256 of a stored file or of a data frame.
+
+    Parameters
+    ----------
+    data : str, Path or ``pandas.DataFrame``
+        The file or the in-memory table.
+
+    Return
+    ------
+    digest : str
+        The hex digest of the content.
+    """
+    if isinstance(data, pd.DataFrame):
+        hashes = pd.util.hash_pandas_object(data, index=True)
+        digest = hashlib.sha256(hashes.to_numpy().tobytes())
+        digest.update(repr(list(data.columns)).encode())
+        return digest.hexdigest()
+    return file_sha256(data)
+
+
+def fingerprint(**inputs) -> str:
+    """Return the sha256 of the inputs and parameters of a stage.
+
+    Parameters
+    ----------
+    **inputs
+        The JSON serializable inputs of the stage, e.g. the sha256 of
+        its source files and its parameters. The code version is always
+        added.
+
+    Return
+    ------
+    fingerprint : str
+        The hex digest of the inputs.
+    """
+    inputs["code_version"] = code_version()
+    payload = json.dumps(inputs, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class StageCache(object):
+    """Record the completed stages by the fingerprint of their inputs.
+
+    A stage run again with the same fingerprint is skipped and its
+    recorded outputs are reused, as long as they still exist.
+
+    Parameters
+    ----------
+    path : str or Path
+        The location of the JSON file of the cache.
+    force : bool, optional (default=False)
+        If ``True`` every lookup misses, so every stage runs again and
+        records its new outputs.
+    """
+
+    def __init__(self, path, force=False) -> None:
+        self.path = Path(path)
+        self.force = force
+        try:
+            with open(self.path) as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            self.entries = {}
+
+    def __repr__(self) -> str:
+        """Print a representation of your object."""
+        return f"<StageCache with {len(self.entries)} stages>"
+
+    def lookup(self, key: str, fingerprint: str):
+        """Return the outputs of a completed stage, or ``None``.
+
+        Parameters
+        ----------
+        key : str
+            The name of the stage, e.g. ``2022-03-27/trasform_raws``.
+        fingerprint : str
+            The fingerprint of the inputs of the stage.
+
+        Return
+        ------
+        outputs : list[str] or None
+            The recorded outputs, or ``None`` if the stage must run.
+        """
+        entry = self.entries.get(key)
+        if self.force or entry is None:
+            return None
+        if entry["fingerprint"] != fingerprint:
+            return None
+        if not all(Path(p).exists() for p in entry["outputs"]):
+            return None
+        log.info(f"{key} is up to date, skipping it")
+        return entry["outputs"]
+
+    def record(self, key: str, fingerprint: str, outputs=()) -> None:
+        """Record a completed stage and store the cache.
+
+        Parameters
+        ----------
+        key : str
+            The name of the stage.
+        fingerprint : str
+            The fingerprint of the inputs of the stage.
+        outputs : list[str], optional (default=())
+            The files produced by the stage.
+        """
+        self.entries[key] = {
+            "fingerprint": fingerprint,
+            "outputs": [str(p) for p in outputs],
+            "completed_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        _write_atomic(self.path, json.dumps(self.entries, indent=2) + "\n")
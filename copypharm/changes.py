@@ -0,0 +1,124 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of the CoPyPharm Project
+#     https://github.com/juniors90/CoPyPharm.
+#
+# Copyright (c) 2022. Ferreira Juan David
+# License: MIT
+#   Full Text: https://github.com/pyCellID/CoPyPharm/blob/main/LICENSE
+
+# =============================================================================
+# DOCS
+# =============================================================================
+
+"""
+CoPyPharm.
+
+An extension that registers all pharmacies in Córdoba - Argentina.
+"""
+
+# =============================================================================
+# IMPORTS
+# =============================================================================
+
+import pandas as pd
+
+
+class ChangeSet(object):
+    """The rows inserted, updated and deleted between two snapshots.
+
+    Parameters
+    ----------
+    key : str
+        The name of the column that identifies each row.
+    inserts : ``pandas.DataFrame``
+        The rows whose key is only in the new snapshot.
+    updates : ``pandas.DataFrame``
+        The new values of the rows whose key is in both snapshots but
+        whose values changed.
+    deletes : ``pandas.DataFrame``
+        The old values of the rows whose key is only in the old snapshot.
+    before : ``pandas.DataFrame``, optional (default=None)
+        The old values of the updated rows, in the order of ``updates``.
+        It lets aggregates be updated from the change set alone.
+    """
+
+    ops = ("insert", "update", "delete")
+
+    def __init__(self, key, inserts, updates, deletes, before=None) -> None:
+        self.key = key
+        self.inserts = inserts
+        self.updates = updates
+        self.deletes = deletes
+        self.before = updates.iloc[:0] if before is None else before
+
+    def __repr__(self) -> str:
+        """Print a representation of your object."""
+        changes = "<ChangeSet on {key}: +{i} ~{u} -{d}>"
+        return changes.format(
+            key=self.key,
+            i=len(self.inserts),
+            u=len(self.updates),
+            d=len(self.deletes),
+        )
+
+    def __len__(self) -> int:
+        """Return the total number of changed rows."""
+        return len(self.inserts) + len(self.updates) + len(self.deletes)
+
+    def to_frame(self) -> pd.DataFrame:
+        """Return the change set as a single frame with an ``op`` column.
+
+        Return
+        ------
+            df : pd.DataFrame
+                The changed rows, with ``op`` set to ``"insert"``,
+                ``"update"`` or ``"delete"``.
+        """
+        frames = [
+            frame.assign(op=op)
+            for op, frame in zip(
+                self.ops, (self.inserts, self.updates, self.deletes)
+            )
+        ]
+        return pd.concat(frames, ignore_index=True)
+
+
+def diff_frames(old: pd.DataFrame, new: pd.DataFrame, key: str) -> ChangeSet:
+    """Compare two snapshots of a table by ``key``.
+
+    Parameters
+    ----------
+    old : ``pandas.DataFrame``
+        The previous snapshot of the table.
+    new : ``pandas.DataFrame``
+        The current snapshot of the table, with the same columns.
+    key : str
+        The name of the column that identifies each row.
+
+    Return
+    ------
+    changes : ChangeSet
+        The rows inserted, updated and deleted from ``old`` to ``new``.
+    """
+    cols = list(new.columns)
+    old = old[cols].astype(object).set_index(key)
+    new = new[cols].astype(object).set_index(key)
+
+    inserted = new.index.difference(old.index)
+    deleted = old.index.difference(new.index)
+    common = new.index.intersection(old.index)
+
+    old_common = old.loc[common]
+    new_common = new.loc[common]
+    same = (old_common == new_common) | (old_common.isna() & new_common.isna())
+    updated = common[~same.all(axis=1).to_numpy()]
+
+    return ChangeSet(
+        key,
+        inserts=new.loc[inserted].reset_index()[cols],
+        updates=new.loc[updated].reset_index()[cols],
+        deletes=old.loc[deleted].reset_index()[cols],
+        before=old.loc[updated].reset_index()[cols],
+    )
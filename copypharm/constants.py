@@ -39,3 +39,32 @@ TABLE_NAMES = [
     LOCALIDADES_TABLE_NAME,
     FARMACIAS_TABLE_NAME,
 ]
+
+# : the rollup tables with the number of farmacias by localidad,
+# : departamento and código postal.
+LOCALIDAD_ROLLUP_TABLE_NAME = "farmacias_por_localidad"
+DEPARTAMENTO_ROLLUP_TABLE_NAME = "farmacias_por_departamento"
+CODIGO_POSTAL_ROLLUP_TABLE_NAME = "farmacias_por_codigo_postal"
+
+# : the metadata table with a version row per load that changed a table.
+LOAD_VERSIONS_TABLE_NAME = "load_versions"
+
+# : size in bytes of each chunk written while streaming a download.
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# : bounded concurrency, per-host limit, retries and wall-clock budget
+# : (in seconds) used by ``core.extract_raws``.
+EXTRACT_MAX_WORKERS = 4
+EXTRACT_PER_HOST = 2
+EXTRACT_RETRIES = 3
+EXTRACT_BACKOFF_FACTOR = 0.5
+EXTRACT_BUDGET = 30 * 60
+
+# : timeout in seconds of each HTTP request (connect, read).
+REQUEST_TIMEOUT = (10, 60)
+
+# : number of rows of each chunk read while streaming a raw csv file.
+RAW_CHUNK_SIZE = 50_000
+
+# : number of rows sent to the database in each bulk insert statement.
+LOAD_CHUNKSIZE = 1000
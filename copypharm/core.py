@@ -22,18 +22,52 @@ An extension that registers all pharmacies in Córdoba - Argentina.
 # IMPORTS
 # =============================================================================
 
+import json
 import logging
-from datetime import datetime
-from typing import Dict, List
+import threading
+from concurrent.futures import (
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
 
 import click
 
 import pandas as pd
 
-from .constants import BASE_FILE_DIR
-from .extractor import UrlExtractor  # analizar
-from .loaders import DepartamentosLoader, FarmaciasLoader, LocalidadesLoader
+from sqlalchemy import inspect
+
+from .cache import StageCache, content_digest, fingerprint
+from .constants import (
+    BASE_FILE_DIR,
+    EXTRACT_BUDGET,
+    EXTRACT_MAX_WORKERS,
+    EXTRACT_PER_HOST,
+)
+from .db import get_engine
+from .dimensions import DIMENSIONS, KeyMap, build_dimension
+from .extractor import UrlExtractor, build_session  # analizar
+from .loaders import (
+    DepartamentosLoader,
+    FarmaciasLoader,
+    LocalidadesLoader,
+    RollupLoader,
+    load_tables,
+)
+from .metrics import RunReport, _write_atomic, file_size
+from .objects import ObjectStore, file_sha256, link_file
+from .profiling import StageProfiler
+from .rollups import ROLLUPS, rollup_tables
+from .scripts import build_constraints
+from .search import SearchIndex
 from .settings import farmacias_ds
+from .storage import read_frame, storage_path, write_frame
+from .versions import table_versions
 
 log = logging.getLogger()
 
@@ -42,59 +76,187 @@ data_extractors = {
 }
 
 provincia = farmacias_ds["provincia"]
+csv_engine = farmacias_ds["csv_engine"]
+storage_format = farmacias_ds["storage_format"]
 
 
-def extract_raws(date_str: str) -> Dict[str, str]:
+def extract_raws(
+    date_str: str,
+    max_workers: int = EXTRACT_MAX_WORKERS,
+    per_host: int = EXTRACT_PER_HOST,
+    budget: float = EXTRACT_BUDGET,
+) -> Dict[str, str]:
     """
     Read files from `source <datos.gob.ar>`_ and extract the data.
 
     Create a dataframe with the data and rewrite headers format.
     Save all dataframes as `.csv` file.
 
+    All extractors share one connection-pooled session with retries and
+    run concurrently on a bounded thread pool, so the extraction takes
+    about the time of the slowest source instead of the sum of them.
+    The extractors get their own sessions back when it returns, and
+    the downloads still running after a timeout are cancelled before
+    they write again.
+
     Parameters
     ----------
     date_str : str
         The date on run with format YYYY-mm-dd.
+    max_workers : int, optional (default=4)
+        Maximum number of sources extracted at the same time.
+    per_host : int, optional (default=2)
+        Maximum number of concurrent downloads from the same host.
+    budget : float, optional (default=1800)
+        Total wall-clock budget in seconds for the whole extraction.
 
     Return
     ------
     file_paths : dict[str]
         A dict of stored data file paths.
+
+    Raises
+    ------
+    TimeoutError
+        If the extraction does not finish within ``budget`` seconds.
     """
-    file_paths = dict()
-    for name, extractor in data_extractors.items():
-        file_path = extractor.extract(date_str)
-        file_paths[name] = file_path
+    session = build_session(pool_maxsize=max(max_workers, per_host))
+    host_limits = {
+        urlparse(extractor.url).netloc: threading.BoundedSemaphore(per_host)
+        for extractor in data_extractors.values()
+    }
+
+    cancel = threading.Event()
+
+    def _extract(extractor):
+        with host_limits[urlparse(extractor.url).netloc]:
+            file_path = extractor.extract(date_str, cancel)
+        return extractor.convert_raw(
+            file_path, storage_format, engine=csv_engine
+        )
+
+    sessions = {name: e.session for name, e in data_extractors.items()}
+    for extractor in data_extractors.values():
+        extractor.session = session
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    futures = {}
+    try:
+        futures = {
+            name: executor.submit(_extract, extractor)
+            for name, extractor in data_extractors.items()
+        }
+        _, not_done = wait(futures.values(), timeout=budget)
+        if not_done:
+            pending = [n for n, f in futures.items() if f in not_done]
+            raise TimeoutError(
+                f"Extraction exceeded its budget of {budget}s: {pending}"
+            )
+        file_paths = {name: f.result() for name, f in futures.items()}
+    finally:
+        # the queued extractions are cancelled and the running downloads
+        # stop before their next write, so the session is closed when the
+        # last one ends.
+        executor.shutdown(wait=False, cancel_futures=True)
+        cancel.set()
+        for name, extractor in data_extractors.items():
+            extractor.session = sessions[name]
+        running = [f for f in futures.values() if not f.done()]
+
+        def _close_session(_=None):
+            if all(f.done() for f in running):
+                session.close()
+
+        for future in running:
+            future.add_done_callback(_close_session)
+        _close_session()
     return file_paths
 
 
-def trasform_raws(date_str: str, file_paths) -> List[str]:
+def dated_path(
+    category: str, date_str: str, base_dir=BASE_FILE_DIR, fmt: str = "csv"
+):
     """
-    Read files from `source <datos.gob.ar>`_ and extract the data.
+    Return the location of a file of the dated ``data/`` tree.
 
-    Create a dataframe with the data and rewrite headers format.
-    Save all dataframes as `.csv` file.
+    The parent directory is created if it does not exist.
 
     Parameters
     ----------
+    category : str
+        The name of the data stored in the file.
     date_str : str
         The date on run with format YYYY-mm-dd.
-    file_paths : str
+    base_dir : str or Path, optional (default=BASE_FILE_DIR)
+        The directory under which the ``data/`` tree is stored.
+    fmt : str, optional (default="csv")
+        The storage format: ``"csv"``, ``"parquet"`` or ``"feather"``.
+
+    Return
+    ------
+    f_path : Path
         The destination location.
+    """
+    date = datetime.strptime(date_str, "%Y-%m-%d").date()
+    file_path_crib = "data/{category}/{year}-{month:02d}/{category}-{day:02d}-{month:02d}-{year}.csv"  # noqa: E501
+    file_path = file_path_crib.format(
+        category=category, year=date.year, month=date.month, day=date.day
+    )
+    f_path = storage_path(Path(base_dir) / file_path, fmt)
+    f_path.parent.mkdir(parents=True, exist_ok=True)
+    return f_path
+
+
+def store_frame(df, f_path, base_dir=BASE_FILE_DIR):
+    """
+    Store a table of the dated ``data/`` tree in the object store.
+
+    The file is written with ``write_frame`` and replaced with a
+    hardlink to its object, so a table identical to the one of another
+    date takes no extra disk space.
 
+    Parameters
+    ----------
+    df : ``pandas.DataFrame``
+        The table to store.
+    f_path : str or Path
+        The destination location.
+    base_dir : str or Path, optional (default=BASE_FILE_DIR)
+        The directory under which the ``data/`` tree is stored.
 
     Return
     ------
-    data_paths : list[str]
-        The destination location of data trasform.
+    f_path : Path
+        The destination location.
     """
-    for name, extractor in data_extractors.items():
-        df = pd.read_csv(file_paths[name])
-        dft = extractor.transform(df)
+    f_path = write_frame(df, f_path)
+    ObjectStore.for_base_dir(base_dir).put(f_path)
+    return f_path
+
 
-    df = dft[dft["provincia"] == provincia]
+def split_provincia(df, keymaps=None):
+    """
+    Split the transformed data of a provincia into its tables.
+
+    The ``localidades`` and ``departamentos`` tables are built with
+    ``build_dimension``, so a member with several spellings appears
+    once and the conflicts are reported.
+
+    Parameters
+    ----------
+    df : ``pandas.DataFrame``
+        The transformed data of the provincia.
+    keymaps : dict[str, ``KeyMap``], optional (default=None)
+        The known members of the ``localidades`` and ``departamentos``
+        tables, whose names are kept; the new members are appended.
 
-    df_cordoba = df[
+    Return
+    ------
+    tables : list[``pandas.DataFrame``]
+        The ``farmacias``, ``localidades`` and ``departamentos`` tables,
+        indexed by their ids.
+    """
+    df_farmacias = df[
         [
             "id",
             "nombre",
@@ -105,43 +267,864 @@ def trasform_raws(date_str: str, file_paths) -> List[str]:
         ]
     ].set_index("id")
 
-    df_localidades = (
-        df.groupby(["id_localidad", "localidad"], as_index=False)
-        .count()[["id_localidad", "localidad"]]
-        .set_index("id_localidad")
-    )
+    keymaps = keymaps or {}
+    dimensions = [
+        build_dimension(df, key, name, keymaps.get(table))[0]
+        for table, (key, name) in DIMENSIONS.items()
+    ]
+    return [df_farmacias] + dimensions
 
-    df_departamentos = (
-        df.groupby(["id_departamento", "nombre_departamento"], as_index=False)
-        .count()[["id_departamento", "nombre_departamento"]]
-        .set_index("id_departamento")
-    )
 
-    date = datetime.strptime(date_str, "%Y-%m-%d").date()
-    file_path_crib = "data/{category}/{year}-{month:02d}/{category}-{day:02d}-{month:02d}-{year}.csv"  # noqa: E501
+def keymap_path(table_name: str, prov: str = None) -> Path:
+    """
+    Return the location of the key map of a dimension table.
+
+    Key maps are kept by provincia, since the ``id_departamento`` of
+    different provincias overlap.
+
+    Parameters
+    ----------
+    table_name : str
+        ``"localidades"`` or ``"departamentos"``.
+    prov : str, optional (default=None)
+        The name of the provincia, by default the configured one.
+
+    Return
+    ------
+    path : Path
+        The location of the ``KeyMap``, in the storage format.
+    """
+    slug = (prov or provincia).lower().replace(" ", "_")
+    path = Path(BASE_FILE_DIR) / "data" / "keymaps" / slug / table_name
+    return storage_path(path, storage_format)
+
+
+def provincia_categories(prov: str, suffix: bool = False) -> List[str]:
+    """
+    Return the names of the stored tables of a provincia.
+
+    Parameters
+    ----------
+    prov : str
+        The name of the provincia.
+    suffix : bool, optional (default=False)
+        If ``True`` the ``localidades`` and ``departamentos`` files are
+        also named after the provincia.
+
+    Return
+    ------
+    names : list[str]
+        The categories of the ``farmacias``, ``localidades`` and
+        ``departamentos`` files.
+    """
+    slug = prov.lower().replace(" ", "_")
+    names = [f"farmacias_de_{slug}", "localidades", "departamentos"]
+    if suffix:
+        names = [names[0]] + [f"{name}_de_{slug}" for name in names[1:]]
+    return names
+
+
+def build_provincia(
+    date_str: str,
+    prov: str,
+    df,
+    suffix: bool = False,
+    base_dir=BASE_FILE_DIR,
+    fmt: str = "csv",
+) -> List[str]:
+    """
+    Build and store the tables of a single provincia.
+
+    Split the transformed data of ``prov`` into the ``farmacias``,
+    ``localidades`` and ``departamentos`` tables and save them as
+    `.csv` files.
+
+    Parameters
+    ----------
+    date_str : str
+        The date on run with format YYYY-mm-dd.
+    prov : str
+        The name of the provincia.
+    df : ``pandas.DataFrame``
+        The transformed data of the provincia.
+    suffix : bool, optional (default=False)
+        If ``True`` the ``localidades`` and ``departamentos`` files are
+        also named after the provincia, so several provincias can be
+        stored for the same date.
+    base_dir : str or Path, optional (default=BASE_FILE_DIR)
+        The directory under which the ``data/`` tree is stored.
+    fmt : str, optional (default="csv")
+        The storage format: ``"csv"``, ``"parquet"`` or ``"feather"``.
+
+    Return
+    ------
+    data_paths : list[str]
+        The destination location of data trasform.
+    """
+    data_paths = [
+        dated_path(name, date_str, base_dir, fmt)
+        for name in provincia_categories(prov, suffix)
+    ]
+    for table, f_path in zip(split_provincia(df), data_paths):
+        store_frame(table, f_path, base_dir)
+    return data_paths
+
+
+def trasform_frames(file_paths, keymaps: bool = True):
+    """
+    Transform the raw files in memory, without storing them.
+
+    The names of the ``localidades`` and ``departamentos`` are kept
+    stable with the key maps of ``keymap_path``, which are stored again
+    when new members are appended.
+
+    Parameters
+    ----------
+    file_paths : str
+        The destination location.
+    keymaps : bool, optional (default=True)
+        If ``False`` the key maps are neither read nor stored, e.g. on
+        the worker processes of ``backfill``, which applies them
+        afterwards with ``apply_keymaps``.
+
+    Return
+    ------
+    tables : list[``pandas.DataFrame``]
+        The ``farmacias``, ``localidades`` and ``departamentos`` tables
+        of the configured provincia, as ``trasform_raws`` stores them.
+    """
+    for name, extractor in data_extractors.items():
+        frames = extractor.read_provincias(
+            file_paths[name], [provincia], engine=csv_engine
+        )
+        df = extractor.transform(frames[provincia])
+
+    if not keymaps:
+        return split_provincia(df)
+    return _split_keymapped(df)
+
+
+def _split_keymapped(df):
+    """Split ``df`` with the key maps of ``keymap_path`` and store them."""
+    keymaps = {
+        table: KeyMap.load(keymap_path(table), key, name)
+        for table, (key, name) in DIMENSIONS.items()
+    }
+    tables = split_provincia(df, keymaps)
+    for table, keymap in keymaps.items():
+        if keymap.appended:
+            keymap.save(keymap_path(table))
+    return tables
+
+
+def persist_frames(date_str: str, tables, executor=None):
+    """
+    Store the in-memory tables where ``trasform_raws`` would.
+
+    Parameters
+    ----------
+    date_str : str
+        The date on run with format YYYY-mm-dd.
+    tables : list[``pandas.DataFrame``]
+        The tables returned by ``trasform_frames``.
+    executor : ``concurrent.futures.Executor``, optional (default=None)
+        If given the files are written asynchronously on it.
+
+    Return
+    ------
+    data_paths : list[str] or list[``concurrent.futures.Future``]
+        The destination location of every table, or the futures that
+        resolve to them when ``executor`` is given.
+    """
+    data_paths = [
+        dated_path(name, date_str, BASE_FILE_DIR, storage_format)
+        for name in provincia_categories(provincia)
+    ]
+    if executor is None:
+        return [
+            store_frame(t, p, BASE_FILE_DIR)
+            for t, p in zip(tables, data_paths)
+        ]
+    return [
+        executor.submit(store_frame, t, p, BASE_FILE_DIR)
+        for t, p in zip(tables, data_paths)
+    ]
+
+
+def trasform_raws(
+    date_str: str,
+    file_paths,
+    keymaps: bool = True,
+    search_index: bool = True,
+) -> List[str]:
+    """
+    Read files from `source <datos.gob.ar>`_ and extract the data.
+
+    Create a dataframe with the data and rewrite headers format.
+    Save all dataframes as `.csv` file.
+
+    Parameters
+    ----------
+    date_str : str
+        The date on run with format YYYY-mm-dd.
+    file_paths : str
+        The destination location.
+    keymaps : bool, optional (default=True)
+        If ``False`` the key maps are not used, see ``trasform_frames``.
+    search_index : bool, optional (default=True)
+        If ``False`` the search index is not stored, e.g. on the worker
+        processes of ``backfill``, which builds it afterwards with
+        ``store_search_index``.
+
+    Return
+    ------
+    data_paths : list[str]
+        The destination location of data trasform.
+    """
+    tables = trasform_frames(file_paths, keymaps)
+    data_paths = persist_frames(date_str, tables)
+    if search_index:
+        store_search_index(date_str, tables[0])
+    return data_paths
+
+
+def apply_keymaps(data_paths) -> List[str]:
+    """
+    Keep the names of the known members in stored dimension tables.
+
+    The ``localidades`` and ``departamentos`` files are updated with the
+    key maps of ``keymap_path``, as ``trasform_frames`` does in memory,
+    and stored again if a name changed. The key maps are read and
+    stored without locks, so only one process may call it at a time.
+
+    Parameters
+    ----------
+    data_paths : list[str]
+        The ``farmacias``, ``localidades`` and ``departamentos`` files
+        of a date, as returned by ``trasform_raws``.
+
+    Return
+    ------
+    data_paths : list[str]
+        The same locations.
+    """
+    dimensions = zip(DIMENSIONS.items(), data_paths[1:])
+    for (table, (key, name)), f_path in dimensions:
+        path = keymap_path(table)
+        keymap = KeyMap.load(path, key, name)
+        members, conflicts = build_dimension(
+            read_frame(f_path), key, name, keymap
+        )
+        if len(conflicts):
+            store_frame(members, f_path, BASE_FILE_DIR)
+        if keymap.appended:
+            keymap.save(path)
+    return data_paths
+
+
+def previous_dated(category: str, date_str: str):
+    """
+    Return the latest output of ``category`` dated before ``date_str``.
+
+    Parameters
+    ----------
+    category : str
+        The name of the data stored in the dated ``data/`` tree.
+    date_str : str
+        The date on run with format YYYY-mm-dd.
+
+    Return
+    ------
+    path : Path or None
+        The file or directory of the latest earlier date, or ``None``
+        if there is none.
+    """
+    date = datetime.strptime(date_str, "%Y-%m-%d")
+    previous = {}
+    category_dir = Path(BASE_FILE_DIR) / "data" / category
+    for candidate in category_dir.glob(f"*/{category}-*"):
+        day = Path(candidate.name).stem[len(category) + 1 :]  # noqa: E203
+        try:
+            previous[datetime.strptime(day, "%d-%m-%Y")] = candidate
+        except ValueError:
+            continue
+    earlier = [d for d in previous if d < date]
+    return previous[max(earlier)] if earlier else None
+
+
+def search_index_path(date_str: str) -> Path:
+    """
+    Return the location of the search index of the configured provincia.
+
+    Parameters
+    ----------
+    date_str : str
+        The date on run with format YYYY-mm-dd.
+
+    Return
+    ------
+    path : Path
+        The directory of the ``SearchIndex`` of the date.
+    """
+    category = f"{provincia_categories(provincia)[0]}_search"
+    return dated_path(category, date_str, BASE_FILE_DIR).with_suffix("")
+
+
+def store_search_index(date_str: str, farmacias) -> Path:
+    """
+    Build and store the fuzzy search index of the ``farmacias`` table.
+
+    If the index of an earlier date exists it is updated with the rows
+    that changed since, instead of built from scratch.
+
+    Like the other stored tables, the index covers the configured
+    provincia only: the rows of the other provincias are dropped while
+    the raw file is read. A national index can be built with
+    ``SearchIndex.from_frame`` from the transformed national data.
+
+    Parameters
+    ----------
+    date_str : str
+        The date on run with format YYYY-mm-dd.
+    farmacias : ``pandas.DataFrame``
+        The ``farmacias`` table of the configured provincia.
+
+    Return
+    ------
+    path : Path
+        The directory of the stored ``SearchIndex``.
+    """
+    path = search_index_path(date_str)
+    previous = previous_dated(path.parent.parent.name, date_str)
+    if previous is not None:
+        index = SearchIndex.load(previous).updated(farmacias)
+    else:
+        index = SearchIndex.from_frame(farmacias)
+    log.info(f"Storing {index!r} in {path}")
+    return index.save(path)
+
+
+def trasform_provincias(
+    date_str: str,
+    file_paths,
+    provincias: List[str] = None,
+    max_workers: int = None,
+    configured: bool = True,
+) -> Tuple[Optional[List[str]], Dict[str, List[str]]]:
+    """
+    Build the tables of several provincias in a single run.
+
+    The raw file is read and split by provincia in one pass. The tables
+    of every requested provincia are built and stored in parallel
+    across a process pool, and their ``localidades`` and
+    ``departamentos`` files are named after each provincia (see
+    ``build_provincia``). Meanwhile the tables of the configured
+    provincia are built from the same read, as ``trasform_raws`` builds
+    them, so the raw file is not parsed again.
+
+    Parameters
+    ----------
+    date_str : str
+        The date on run with format YYYY-mm-dd.
+    file_paths : str
+        The destination location.
+    provincias : list[str], optional (default=None)
+        The names of the provincias to build. If ``None`` every
+        provincia found in the raw file is built.
+    max_workers : int, optional (default=None)
+        Number of worker processes, by default the number of CPUs.
+    configured : bool, optional (default=True)
+        If ``False`` the tables of the configured provincia are not
+        built, e.g. when ``trasform_raws`` already stored them.
+
+    Return
+    ------
+    data_paths : list[str] or None
+        The destination location of the tables of the configured
+        provincia, as returned by ``trasform_raws``, or ``None`` if
+        ``configured`` is ``False``.
+    built : dict[str, list[str]]
+        The destination location of data trasform of every requested
+        provincia.
+    """
+    read = provincias
+    if provincias is not None and configured:
+        read = sorted(set(provincias) | {provincia})
+    for name, extractor in data_extractors.items():
+        frames = extractor.read_provincias(
+            file_paths[name], read, engine=csv_engine
+        )
+        frames = {prov: extractor.transform(df) for prov, df in frames.items()}
+
+    requested = frames if provincias is None else provincias
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            prov: executor.submit(
+                build_provincia,
+                date_str,
+                prov,
+                frames[prov],
+                True,
+                BASE_FILE_DIR,
+                storage_format,
+            )
+            for prov in requested
+        }
+        data_paths = None
+        if configured:
+            tables = _split_keymapped(frames[provincia])
+            data_paths = persist_frames(date_str, tables)
+            store_search_index(date_str, tables[0])
+        built = {prov: future.result() for prov, future in futures.items()}
+    return data_paths, built
+
+
+def store_changes(date_str: str, changes) -> str:
+    """
+    Store the change set of a table as its own dated output.
+
+    Parameters
+    ----------
+    date_str : str
+        The date on run with format YYYY-mm-dd.
+    changes : dict[str, ``ChangeSet``]
+        The change set of every loaded table, by table name.
+
+    Return
+    ------
+    data_paths : list[str]
+        The destination location of every change set.
+    """
     data_paths = []
-    for name in [
-        f"farmacias_de_{provincia.lower().replace(' ', '_')}",
-        "localidades",
-        "departamentos",
-    ]:
-        file_path = file_path_crib.format(
-            category=name, year=date.year, month=date.month, day=date.day
+    for table_name, change_set in changes.items():
+        f_path = dated_path(
+            f"{table_name}_changes", date_str, BASE_FILE_DIR, storage_format
+        )
+        store_frame(
+            change_set.to_frame().set_index("op"), f_path, BASE_FILE_DIR
         )
-        f_path = BASE_FILE_DIR / file_path
         data_paths.append(f_path)
-        f_path.parent.mkdir(parents=True, exist_ok=True)
+    return data_paths
+
+
+def _loaded_rollups():
+    """Read the rollup tables loaded in the database, by table name."""
+    engine = get_engine()
+    insp = inspect(engine)
+    return {
+        table: pd.read_sql_table(table, engine).set_index(column)
+        for table, column in ROLLUPS.items()
+        if insp.has_table(table)
+    }
+
+
+def store_rollups(date_str: str, farmacias, changes=None):
+    """
+    Store the rollups of the ``farmacias`` table as dated outputs.
+
+    The deltas are computed against the rollups of the latest earlier
+    date. When the change set of the ``farmacias`` table is given, the
+    rollups loaded in the database are updated with it instead: they
+    come from the same snapshot as the live table the change set was
+    computed against, while the dated files may not, e.g. after a load
+    of an earlier date.
+
+    Parameters
+    ----------
+    date_str : str
+        The date on run with format YYYY-mm-dd.
+    farmacias : str or ``pandas.DataFrame``
+        The ``farmacias`` table of the date, or the path of its file.
+    changes : ``ChangeSet``, optional (default=None)
+        The changes of the ``farmacias`` table since the previous load.
 
-    df_cordoba.to_csv(data_paths[0])
-    df_localidades.to_csv(data_paths[1])
-    df_departamentos.to_csv(data_paths[2])
+    Return
+    ------
+    data_paths : dict[str, Path]
+        The destination location of every rollup, by table name.
+    """
+    if not isinstance(farmacias, pd.DataFrame):
+        farmacias = read_frame(farmacias)
+    previous = {}
+    if changes is not None:
+        previous = _loaded_rollups()
+    for table, column in ROLLUPS.items():
+        previous_path = previous_dated(table, date_str)
+        if table not in previous and previous_path is not None:
+            previous[table] = read_frame(previous_path).set_index(column)
+    data_paths = {}
+    for table, rollup in rollup_tables(farmacias, previous, changes).items():
+        f_path = dated_path(table, date_str, BASE_FILE_DIR, storage_format)
+        data_paths[table] = store_frame(rollup, f_path, BASE_FILE_DIR)
     return data_paths
 
 
+def load_rollups(data_paths):
+    """
+    Upsert the rollups stored with ``store_rollups``.
+
+    Parameters
+    ----------
+    data_paths : dict[str, Path]
+        The location of every rollup, by table name.
+
+    Return
+    ------
+    results : dict[str, dict]
+        The results of ``load_tables``.
+    """
+    sources = [
+        (RollupLoader(table, ROLLUPS[table]), f_path)
+        for table, f_path in data_paths.items()
+    ]
+    return load_tables(sources, upserted=ROLLUPS)
+
+
+def date_range(start: str, end: str) -> List[str]:
+    """
+    Return every date from ``start`` to ``end``, both included.
+
+    Parameters
+    ----------
+    start : str
+        The first date with format YYYY-mm-dd.
+    end : str
+        The last date with format YYYY-mm-dd.
+
+    Return
+    ------
+    dates : list[str]
+        The dates with format YYYY-mm-dd.
+    """
+    first = datetime.strptime(start, "%Y-%m-%d").date()
+    last = datetime.strptime(end, "%Y-%m-%d").date()
+    if last < first:
+        raise ValueError(f"The range ends ({end}) before it starts ({start})")
+    days = (last - first).days
+    return [str(first + timedelta(days=n)) for n in range(days + 1)]
+
+
+def raw_paths(date_str: str):
+    """
+    Return the stored raw files of a date.
+
+    Parameters
+    ----------
+    date_str : str
+        The date on run with format YYYY-mm-dd.
+
+    Return
+    ------
+    file_paths : dict[str, Path] or None
+        The raw file of every extractor, in the storage format or as
+        ``.csv``, or ``None`` if one of them was never extracted.
+    """
+    file_paths = {}
+    for name, extractor in data_extractors.items():
+        csv_path = dated_path(name, date_str, extractor.base_dir)
+        stored = storage_path(csv_path, storage_format)
+        if stored.exists():
+            file_paths[name] = stored
+        elif csv_path.exists():
+            file_paths[name] = csv_path
+        else:
+            return None
+    return file_paths
+
+
+def _copy_dated(file_path, date_str: str, base_dir):
+    """Link a file of the dated ``data/`` tree to another date."""
+    file_path = Path(file_path)
+    category = file_path.parent.parent.name
+    target = dated_path(category, date_str, base_dir)
+    target = target.with_suffix(file_path.suffix)
+    return link_file(file_path, target)
+
+
+def _read_progress(progress_path):
+    """Read the progress of a backfill, empty if it never ran."""
+    try:
+        with open(progress_path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"done": {}, "loaded": []}
+
+
+def backfill(
+    dates: List[str],
+    incremental: bool = False,
+    max_workers: int = None,
+    progress_path=None,
+    force: bool = False,
+):
+    """
+    Build the dated ``data/`` tree of several dates in a single run.
+
+    The dates whose raw files were never extracted share a single
+    download, since the source only serves its current content. The
+    dates are then grouped by the sha256 of their raw files and every
+    distinct content is transformed once, on a process pool with at
+    most ``max_workers`` workers; the tables are hardlinked to the
+    other dates of the group. The workers touch neither the key maps
+    nor the search indexes, which depend on the earlier dates: they
+    are built by ``apply_keymaps`` and ``store_search_index`` in this
+    process, one content at a time and in date order, and the search
+    index is copied to the other dates of the group.
+
+    The completed dates are recorded in a JSON progress file after
+    every transform and load, so a crashed backfill started again with
+    the same dates continues where it stopped.
+
+    Parameters
+    ----------
+    dates : list[str]
+        The dates with format YYYY-mm-dd.
+    incremental : bool, optional (default=False)
+        If ``True`` the tables are upserted, in date order, on every
+        date whose content changed, and the change sets are stored.
+        Otherwise only the tables of the last date are loaded. The
+        dimension tables are always upserted.
+    max_workers : int, optional (default=None)
+        Number of worker processes, by default the number of CPUs.
+    progress_path : str or Path, optional (default=None)
+        The location of the progress file, by default
+        ``data/backfill/backfill-<first>_<last>.json``.
+    force : bool, optional (default=False)
+        If ``True`` the progress of a previous run is ignored and every
+        date is built again.
+
+    Return
+    ------
+    data_paths : dict[str, list[str]]
+        The destination location of data trasform of every date.
+    """
+    dates = sorted(set(dates))
+    if progress_path is None:
+        progress_path = (
+            Path(BASE_FILE_DIR)
+            / "data"
+            / "backfill"
+            / f"backfill-{dates[0]}_{dates[-1]}.json"
+        )
+    progress = {"done": {}, "loaded": []}
+    if not force:
+        progress = _read_progress(progress_path)
+    pending = [d for d in dates if d not in progress["done"]]
+    log.info(f"Backfilling {len(pending)} of {len(dates)} dates")
+
+    # Extract
+    missing = [d for d in pending if raw_paths(d) is None]
+    if missing:
+        fetched = extract_raws(missing[0])
+        for date_str in missing[1:]:
+            for name, f_path in fetched.items():
+                _copy_dated(f_path, date_str, data_extractors[name].base_dir)
+
+    # Transform
+    groups, contents = {}, {}
+    for date_str in pending:
+        file_paths = raw_paths(date_str)
+        content = "-".join(
+            file_sha256(file_paths[name]) for name in sorted(file_paths)
+        )
+        groups.setdefault(content, []).append((date_str, file_paths))
+        contents[date_str] = content
+    log.info(f"{len(pending)} dates share {len(groups)} distinct contents")
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            content: executor.submit(
+                trasform_raws, *group[0], keymaps=False, search_index=False
+            )
+            for content, group in groups.items()
+        }
+        built = {}
+        for date_str in pending:
+            content = contents[date_str]
+            if content not in built:
+                data_paths = apply_keymaps(futures[content].result())
+                index_path = store_search_index(
+                    date_str, read_frame(data_paths[0])
+                )
+                built[content] = data_paths, index_path
+            else:
+                data_paths, index_path = built[content]
+                SearchIndex.load(index_path).save(search_index_path(date_str))
+            progress["done"][date_str] = {
+                "content": content,
+                "paths": [
+                    str(_copy_dated(p, date_str, BASE_FILE_DIR))
+                    for p in data_paths
+                ],
+            }
+            _write_atomic(progress_path, json.dumps(progress, indent=2))
+
+    # Load
+    if incremental:
+        to_load, previous = [], None
+        for date_str in dates:
+            content = progress["done"][date_str]["content"]
+            if content != previous:
+                to_load.append(date_str)
+            previous = content
+    else:
+        to_load = dates[-1:]
+    loaded = False
+    for date_str in to_load:
+        if date_str in progress["loaded"]:
+            continue
+        paths = progress["done"][date_str]["paths"]
+        sources = [
+            (FarmaciasLoader(), paths[0]),
+            (LocalidadesLoader(), paths[1]),
+            (DepartamentosLoader(), paths[2]),
+        ]
+        results = load_tables(
+            sources, incremental=incremental, upserted=DIMENSIONS
+        )
+        changes = None
+        if incremental:
+            changes = {name: r["result"] for name, r in results.items()}
+            store_changes(date_str, changes)
+            changes = changes[FarmaciasLoader.table_name]
+        load_rollups(store_rollups(date_str, paths[0], changes))
+        progress["loaded"].append(date_str)
+        _write_atomic(progress_path, json.dumps(progress, indent=2))
+        loaded = True
+    if loaded:
+        build_constraints()
+
+    return {d: progress["done"][d]["paths"] for d in dates}
+
+
+def _extract_fingerprint():
+    """Return the fingerprint of the extraction of the sources."""
+    return fingerprint(
+        urls={name: e.url for name, e in data_extractors.items()},
+        storage_format=storage_format,
+        csv_engine=csv_engine,
+    )
+
+
+def _transform_fingerprint(file_paths):
+    """Return the fingerprint of the transform of the raw files."""
+    return fingerprint(
+        sources={name: content_digest(p) for name, p in file_paths.items()},
+        provincia=provincia,
+        columns={
+            name: [e.renamed_cols, e.cols, e.dtypes]
+            for name, e in data_extractors.items()
+        },
+        storage_format=storage_format,
+    )
+
+
+def _load_fingerprint(loader, data, versions):
+    """Return the fingerprint of the content of a table in the database.
+
+    It includes the latest ``load_versions`` version of the table (see
+    ``versions.table_versions``), so a load made by anyone else since
+    the last run is not mistaken for the cached one.
+    """
+    version = versions.get(loader.table_name, {}).get("version")
+    return fingerprint(
+        table=loader.table_name,
+        content=content_digest(data),
+        database=get_engine().url.render_as_string(hide_password=True),
+        version=version,
+    )
+
+
+@contextmanager
+def _stage(report, profiler, name):
+    """Measure a stage in the run report, and profile it if requested."""
+    with report.stage(name) as metrics:
+        if profiler is None:
+            yield metrics
+        else:
+            with profiler.stage(name):
+                yield metrics
+
+
 # : configure the command for run pipeline.
 @click.command()
 @click.option("--date", help="run date in format yyyy-mm-dd")
-def run_pipeline(date) -> None:
+@click.option("--start", help="backfill from this date, yyyy-mm-dd")
+@click.option("--end", help="backfill up to this date, yyyy-mm-dd")
+@click.option(
+    "--dates",
+    help="backfill these comma separated dates, yyyy-mm-dd",
+)
+@click.option(
+    "--max-workers",
+    type=int,
+    help="number of worker processes of a backfill",
+)
+@click.option(
+    "--provincia",
+    "provincias",
+    multiple=True,
+    help="also build the tables of this provincia (repeatable)",
+)
+@click.option(
+    "--all-provincias",
+    is_flag=True,
+    help="also build the tables of every provincia in the source",
+)
+@click.option(
+    "--incremental",
+    is_flag=True,
+    help="upsert only the changed farmacias and store the change sets "
+    "(localidades and departamentos are always upserted)",
+)
+@click.option(
+    "--in-memory",
+    is_flag=True,
+    help="hand the transformed tables to the loaders without re-reading",
+)
+@click.option(
+    "--persist/--no-persist",
+    default=True,
+    help="with --in-memory, also store the tables in the background",
+)
+@click.option(
+    "--metrics-json",
+    type=click.Path(dir_okay=False),
+    help="where to write the JSON run report "
+    "(default: data/run_report/ next to the dated data)",
+)
+@click.option(
+    "--prometheus-textfile",
+    type=click.Path(dir_okay=False),
+    help="also write the stage metrics in the Prometheus textfile format",
+)
+@click.option(
+    "--force",
+    is_flag=True,
+    help="run every stage even if its inputs did not change",
+)
+@click.option(
+    "--profile",
+    is_flag=True,
+    help="dump cProfile and tracemalloc reports of every stage "
+    "(in data/profile/ next to the dated data)",
+)
+def run_pipeline(
+    date,
+    start,
+    end,
+    dates,
+    max_workers,
+    provincias,
+    all_provincias,
+    incremental,
+    in_memory,
+    persist,
+    metrics_json,
+    prometheus_textfile,
+    force,
+    profile,
+) -> None:
     """
     Read files with data from `source <datos.gob.ar>`_.
 
@@ -152,24 +1135,211 @@ def run_pipeline(date) -> None:
     ----------
     date : str
         Path to files to be read.
+    start : str
+        With ``end``, backfill every date of the range instead of
+        running a single date (see ``backfill``). The provincias,
+        in-memory, profile and metrics options only apply to a single
+        date and are rejected.
+    end : str
+        The last date of the backfill.
+    dates : str
+        Comma separated dates to backfill, instead of a range.
+    max_workers : int
+        Number of worker processes of a backfill.
+    provincias : tuple[str]
+        Other provincias whose tables are built in the same run.
+    all_provincias : bool
+        If ``True`` the tables of every provincia are built.
+    incremental : bool
+        If ``True`` only the rows changed since the last load are
+        written and the change sets are stored as dated outputs.
+    in_memory : bool
+        If ``True`` the transformed tables are handed to the loaders as
+        data frames instead of being stored and parsed again.
+    persist : bool
+        With ``in_memory``, whether the tables are also stored, in a
+        background thread while they are loaded.
+    metrics_json : str
+        The location of the JSON run report with the wall time, CPU
+        time, rows, bytes and peak memory of every stage.
+    prometheus_textfile : str
+        If given, the location of the same metrics in the Prometheus
+        textfile format.
+    force : bool
+        If ``True`` every stage runs, even if the fingerprint of its
+        inputs matches a completed previous run (see ``StageCache``).
+    profile : bool
+        If ``True`` every stage is profiled with cProfile and
+        tracemalloc, and a ``.prof`` file plus the top allocation sites
+        of each stage are stored. Nothing is profiled otherwise.
 
     Return
     ------
     csv : str
         All `.csv` files with data.
     """
+    if start or end or dates:
+        single_date = {
+            "--provincia": provincias,
+            "--all-provincias": all_provincias,
+            "--in-memory": in_memory,
+            "--profile": profile,
+            "--metrics-json": metrics_json,
+            "--prometheus-textfile": prometheus_textfile,
+        }
+        given = [option for option, value in single_date.items() if value]
+        if given:
+            raise click.UsageError(
+                f"{', '.join(given)} cannot be used with --start, --end "
+                "or --dates"
+            )
+        if dates:
+            dates = [d.strip() for d in dates.split(",") if d.strip()]
+        else:
+            dates = date_range(start or end, end or start)
+        backfill(
+            dates,
+            incremental=incremental,
+            max_workers=max_workers,
+            force=force,
+        )
+        log.info("Done!")
+        return
+
+    report = RunReport(date)
+    profiler = None
+    if profile:
+        profile_dir = dated_path("profile", date, BASE_FILE_DIR)
+        profiler = StageProfiler(profile_dir.with_suffix(""))
+
+    cache = StageCache(
+        Path(BASE_FILE_DIR) / "data" / "stage_cache.json", force=force
+    )
+
     # Extract
     log.info("Extracting")
-    file_paths = extract_raws(date)
+    with _stage(report, profiler, "extract_raws") as stage:
+        key, fp = f"{date}/extract_raws", _extract_fingerprint()
+        cached = cache.lookup(key, fp)
+        if cached is not None:
+            file_paths = dict(zip(data_extractors, map(Path, cached)))
+            stage["skipped"] = True
+        else:
+            file_paths = extract_raws(date)
+            cache.record(key, fp, file_paths.values())
+            stage["bytes_downloaded"] = sum(
+                e.stats.get("bytes", 0) for e in data_extractors.values()
+            )
+            stage["bytes_written"] = file_size(file_paths.values())
 
     # Transform
     log.info("Tansform")
-    paths = trasform_raws(date, file_paths)
+    persisted, built = [], None
+    transform_fp = _transform_fingerprint(file_paths)
+    selected = None if all_provincias else sorted(provincias)
+    provincias_key = f"{date}/trasform_provincias"
+    provincias_fp = fingerprint(transform=transform_fp, provincias=selected)
+    with _stage(report, profiler, "trasform_raws") as stage:
+        key = f"{date}/trasform_raws"
+        cached = cache.lookup(key, transform_fp)
+        if cached is not None:
+            paths = [Path(p) for p in cached]
+            stage["skipped"] = True
+        else:
+            if in_memory:
+                paths = trasform_frames(file_paths)
+                if persist:
+                    writer = ThreadPoolExecutor(max_workers=1)
+                    persisted = persist_frames(date, paths, executor=writer)
+                    indexed = writer.submit(store_search_index, date, paths[0])
+                    writer.shutdown(wait=False)
+            else:
+                if provincias or all_provincias:
+                    # the other provincias are built from the same read,
+                    # so there is no trasform_provincias stage.
+                    paths, built = trasform_provincias(
+                        date, file_paths, selected
+                    )
+                else:
+                    paths = trasform_raws(date, file_paths)
+                cache.record(key, transform_fp, paths)
+                stage["bytes_written"] = file_size(paths)
+            scans = [e.scan_stats for e in data_extractors.values()]
+            stage["rows_in"] = sum(scan["rows_scanned"] for scan in scans)
+            stage["rows_out"] = sum(scan["rows_kept"] for scan in scans)
+    if built is None and (provincias or all_provincias):
+        with _stage(report, profiler, "trasform_provincias") as stage:
+            if cache.lookup(provincias_key, provincias_fp) is not None:
+                stage["skipped"] = True
+            else:
+                _, built = trasform_provincias(
+                    date, file_paths, selected, configured=False
+                )
+    if built is not None:
+        cache.record(
+            provincias_key,
+            provincias_fp,
+            [p for paths_ in built.values() for p in paths_],
+        )
 
     # Load
     log.info("Loading")
-    FarmaciasLoader().load_table(paths[0])
-    LocalidadesLoader().load_table(paths[1])
-    DepartamentosLoader().load_table(paths[2])
+    sources, versions = [], table_versions()
+    for loader, data in [
+        (FarmaciasLoader(), paths[0]),
+        (LocalidadesLoader(), paths[1]),
+        (DepartamentosLoader(), paths[2]),
+    ]:
+        key = f"load/{loader.table_name}"
+        fp = _load_fingerprint(loader, data, versions)
+        if cache.lookup(key, fp) is not None:
+            report.add(f"load_{loader.table_name}", skipped=True)
+        else:
+            sources.append((loader, data))
+    with report.stage("load_tables"):
+        results = load_tables(
+            sources,
+            incremental=incremental,
+            stage=profiler.stage if profiler else None,
+            upserted=DIMENSIONS,
+        )
+    # the loads bumped the versions the next run compares with.
+    versions = table_versions()
+    for loader, data in sources:
+        name, r = loader.table_name, results[loader.table_name]
+        cache.record(f"load/{name}", _load_fingerprint(loader, data, versions))
+        report.add(
+            f"load_{name}",
+            wall_seconds=r["seconds"],
+            cpu_seconds=r["cpu_seconds"],
+            rows_in=r["rows_in"],
+            rows_out=r["rows"],
+            peak_rss_bytes=r["peak_rss"],
+        )
+    if incremental and results:
+        changes = {name: r["result"] for name, r in results.items()}
+        store_changes(date, changes)
+    if FarmaciasLoader.table_name in results:
+        with _stage(report, profiler, "rollups") as stage:
+            farmacias = results[FarmaciasLoader.table_name]
+            changes = farmacias["result"] if incremental else None
+            rollups = load_rollups(store_rollups(date, paths[0], changes))
+            stage["rows_out"] = sum(r["rows"] for r in rollups.values())
+    if results:
+        with report.stage("build_constraints"):
+            build_constraints()
+    if persisted:
+        paths = [future.result() for future in persisted]
+        indexed.result()
+        cache.record(f"{date}/trasform_raws", transform_fp, paths)
+
+    # Report
+    if metrics_json is None:
+        metrics_json = dated_path("run_report", date, BASE_FILE_DIR)
+        metrics_json = metrics_json.with_suffix(".json")
+    report.to_json(metrics_json)
+    if prometheus_textfile:
+        report.to_prometheus(prometheus_textfile)
+    log.info(f"Run report stored in {metrics_json}")
     # Done
     log.info("Done!")
@@ -0,0 +1,73 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of the CoPyPharm Project
+#     https://github.com/juniors90/CoPyPharm.
+#
+# Copyright (c) 2022. Ferreira Juan David
+# License: MIT
+#   Full Text: https://github.com/pyCellID/CoPyPharm/blob/main/LICENSE
+
+# =============================================================================
+# DOCS
+# =============================================================================
+
+"""
+CoPyPharm.
+
+An extension that registers all pharmacies in Córdoba - Argentina.
+"""
+
+# =============================================================================
+# IMPORTS
+# =============================================================================
+
+import threading
+
+from .settings import engine_options, setup_data
+
+_engine = None
+_lock = threading.Lock()
+
+
+def get_engine():
+    """Return the engine shared by the whole package.
+
+    The engine is created on the first call, with the pool settings of
+    ``settings.ini``, and reused afterwards.
+
+    Return
+    ------
+    engine : ``sqlalchemy.engine.Engine``
+        The engine of ``SQLALCHEMY_DATABASE_URI``.
+    """
+    global _engine
+    if _engine is None:
+        with _lock:
+            if _engine is None:
+                _engine = _create_engine(setup_data["SQLALCHEMY_DATABASE_URI"])
+    return _engine
+
+
+def _create_engine(uri):
+    """Create an engine, with the pool options if the dialect uses them."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.engine import make_url
+
+    options = {}
+    if make_url(uri).get_backend_name() != "sqlite":
+        options = engine_options
+    return create_engine(uri, **options)
+
+
+def dispose_engine():
+    """Close the connections of the shared engine and forget it.
+
+    Call it in a worker process after a fork, so the connections of
+    the parent are not reused.
+    """
+    global _engine
+    with _lock:
+        if _engine is not None:
+            _engine.dispose()
+        _engine = None
@@ -0,0 +1,251 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of the CoPyPharm Project
+#     https://github.com/juniors90/CoPyPharm.
+#
+# Copyright (c) 2022. Ferreira Juan David
+# License: MIT
+#   Full Text: https://github.com/pyCellID/CoPyPharm/blob/main/LICENSE
+
+# =============================================================================
+# DOCS
+# =============================================================================
+
+"""
+CoPyPharm.
+
+An extension that registers all pharmacies in Córdoba - Argentina.
+"""
+
+# =============================================================================
+# IMPORTS
+# =============================================================================
+
+import logging
+import os
+import uuid
+from pathlib import Path
+
+import pandas as pd
+
+from .constants import DEPARTAMENTOS_TABLE_NAME, LOCALIDADES_TABLE_NAME
+from .storage import read_frame, write_frame
+
+log = logging.getLogger()
+
+# : the dimension tables, with the columns of their ids and names.
+DIMENSIONS = {
+    LOCALIDADES_TABLE_NAME: ("id_localidad", "localidad"),
+    DEPARTAMENTOS_TABLE_NAME: ("id_departamento", "nombre_departamento"),
+}
+
+# : the columns of a reported name conflict, besides the key.
+CONFLICT_COLUMNS = ["name", "spelling"]
+
+
+def _log_conflicts(conflicts, key):
+    """Warn about the spellings dropped in favour of the kept names."""
+    if not len(conflicts):
+        return
+    examples = ", ".join(
+        f"{row[key]}: {row['spelling']!r} -> {row['name']!r}"
+        for _, row in conflicts.head(5).iterrows()
+    )
+    log.warning(f"{len(conflicts)} name conflicts on {key}: {examples}")
+
+
+def build_dimension(df: pd.DataFrame, key: str, name: str, keymap=None):
+    """Return the distinct members of a dimension of ``df``.
+
+    The members are the distinct ``(key, name)`` pairs, found with
+    ``drop_duplicates`` and sorted by key, so the table matches the one
+    of ``groupby([key, name]).count()`` without counting every column.
+    Rows without a key cannot be members and are reported.
+
+    A key with several spellings keeps its most frequent one, or the
+    one of ``keymap`` when the key is already known, and every dropped
+    spelling is reported as a conflict.
+
+    Parameters
+    ----------
+    df : ``pandas.DataFrame``
+        The transformed data.
+    key : str
+        The column of the member ids, e.g. ``id_localidad``.
+    name : str
+        The column of the member names, e.g. ``localidad``.
+    keymap : KeyMap, optional (default=None)
+        The known members, whose names are kept. The new members are
+        appended to it.
+
+    Return
+    ------
+    table : ``pandas.DataFrame``
+        The ``name`` of every member, indexed by ``key``.
+    conflicts : ``pandas.DataFrame``
+        The ``key``, the kept ``name`` and the dropped ``spelling`` of
+        every conflict.
+    """
+    pairs = df[[key, name]]
+    missing = pairs[key].isna()
+    if missing.any():
+        log.warning(f"{missing.sum()} rows without {key} are not members")
+        pairs = pairs[~missing]
+    pairs = pairs.drop_duplicates()
+
+    conflicts = []
+    duplicated = pairs[key].duplicated(keep=False)
+    if duplicated.any():
+        # the most frequent spelling wins, ties go to the first name.
+        rows = df[df[key].isin(pairs.loc[duplicated, key])]
+        counts = rows.groupby([key, name], observed=True).size()
+        counts = counts.rename("rows").reset_index()
+        counts = counts.sort_values(
+            [key, "rows", name], ascending=[True, False, True], kind="stable"
+        )
+        kept = counts.drop_duplicates(key).set_index(key)[name]
+        kept = kept.astype(object)
+
+        def is_kept(frame):
+            wanted = kept.reindex(frame[key]).to_numpy()
+            return frame[name].astype(object).to_numpy() == wanted
+
+        dropped = counts[~is_kept(counts)]
+        conflicts.append(
+            pd.DataFrame(
+                {
+                    key: dropped[key].to_numpy(),
+                    "name": kept.reindex(dropped[key]).to_numpy(),
+                    "spelling": dropped[name].astype(object).to_numpy(),
+                }
+            )
+        )
+        pairs = pairs[~duplicated.to_numpy() | is_kept(pairs)]
+
+    table = pairs.sort_values(key, kind="stable").set_index(key)
+    if keymap is not None:
+        table, renamed = keymap.update(table)
+        conflicts.append(renamed)
+    conflicts = [frame for frame in conflicts if len(frame)]
+    if conflicts:
+        conflicts = pd.concat(conflicts, ignore_index=True)
+    else:
+        conflicts = pd.DataFrame(columns=[key] + CONFLICT_COLUMNS)
+    _log_conflicts(conflicts, key)
+    return table, conflicts
+
+
+class KeyMap(object):
+    """The persisted members of a dimension, by key.
+
+    A key keeps the name it had when it was first seen, so ids and
+    names stay stable from one day to the next even when the source
+    spells a name differently; only the new members are appended.
+
+    Parameters
+    ----------
+    key : str
+        The column of the member ids.
+    name : str
+        The column of the member names.
+    members : ``pandas.Series``, optional (default=None)
+        The names of the known members, indexed by key.
+    """
+
+    def __init__(self, key: str, name: str, members=None) -> None:
+        self.key = key
+        self.name = name
+        if members is None:
+            index = pd.Index([], dtype="int64", name=key)
+            members = pd.Series([], index=index, name=name, dtype=object)
+        self.members = members
+        self.appended = 0
+
+    def __repr__(self) -> str:
+        """Print a representation of your object."""
+        return f"<KeyMap of {len(self)} {self.key}>"
+
+    def __len__(self) -> int:
+        """Return the number of known members."""
+        return len(self.members)
+
+    @classmethod
+    def load(cls, path, key: str, name: str):
+        """Read a key map stored with ``save``, or start an empty one.
+
+        Parameters
+        ----------
+        path : str or Path
+            The location of the key map, in any format of ``read_frame``.
+        key : str
+            The column of the member ids.
+        name : str
+            The column of the member names.
+
+        Return
+        ------
+        keymap : KeyMap
+            The stored members.
+        """
+        if not Path(path).exists():
+            return cls(key, name)
+        members = read_frame(path).set_index(key)[name]
+        return cls(key, name, members)
+
+    def save(self, path) -> Path:
+        """Store the members, replacing the file atomically.
+
+        Parameters
+        ----------
+        path : str or Path
+            The destination location.
+
+        Return
+        ------
+        path : Path
+            The destination location.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{uuid.uuid4().hex}.{path.name}")
+        write_frame(self.members.to_frame(), tmp_path)
+        os.replace(tmp_path, path)
+        return path
+
+    def update(self, table: pd.DataFrame):
+        """Append the new members of ``table`` and keep the known names.
+
+        Parameters
+        ----------
+        table : ``pandas.DataFrame``
+            The members of a day, as built by ``build_dimension``.
+
+        Return
+        ------
+        table : ``pandas.DataFrame``
+            ``table`` with the names of the known members.
+        conflicts : ``pandas.DataFrame``
+            The known members whose name in ``table`` differs.
+        """
+        names = table[self.name].astype(object)
+        known = names.index.isin(self.members.index)
+        new = names[~known]
+        if len(new):
+            self.members = pd.concat([self.members, new]).sort_index()
+            self.appended += len(new)
+
+        stable = self.members.reindex(names.index)
+        differs = stable.to_numpy() != names.to_numpy()
+        differs &= ~(stable.isna().to_numpy() & names.isna().to_numpy())
+        renamed = known & differs
+        conflicts = pd.DataFrame(
+            {
+                self.key: names.index[renamed],
+                "name": stable[renamed].to_numpy(),
+                "spelling": names[renamed].to_numpy(),
+            }
+        )
+        if renamed.any():
+            table = table.assign(**{self.name: stable.to_numpy()})
+        return table, conflicts
@@ -22,17 +22,82 @@ An extension that registers all pharmacies in Córdoba - Argentina.
 # IMPORTS
 # =============================================================================
 
+import hashlib
+import importlib.util
+import json
 import logging
+import os
+import shutil
+import threading
+import time
 from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List
 
 import pandas as pd
 
 import requests
-
-from .constants import BASE_FILE_DIR
+from requests.adapters import HTTPAdapter
+
+from urllib3.util.retry import Retry
+
+from .constants import (
+    BASE_FILE_DIR,
+    DOWNLOAD_CHUNK_SIZE,
+    EXTRACT_BACKOFF_FACTOR,
+    EXTRACT_MAX_WORKERS,
+    EXTRACT_RETRIES,
+    RAW_CHUNK_SIZE,
+    REQUEST_TIMEOUT,
+)
+from .metrics import peak_rss
+from .objects import ObjectStore, file_sha256
+from .storage import storage_path
 
 log = logging.getLogger()
 
+# : compact dtype for free text columns, backed by pyarrow if available.
+STRING_DTYPE = (
+    "string[pyarrow]" if importlib.util.find_spec("pyarrow") else "object"
+)
+
+
+def build_session(
+    pool_maxsize=EXTRACT_MAX_WORKERS,
+    retries=EXTRACT_RETRIES,
+    backoff_factor=EXTRACT_BACKOFF_FACTOR,
+):
+    """Create a connection-pooled ``requests.Session`` with retries.
+
+    Parameters
+    ----------
+    pool_maxsize : int, optional (default=4)
+        Maximum number of connections kept alive per host.
+    retries : int, optional (default=3)
+        Number of retries on connection errors and 429/5xx responses.
+    backoff_factor : float, optional (default=0.5)
+        Exponential backoff factor between retries.
+
+    Return
+    ------
+    session : ``requests.Session``
+        A session that can be shared by several extractors.
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(429, 500, 502, 503, 504),
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_maxsize,
+        pool_maxsize=pool_maxsize,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
 
 class UrlExtractor(object):
     """Collapse your data into a single data frame.
@@ -43,6 +108,15 @@ class UrlExtractor(object):
         The name of data (in this case, pharmacies) to extract.
     url : str
         Describe the url such that allows then data.
+    chunk_size : int, optional (default=65536)
+        Size in bytes of each chunk written to disk while downloading.
+    base_dir : str or Path, optional (default=BASE_FILE_DIR)
+        The directory under which the ``data/`` tree is stored.
+    session : ``requests.Session``, optional (default=None)
+        A shared, connection-pooled session (see ``build_session``).
+        If ``None`` a new connection is opened on every extraction.
+    timeout : float or tuple, optional (default=(10, 60))
+        The (connect, read) timeout in seconds of the request.
 
     Return
     ------
@@ -86,49 +160,530 @@ class UrlExtractor(object):
 
     file_path_crib = "data/{category}/{year}-{month:02d}/{category}-{day:02d}-{month:02d}-{year}.csv"  # noqa: E501
 
-    def __init__(self, name, url) -> None:
+    renamed_cols = {
+        "establecimiento_id": "id",
+        "establecimiento_nombre": "nombre",
+        "localidad_id": "id_localidad",
+        "localidad_nombre": "localidad",
+        "provincia_id": "id_provincia",
+        "provincia_nombre": "provincia",
+        "departamento_id": "id_departamento",
+        "departamento_nombre": "nombre_departamento",
+        "cod_loc": "cod_localidad",
+        "tipologia_id": "id_tipologia",
+        "tipologia_nombre": "nombre_tipologia",
+        "cp": "codigo_postal",
+        "sitio_web": "web",
+    }
+
+    cols = [
+        "id",
+        "nombre",
+        "id_localidad",
+        "localidad",
+        "id_provincia",
+        "provincia",
+        "id_departamento",
+        "nombre_departamento",
+        "codigo_postal",
+        "domicilio",
+        "web",
+    ]
+
+    dtypes = {
+        "establecimiento_id": "int64",
+        "establecimiento_nombre": STRING_DTYPE,
+        "localidad_id": "int64",
+        "localidad_nombre": "category",
+        "provincia_id": "int64",
+        "provincia_nombre": "category",
+        "departamento_id": "int64",
+        "departamento_nombre": "category",
+        "domicilio": STRING_DTYPE,
+        "sitio_web": STRING_DTYPE,
+    }
+
+    def __init__(
+        self,
+        name,
+        url,
+        chunk_size=DOWNLOAD_CHUNK_SIZE,
+        base_dir=BASE_FILE_DIR,
+        session=None,
+        timeout=REQUEST_TIMEOUT,
+    ) -> None:
         self.name = name
         self.url = url
+        self.chunk_size = chunk_size
+        self.base_dir = Path(base_dir)
+        self.session = session
+        self.timeout = timeout
+        self.stats = {}
+        self.scan_stats = {}
+        # an abandoned download finishes before another one starts.
+        self._lock = threading.Lock()
 
     def __repr__(self) -> None:
         """Print a representation of your object."""
         extractor = "<Extractor for Name: {name}, URL: {url}>"
         return extractor.format(name=self.name, url=self.url)
 
-    def extract(self, date_str: str) -> str:
+    @property
+    def store(self):
+        """The content-addressed store of the ``data/`` tree."""
+        return ObjectStore.for_base_dir(self.base_dir)
+
+    @property
+    def meta_path(self):
+        """Path of the sidecar metadata store of the extracted files."""
+        return self.base_dir / "data" / self.name / f"{self.name}.meta.json"
+
+    def _read_meta(self):
+        """Read the sidecar metadata store, empty if it does not exist."""
+        if not self.meta_path.exists():
+            return {}
+        with open(self.meta_path) as f:
+            return json.load(f)
+
+    def _write_meta(self, meta):
+        """Atomically write the sidecar metadata store."""
+        self.meta_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.meta_path.with_name(self.meta_path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.meta_path)
+
+    def extract(self, date_str: str, cancel=None) -> str:
         """Extract your data into a single csv file.
 
         Inspect the ``.csv`` and extract with data related
-        whit pharmmacies.
+        whit pharmmacies. The response is streamed and written to disk
+        in chunks of ``chunk_size`` bytes, so the whole file is never
+        held in memory. The transfer statistics (bytes, seconds,
+        bytes/sec and peak RSS) are stored in ``stats``.
+
+        The ETag, Last-Modified, size and sha256 of every extracted file
+        are kept in a sidecar metadata store (``meta_path``). The request
+        is conditional on the latest extracted file, so when the source
+        answers ``304 Not Modified`` nothing is downloaded and the latest
+        file is reused. An interrupted transfer is left as a ``.part``
+        file and resumed with a ``Range`` request on the next run.
+
+        Only one extraction of an extractor runs at a time: a download
+        abandoned with ``cancel`` stops before its next write, and the
+        next extraction waits for it.
 
         Parameters
         ----------
         date_str : str
             The date on run with format YYYY-mm-dd.
+        cancel : ``threading.Event``, optional (default=None)
+            Once set, the download stops before it writes again and
+            leaves the ``.part`` file to be resumed.
 
         Return
         ------
             file_path : str
                 The destination location for your csv file.
+
+        Raises
+        ------
+        RuntimeError
+            If ``cancel`` is set before the file is stored.
         """
+        with self._lock:
+            return self._extract(date_str, cancel)
+
+    def _check_cancel(self, cancel):
+        """Raise if the extraction was abandoned."""
+        if cancel is not None and cancel.is_set():
+            raise RuntimeError(f"The extraction of {self.name} was cancelled")
+
+    def _extract(self, date_str, cancel):
+        """Extract the file of ``date_str``, see ``extract``."""
         log.info(f"Extracting {self.name}")
         date = datetime.strptime(date_str, "%Y-%m-%d").date()
         file_path = self.file_path_crib.format(
             category=self.name, year=date.year, month=date.month, day=date.day
         )
 
-        pharm_path = BASE_FILE_DIR / file_path
+        pharm_path = self.base_dir / file_path
         pharm_path.parent.mkdir(parents=True, exist_ok=True)
+        part_path = pharm_path.with_name(pharm_path.name + ".part")
+
+        meta = self._read_meta()
+        latest = meta.get("latest")
+        partial = meta.get("partial")
+
+        headers = {}
+        if latest and (self.base_dir / latest["path"]).exists():
+            if latest.get("etag"):
+                headers["If-None-Match"] = latest["etag"]
+            if latest.get("last_modified"):
+                headers["If-Modified-Since"] = latest["last_modified"]
+
+        offset = 0
+        if (
+            partial
+            and partial["path"] == file_path
+            and part_path.exists()
+            and (partial.get("etag") or partial.get("last_modified"))
+        ):
+            offset = part_path.stat().st_size
+            headers["Range"] = f"bytes={offset}-"
+            headers["If-Range"] = partial.get("etag") or partial.get(
+                "last_modified"
+            )
+
+        n_bytes = 0
+        start = time.perf_counter()
+        http = self.session or requests
+        with http.get(
+            self.url, headers=headers, stream=True, timeout=self.timeout
+        ) as r:
+            if r.status_code == 304:
+                status = r.status_code
+            else:
+                r.raise_for_status()
+                self._check_cancel(cancel)
+                status = r.status_code
+                if status != 206:
+                    offset = 0
+                meta["partial"] = {
+                    "path": file_path,
+                    "etag": r.headers.get("ETag"),
+                    "last_modified": r.headers.get("Last-Modified"),
+                }
+                self._write_meta(meta)
+
+                log.info(f"Storing file in {pharm_path}")
+                with open(part_path, "ab" if offset else "wb") as f:
+                    for chunk in r.iter_content(chunk_size=self.chunk_size):
+                        self._check_cancel(cancel)
+                        f.write(chunk)
+                        n_bytes += len(chunk)
+        elapsed = time.perf_counter() - start
+        self._check_cancel(cancel)
+
+        if status == 304:
+            log.info(f"{self.name} not modified, reusing {latest['path']}")
+            entry = dict(latest)
+            meta.pop("partial", None)
+            if part_path.exists():
+                part_path.unlink()
+            if latest.get("sha256") in self.store:
+                self.store.link(latest["sha256"], pharm_path)
+            elif latest["path"] != file_path:
+                shutil.copyfile(self.base_dir / latest["path"], pharm_path)
+        else:
+            os.replace(part_path, pharm_path)
+            entry = {
+                "etag": meta["partial"]["etag"],
+                "last_modified": meta["partial"]["last_modified"],
+                "size": pharm_path.stat().st_size,
+                "sha256": self.store.put(pharm_path),
+            }
+            del meta["partial"]
+
+        entry["path"] = file_path
+        meta["latest"] = entry
+        meta.setdefault("files", {})[date_str] = entry
+        self._write_meta(meta)
+
+        self.stats = {
+            "status": status,
+            "resumed_from": offset,
+            "bytes": n_bytes,
+            "seconds": elapsed,
+            "bytes_per_sec": n_bytes / elapsed if elapsed else 0.0,
+            "peak_rss": peak_rss(),
+        }
+        log.info(
+            f"Downloaded {n_bytes} bytes in {elapsed:.2f}s "
+            f"({self.stats['bytes_per_sec']:.0f} bytes/sec, "
+            f"peak RSS {self.stats['peak_rss']} bytes)"
+        )
 
-        r = requests.get(self.url)
-        r.encoding = "utf-8"
+        return pharm_path
 
-        log.info(f"Storing file in {pharm_path}")
+    @property
+    def usecols(self):
+        """Names of the raw columns kept by ``transform``."""
+        raw_names = {v: k for k, v in self.renamed_cols.items()}
+        return [raw_names.get(col, col) for col in self.cols]
 
-        with open(pharm_path, "w") as f:
-            f.write(r.text)
+    def read_raw(self, file_path, engine=None) -> pd.DataFrame:
+        """Read the raw csv file with only the needed columns.
 
-        return pharm_path
+        Only the columns used by ``transform`` are parsed and they are
+        read with compact dtypes: ``int64`` ids, categoricals for the
+        provincia, localidad and departamento names, and
+        ``string[pyarrow]`` for free text when pyarrow is installed.
+
+        Parameters
+        ----------
+        file_path : str
+            The path of the raw csv file.
+        engine : str, optional (default=None)
+            The ``pandas.read_csv`` parser engine, ``"c"`` or
+            ``"pyarrow"``. If ``None`` pandas picks the default.
+
+        Return
+        ------
+            df : pd.DataFrame
+                The raw data frame, ready to be transformed.
+        """
+        return pd.read_csv(
+            file_path, usecols=self.usecols, dtype=self.dtypes, engine=engine
+        )
+
+    def iter_raw(
+        self,
+        file_path,
+        provincias: List[str] = None,
+        chunksize: int = RAW_CHUNK_SIZE,
+        engine=None,
+    ) -> Iterator[pd.DataFrame]:
+        """Stream the raw csv file in chunks filtered by provincia.
+
+        The file is read ``chunksize`` rows at a time (or one arrow block
+        at a time with the ``"pyarrow"`` engine) and only the rows of the
+        requested ``provincias`` are kept from each chunk, so memory
+        scales with their share of the file and not with the whole file.
+        Raw files converted with ``convert_raw`` are read with pyarrow.
+        The number of rows scanned and kept, and of chunks read, is
+        stored in ``scan_stats``.
+
+        Parameters
+        ----------
+        file_path : str
+            The path of the raw csv, parquet or feather file.
+        provincias : list[str], optional (default=None)
+            The names of the provincias to keep. If ``None`` all rows
+            are kept.
+        chunksize : int, optional (default=50000)
+            Number of rows parsed at a time by the ``"c"`` engine.
+        engine : str, optional (default=None)
+            The parser engine, ``"c"`` or ``"pyarrow"``.
+
+        Return
+        ------
+            chunks : iterator of pd.DataFrame
+                The filtered raw chunks, with the dtypes of ``read_raw``.
+        """
+        self.scan_stats = {"rows_scanned": 0, "rows_kept": 0, "chunks": 0}
+        if engine == "pyarrow" or Path(file_path).suffix != ".csv":
+            chunks = self._iter_arrow_batches(file_path, provincias)
+        else:
+            chunks = self._iter_csv_chunks(
+                file_path, provincias, chunksize, engine
+            )
+        for chunk in chunks:
+            self.scan_stats["rows_kept"] += len(chunk)
+            self.scan_stats["chunks"] += 1
+            yield chunk
+
+    def _iter_csv_chunks(self, file_path, provincias, chunksize, engine):
+        """Stream a raw csv file with pandas, filtering each chunk."""
+        for chunk in pd.read_csv(
+            file_path,
+            usecols=self.usecols,
+            dtype=self.dtypes,
+            chunksize=chunksize,
+            engine=engine,
+        ):
+            self.scan_stats["rows_scanned"] += len(chunk)
+            if provincias is not None:
+                chunk = chunk[chunk["provincia_nombre"].isin(provincias)]
+            yield chunk
+
+    def _iter_arrow_batches(self, file_path, provincias=None):
+        """Stream a raw csv, parquet or feather file with pyarrow.
+
+        Parquet and Feather files are memory mapped. Each record batch is
+        filtered by provincia before it is converted to pandas.
+        """
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        suffix = Path(file_path).suffix
+        if suffix == ".parquet":
+            from pyarrow import parquet
+
+            batches = parquet.ParquetFile(
+                file_path, memory_map=True
+            ).iter_batches(columns=self.usecols)
+        elif suffix == ".feather":
+            reader = pa.ipc.open_file(pa.memory_map(str(file_path)))
+            batches = (
+                reader.get_batch(i) for i in range(reader.num_record_batches)
+            )
+        else:
+            from pyarrow import csv
+
+            # a type inferred from the first block fails on the next one,
+            # e.g. ``null`` for a column that is empty in the first block.
+            # ``cp`` has no dtype and is read as an integer, like the ids.
+            column_types = {
+                col: (
+                    pa.int64()
+                    if self.dtypes.get(col, "int64") == "int64"
+                    else pa.string()
+                )
+                for col in self.usecols
+            }
+            batches = csv.open_csv(
+                file_path,
+                convert_options=csv.ConvertOptions(
+                    include_columns=self.usecols,
+                    column_types=column_types,
+                    strings_can_be_null=True,
+                ),
+            )
+
+        for batch in batches:
+            self.scan_stats["rows_scanned"] += batch.num_rows
+            if provincias is not None:
+                mask = pc.is_in(
+                    batch.column("provincia_nombre"),
+                    value_set=pa.array(provincias),
+                )
+                batch = batch.filter(mask)
+            yield batch.to_pandas()[self.usecols].astype(self.dtypes)
+
+    def convert_raw(self, file_path, fmt: str, engine=None):
+        """Convert the raw csv file to a columnar storage format.
+
+        The raw file is streamed chunk by chunk into a Parquet or Feather
+        file with only the columns used by ``transform``, so later reads
+        are memory mapped and need no text parsing. The converted file
+        is kept in the object store, tagged with the sha256 of the raw
+        file, so an unchanged raw file is never converted twice.
+
+        Parameters
+        ----------
+        file_path : str
+            The path of the raw csv file.
+        fmt : str
+            The storage format: ``"csv"``, ``"parquet"`` or ``"feather"``.
+        engine : str, optional (default=None)
+            The parser engine used to read the csv, ``"c"`` or
+            ``"pyarrow"``.
+
+        Return
+        ------
+            file_path : Path
+                The path of the converted file, or ``file_path`` itself
+                for the ``"csv"`` format.
+        """
+        path = storage_path(file_path, fmt)
+        if fmt == "csv":
+            return path
+
+        columns = repr((self.usecols, self.dtypes)).encode()
+        ref = "{}-{}-{}-{}".format(
+            self.name,
+            fmt,
+            hashlib.sha256(columns).hexdigest()[:12],
+            file_sha256(file_path),
+        )
+        digest = self.store.resolve(ref)
+        if digest is not None:
+            log.info(f"{self.name} unchanged, reusing its {fmt} copy")
+            return self.store.link(digest, path)
+        if path.exists():
+            path.unlink()
+
+        import pyarrow as pa
+
+        writer = schema = None
+        try:
+            for chunk in self.iter_raw(file_path, engine=engine):
+                if schema is None:
+                    schema = pa.schema(
+                        [
+                            (
+                                (col, pa.from_numpy_dtype(dtype))
+                                if pd.api.types.is_numeric_dtype(dtype)
+                                else (col, pa.string())
+                            )
+                            for col, dtype in chunk.dtypes.items()
+                        ]
+                    )
+                    writer = self._arrow_writer(path, fmt, schema)
+                table = pa.Table.from_pandas(
+                    chunk, schema=schema, preserve_index=False
+                )
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+        self.store.tag(ref, self.store.put(path))
+        log.info(f"Stored {self.name} as {fmt} in {path}")
+        return path
+
+    @staticmethod
+    def _arrow_writer(path, fmt, schema):
+        """Open a streaming Parquet or Feather writer."""
+        import pyarrow as pa
+
+        if fmt == "parquet":
+            from pyarrow import parquet
+
+            return parquet.ParquetWriter(path, schema)
+        return pa.ipc.new_file(str(path), schema)
+
+    def read_provincias(
+        self,
+        file_path,
+        provincias: List[str] = None,
+        chunksize: int = RAW_CHUNK_SIZE,
+        engine=None,
+    ) -> Dict[str, pd.DataFrame]:
+        """Split the raw csv file by provincia in a single pass.
+
+        Parameters
+        ----------
+        file_path : str
+            The path of the raw csv, parquet or feather file.
+        provincias : list[str], optional (default=None)
+            The names of the provincias to keep. If ``None`` every
+            provincia found in the file is returned.
+        chunksize : int, optional (default=50000)
+            Number of rows parsed at a time by the ``"c"`` engine.
+        engine : str, optional (default=None)
+            The parser engine, ``"c"`` or ``"pyarrow"``.
+
+        Return
+        ------
+            frames : dict[str, pd.DataFrame]
+                The raw data frame of every provincia, by name. A
+                requested provincia without rows maps to an empty frame.
+        """
+        pieces = {name: [] for name in provincias or []}
+        empty = None
+        for chunk in self.iter_raw(file_path, provincias, chunksize, engine):
+            if empty is None:
+                empty = chunk.iloc[:0]
+            for name, piece in chunk.groupby(
+                "provincia_nombre", observed=True, sort=False
+            ):
+                pieces.setdefault(name, []).append(piece)
+
+        frames = {}
+        for name, parts in pieces.items():
+            if not parts:
+                frames[name] = empty
+                continue
+            df = pd.concat(parts, ignore_index=True)
+            # the categories of each chunk differ, so they are rebuilt.
+            categories = [
+                col
+                for col, dtype in self.dtypes.items()
+                if dtype == "category"
+            ]
+            frames[name] = df.astype({col: "category" for col in categories})
+        return frames
 
     def transform(self, df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -149,38 +704,7 @@ class UrlExtractor(object):
                 An instance of ``pd.DataFrame`` containing all the
                 information of pharmacies.
         """
-        renamed_cols = {
-            "establecimiento_id": "id",
-            "establecimiento_nombre": "nombre",
-            "localidad_id": "id_localidad",
-            "localidad_nombre": "localidad",
-            "provincia_id": "id_provincia",
-            "provincia_nombre": "provincia",
-            "departamento_id": "id_departamento",
-            "departamento_nombre": "nombre_departamento",
-            "cod_loc": "cod_localidad",
-            "tipologia_id": "id_tipologia",
-            "tipologia_nombre": "nombre_tipologia",
-            "cp": "codigo_postal",
-            "sitio_web": "web",
-        }
-
-        df = df.rename(columns=renamed_cols)
-
-        cols = [
-            "id",
-            "nombre",
-            "id_localidad",
-            "localidad",
-            "id_provincia",
-            "provincia",
-            "id_departamento",
-            "nombre_departamento",
-            "codigo_postal",
-            "domicilio",
-            "web",
-        ]
-
-        df = df[cols]
+        df = df.rename(columns=self.renamed_cols)
+        df = df[self.cols]
 
         return df
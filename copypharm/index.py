@@ -0,0 +1,388 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of the CoPyPharm Project
+#     https://github.com/juniors90/CoPyPharm.
+#
+# Copyright (c) 2022. Ferreira Juan David
+# License: MIT
+#   Full Text: https://github.com/pyCellID/CoPyPharm/blob/main/LICENSE
+
+# =============================================================================
+# DOCS
+# =============================================================================
+
+"""
+CoPyPharm.
+
+An extension that registers all pharmacies in Córdoba - Argentina.
+"""
+
+# =============================================================================
+# IMPORTS
+# =============================================================================
+
+import json
+import logging
+import os
+import shutil
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+import pandas as pd
+
+from .constants import FARMACIAS_TABLE_NAME
+from .storage import read_frame
+
+log = logging.getLogger()
+
+# : the integer columns of the ``farmacias`` table kept by the index.
+INDEX_INT_COLUMNS = ("id", "id_localidad", "id_departamento", "codigo_postal")
+
+# : the text columns of the ``farmacias`` table kept by the index.
+INDEX_STR_COLUMNS = ("nombre", "domicilio")
+
+# : the columns with an inverted index.
+INDEXED_COLUMNS = ("id_localidad", "id_departamento", "codigo_postal")
+
+
+def _encode_strings(values):
+    """Pack strings into a utf-8 buffer and their ``offsets``."""
+    encoded = [
+        b"" if pd.isna(value) else str(value).encode("utf-8")
+        for value in values
+    ]
+    lengths = np.fromiter((len(b) for b in encoded), np.int64, len(encoded))
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    buffer = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return buffer, offsets
+
+
+def _inverted_index(values):
+    """Return the CSR inverted index of an integer array.
+
+    Return
+    ------
+    keys : ``numpy.ndarray``
+        The distinct values, sorted.
+    offsets : ``numpy.ndarray``
+        The rows of ``keys[i]`` are ``rows[offsets[i]:offsets[i + 1]]``.
+    rows : ``numpy.ndarray``
+        The row positions grouped by value, in row order.
+    """
+    rows = np.argsort(values, kind="stable")
+    keys, counts = np.unique(values[rows], return_counts=True)
+    offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return keys, offsets, rows
+
+
+def save_arrays(path, arrays, **meta) -> Path:
+    """Store named arrays as a directory of ``.npy`` files.
+
+    The directory is written next to ``path`` and renamed into place,
+    so readers never see a partial directory.
+
+    Parameters
+    ----------
+    path : str or Path
+        The destination directory.
+    arrays : dict[str, ``numpy.ndarray``]
+        The arrays, by name.
+    **meta
+        JSON serializable metadata stored in ``index.json``.
+
+    Return
+    ------
+    path : Path
+        The destination directory.
+    """
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    tmp_path.mkdir(parents=True)
+    for name, array in arrays.items():
+        np.save(tmp_path / f"{name}.npy", array)
+    with open(tmp_path / "index.json", "w") as f:
+        json.dump(dict(meta, arrays=sorted(arrays)), f)
+    if path.exists():
+        old_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.old")
+        os.replace(path, old_path)
+        os.replace(tmp_path, path)
+        shutil.rmtree(old_path)
+    else:
+        os.replace(tmp_path, path)
+    return path
+
+
+def load_arrays(path, mmap_mode="r"):
+    """Open the arrays stored with ``save_arrays``.
+
+    Parameters
+    ----------
+    path : str or Path
+        The directory of the arrays.
+    mmap_mode : str, optional (default="r")
+        The ``numpy.load`` memory map mode; ``None`` reads the arrays
+        into memory.
+
+    Return
+    ------
+    arrays : dict[str, ``numpy.ndarray``]
+        The arrays, by name.
+    meta : dict
+        The metadata stored with them.
+    """
+    path = Path(path)
+    with open(path / "index.json") as f:
+        meta = json.load(f)
+    arrays = {
+        name: np.load(path / f"{name}.npy", mmap_mode=mmap_mode)
+        for name in meta.pop("arrays")
+    }
+    return arrays, meta
+
+
+class PharmacyIndex(object):
+    """Array-backed ``farmacias`` table with inverted indexes.
+
+    The integer columns are stored as ``numpy`` arrays, the text columns
+    as a single utf-8 buffer with offsets, and ``id_localidad``,
+    ``id_departamento`` and ``codigo_postal`` have a CSR inverted index
+    (sorted keys, offsets and row positions). A lookup finds the slot of
+    its key in a hash map and returns the ``k`` matching rows in O(k).
+
+    ``save`` stores every array as a ``.npy`` file of a directory that
+    ``load`` memory maps, so many processes share a single copy of the
+    index in the page cache.
+
+    Parameters
+    ----------
+    arrays : dict[str, ``numpy.ndarray``]
+        The arrays of the index, as built by ``from_frame``.
+
+    Examples
+    --------
+    >>> df = pd.DataFrame(
+    ...     {
+    ...         "id": [70340492347884, 70340282347858],
+    ...         "nombre": ["PERALTA HNOS", "JUAREZ"],
+    ...         "id_localidad": [34049010000, 34028010000],
+    ...         "id_departamento": [49, 28],
+    ...         "codigo_postal": [3610, 3636],
+    ...         "domicilio": ["Avenida San Martin 470", "Saavedra 12"],
+    ...     }
+    ... )
+    >>> index = PharmacyIndex.from_frame(df)
+    >>> index.by_codigo_postal(3636)["nombre"].tolist()
+    ['JUAREZ']
+    """
+
+    def __init__(self, arrays) -> None:
+        self.arrays = arrays
+        self._slots = {}
+
+    def __repr__(self) -> str:
+        """Print a representation of your object."""
+        return f"<PharmacyIndex of {len(self)} pharmacies>"
+
+    def __len__(self) -> int:
+        """Return the number of pharmacies."""
+        return len(self.arrays["id"])
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame):
+        """Build the index of a ``farmacias`` table.
+
+        Parameters
+        ----------
+        df : ``pandas.DataFrame``
+            The ``farmacias`` table, as stored by ``trasform_raws``,
+            with ``id`` as index or as a column.
+
+        Return
+        ------
+        index : PharmacyIndex
+            The index of the table.
+        """
+        if "id" not in df.columns:
+            df = df.reset_index()
+        arrays = {}
+        for col in INDEX_INT_COLUMNS:
+            # a missing codigo_postal is stored as -1.
+            values = pd.to_numeric(df[col], errors="coerce")
+            arrays[col] = values.fillna(-1).to_numpy(dtype=np.int64)
+        for col in INDEX_STR_COLUMNS:
+            buffer, offsets = _encode_strings(df[col])
+            arrays[f"{col}.data"] = buffer
+            arrays[f"{col}.offsets"] = offsets
+        for col in INDEXED_COLUMNS:
+            keys, offsets, rows = _inverted_index(arrays[col])
+            arrays[f"{col}.keys"] = keys
+            arrays[f"{col}.offsets"] = offsets
+            arrays[f"{col}.rows"] = rows
+        ids, rows = np.unique(arrays["id"], return_index=True)
+        arrays["id.keys"] = ids
+        arrays["id.rows"] = rows
+        return cls(arrays)
+
+    @classmethod
+    def from_file(cls, file_path):
+        """Build the index of a stored ``farmacias`` table.
+
+        Parameters
+        ----------
+        file_path : str or Path
+            The location of the table, in any format of ``read_frame``.
+
+        Return
+        ------
+        index : PharmacyIndex
+            The index of the table.
+        """
+        return cls.from_frame(read_frame(file_path))
+
+    @classmethod
+    def from_db(cls, engine=None):
+        """Build the index of the ``farmacias`` table of the database.
+
+        Parameters
+        ----------
+        engine : ``sqlalchemy.engine.Engine``, optional (default=None)
+            The database, by default the shared engine of ``get_engine``.
+
+        Return
+        ------
+        index : PharmacyIndex
+            The index of the table.
+        """
+        if engine is None:
+            from .db import get_engine
+
+            engine = get_engine()
+        columns = INDEX_INT_COLUMNS + INDEX_STR_COLUMNS
+        df = pd.read_sql_table(FARMACIAS_TABLE_NAME, engine, columns=columns)
+        return cls.from_frame(df)
+
+    def save(self, path) -> Path:
+        """Store the index as a directory of ``.npy`` files.
+
+        Parameters
+        ----------
+        path : str or Path
+            The destination directory.
+
+        Return
+        ------
+        path : Path
+            The destination directory.
+        """
+        return save_arrays(path, self.arrays, rows=len(self))
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        """Open an index stored with ``save``.
+
+        Parameters
+        ----------
+        path : str or Path
+            The directory of the index.
+        mmap_mode : str, optional (default="r")
+            The ``numpy.load`` memory map mode; ``None`` reads the
+            arrays into memory.
+
+        Return
+        ------
+        index : PharmacyIndex
+            The stored index.
+        """
+        arrays, _ = load_arrays(path, mmap_mode)
+        return cls(arrays)
+
+    def _slot(self, col, value):
+        """Return the position of ``value`` in the keys of ``col``."""
+        slots = self._slots.get(col)
+        if slots is None:
+            keys = self.arrays[f"{col}.keys"].tolist()
+            slots = self._slots[col] = dict(zip(keys, range(len(keys))))
+        return slots.get(value)
+
+    def rows(self, col: str, value) -> np.ndarray:
+        """Return the row positions where ``col`` equals ``value``.
+
+        Parameters
+        ----------
+        col : str
+            ``"id_localidad"``, ``"id_departamento"`` or
+            ``"codigo_postal"``.
+        value : int
+            The value looked up.
+
+        Return
+        ------
+        rows : ``numpy.ndarray``
+            The positions of the matching rows, in table order.
+        """
+        if col not in INDEXED_COLUMNS:
+            raise KeyError(f"{col!r} is not indexed, use {INDEXED_COLUMNS}")
+        slot = self._slot(col, int(value))
+        if slot is None:
+            return np.empty(0, dtype=np.int64)
+        offsets = self.arrays[f"{col}.offsets"]
+        start, stop = offsets[slot], offsets[slot + 1]
+        return np.asarray(self.arrays[f"{col}.rows"][start:stop])
+
+    def _text(self, col, row):
+        """Decode the text of ``col`` at ``row``."""
+        offsets = self.arrays[f"{col}.offsets"]
+        start, stop = offsets[row], offsets[row + 1]
+        return self.arrays[f"{col}.data"][start:stop].tobytes().decode("utf-8")
+
+    def take(self, rows) -> pd.DataFrame:
+        """Return the pharmacies at the row positions ``rows``.
+
+        Return
+        ------
+        df : ``pandas.DataFrame``
+            The rows, indexed by ``id`` like the stored table.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        data = {col: self.arrays[col][rows] for col in INDEX_INT_COLUMNS}
+        for col in INDEX_STR_COLUMNS:
+            data[col] = [self._text(col, row) for row in rows]
+        columns = [
+            "id",
+            "nombre",
+            "id_localidad",
+            "id_departamento",
+            "codigo_postal",
+            "domicilio",
+        ]
+        return pd.DataFrame(data, columns=columns).set_index("id")
+
+    def get(self, pharmacy_id: int):
+        """Return the pharmacy with ``pharmacy_id``, or ``None``.
+
+        Return
+        ------
+        pharmacy : ``pandas.Series`` or None
+            The columns of the pharmacy.
+        """
+        slot = self._slot("id", int(pharmacy_id))
+        if slot is None:
+            return None
+        return self.take([self.arrays["id.rows"][slot]]).iloc[0]
+
+    def by_localidad(self, id_localidad: int) -> pd.DataFrame:
+        """Return the pharmacies of a localidad."""
+        return self.take(self.rows("id_localidad", id_localidad))
+
+    def by_departamento(self, id_departamento: int) -> pd.DataFrame:
+        """Return the pharmacies of a departamento."""
+        return self.take(self.rows("id_departamento", id_departamento))
+
+    def by_codigo_postal(self, codigo_postal: int) -> pd.DataFrame:
+        """Return the pharmacies of a código postal."""
+        return self.take(self.rows("codigo_postal", codigo_postal))
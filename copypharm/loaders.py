@@ -22,32 +22,139 @@ An extension that registers all pharmacies in Córdoba - Argentina.
 # IMPORTS
 # =============================================================================
 
+import csv
+import io
 import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import nullcontext
 
 import pandas as pd
 
-from sqlalchemy import create_engine
+from sqlalchemy import inspect
+from sqlalchemy.sql import text
 
+from .changes import diff_frames
 from .constants import (
     DEPARTAMENTOS_TABLE_NAME,
     FARMACIAS_TABLE_NAME,
+    LOAD_CHUNKSIZE,
     LOCALIDADES_TABLE_NAME,
 )
-from .settings import setup_data
+from .db import get_engine
+from .metrics import peak_rss
+from .storage import read_frame
+from .versions import ensure_versions_table, record_load
 
-
-engine = create_engine(setup_data["SQLALCHEMY_DATABASE_URI"])
 log = logging.getLogger()
 
 
+def __getattr__(name):
+    """Keep ``loaders.engine`` available, built on first access."""
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# : callables notified with the table name after every committed load.
+_load_listeners = []
+
+
+def add_load_listener(listener):
+    """Call ``listener(table_name)`` after every committed load.
+
+    Readers that cache query results, like the ``sample_app`` service,
+    use it to drop their cache when a table changes.
+
+    Parameters
+    ----------
+    listener : callable
+        A function that takes the name of the loaded table.
+    """
+    _load_listeners.append(listener)
+
+
+def remove_load_listener(listener):
+    """Stop calling a listener added with ``add_load_listener``."""
+    _load_listeners.remove(listener)
+
+
+def _notify_loaded(table_name):
+    """Call the load listeners of a committed table."""
+    for listener in list(_load_listeners):
+        listener(table_name)
+
+
+def _psql_copy(table, conn, keys, data_iter):
+    """Insert the rows of a ``to_sql`` chunk with PostgreSQL ``COPY``."""
+    dbapi_conn = conn.connection
+    with dbapi_conn.cursor() as cur:
+        buf = io.StringIO()
+        csv.writer(buf).writerows(data_iter)
+        buf.seek(0)
+        columns = ", ".join(f'"{k}"' for k in keys)
+        name = f"{table.schema}.{table.name}" if table.schema else table.name
+        cur.copy_expert(
+            f"COPY {name} ({columns}) FROM STDIN WITH CSV", file=buf
+        )
+
+
 class BaseLoader:
-    """Base class for Load all tables in DB."""
+    """Base class for Load all tables in DB.
+
+    Attributes
+    ----------
+    depends_on : tuple[str], optional (default=())
+        The tables that must be loaded before this one, because it
+        references them with foreign keys.
+    chunksize : int, optional (default=1000)
+        Number of rows sent in each bulk insert statement.
+    method : str or callable, optional (default=None)
+        The ``DataFrame.to_sql`` insertion method. If ``None``,
+        ``COPY`` is used on PostgreSQL and multi-row ``INSERT``
+        statements elsewhere.
+    """
+
+    depends_on = ()
+    chunksize = LOAD_CHUNKSIZE
+    method = None
+
+    @staticmethod
+    def _as_frame(data):
+        """Return ``data`` as a loadable frame, reading it if it is a path.
+
+        A named index, as the tables of ``core.trasform_frames`` have,
+        is turned into a column, as it would be read from the stored
+        file.
+        """
+        if not isinstance(data, pd.DataFrame):
+            return read_frame(data)
+        if any(name is not None for name in data.index.names):
+            return data.reset_index()
+        return data
+
+    def _insert_method(self, conn):
+        """Return the bulk insertion method for the connection dialect."""
+        if self.method is not None:
+            return self.method
+        if conn.dialect.name == "postgresql":
+            return _psql_copy
+        return "multi"
 
     def load_table(self, df):
         """Read a data frame from csv file path.
 
         Load ``Departamentos`` table in the database from sql query.
 
+        The rows are bulk inserted into a staging table and then swapped
+        into the live table in a single transaction, so the schema
+        created by ``scripts.create_table`` (keys and constraints) is
+        kept and readers never see an empty table. If the live table
+        does not exist yet it is created from the data frame. The load
+        is stamped with a new version in ``load_versions`` (see
+        ``versions.record_load``) in the same transaction, and the load
+        listeners are notified once it is committed.
+
         Parameters
         ----------
         df: ``pandas.DataFrame``
@@ -55,13 +162,161 @@ class BaseLoader:
 
         Return
         ------
-        df.to_sql : function
-            A sql query such that load all values in
-            the database.
+        rows : int
+            The number of rows loaded in the database.
         """
-        return df.to_sql(
-            self.table_name, con=engine, index=False, if_exists="replace"
-        )
+        table = self.table_name
+        staging = f"{table}_staging"
+        ensure_versions_table(get_engine())
+        with get_engine().begin() as conn:
+            method = self._insert_method(conn)
+            created = not inspect(conn).has_table(table)
+            if created:
+                log.info(f"Creating table {table}")
+                df.to_sql(
+                    table,
+                    con=conn,
+                    index=False,
+                    chunksize=self.chunksize,
+                    method=method,
+                )
+            else:
+                log.info(f"Loading {len(df)} rows into {staging}")
+                df.to_sql(
+                    staging,
+                    con=conn,
+                    index=False,
+                    if_exists="replace",
+                    chunksize=self.chunksize,
+                    method=method,
+                )
+
+                columns = ", ".join(df.columns)
+                self._defer_constraints(conn)
+                try:
+                    conn.execute(text(f"DELETE FROM {table}"))
+                    conn.execute(
+                        text(
+                            f"INSERT INTO {table} ({columns}) "
+                            f"SELECT {columns} FROM {staging}"
+                        )
+                    )
+                finally:
+                    self._restore_constraints(conn)
+            record_load(conn, table, df)
+        if not created:
+            with get_engine().begin() as conn:
+                conn.execute(text(f"DROP TABLE IF EXISTS {staging}"))
+        _notify_loaded(table)
+        return len(df)
+
+    def upsert_table(self, df, previous=None):
+        """Apply only the changes between a snapshot and the live table.
+
+        The new snapshot is compared by ``key`` with the previous one
+        and only the inserted, updated and deleted rows are written, in
+        batches and in a single transaction, so the write volume is
+        proportional to the change and not to the table size. A change
+        is stamped with a new version in ``load_versions``.
+
+        Parameters
+        ----------
+        df : ``pandas.DataFrame`` or str
+            The new snapshot, or the path of the file that stores it.
+        previous : ``pandas.DataFrame`` or str, optional (default=None)
+            The previous snapshot, or the path of the file that stores
+            it. If ``None`` the live table is read from the database.
+
+        Return
+        ------
+        changes : ``ChangeSet``
+            The rows inserted, updated and deleted.
+        """
+        df = self._as_frame(df)
+
+        table = self.table_name
+        key = self.key
+        ensure_versions_table(get_engine())
+        with get_engine().begin() as conn:
+            exists = inspect(conn).has_table(table)
+            if previous is None:
+                previous = (
+                    pd.read_sql_table(table, conn) if exists else df.iloc[:0]
+                )
+            else:
+                previous = self._as_frame(previous)
+
+            changes = diff_frames(previous, df, key)
+            log.info(f"Upserting {table}: {changes!r}")
+            if not exists:
+                df.iloc[:0].to_sql(table, con=conn, index=False)
+
+            self._defer_constraints(conn)
+            try:
+                self._apply_changes(conn, changes)
+            finally:
+                self._restore_constraints(conn)
+            if len(changes):
+                record_load(conn, table, df)
+        if len(changes):
+            _notify_loaded(table)
+        return changes
+
+    def _apply_changes(self, conn, changes):
+        """Write a change set with batched statements."""
+        table = self.table_name
+        key = self.key
+
+        deleted = changes.deletes[key].tolist()
+        for start in range(0, len(deleted), self.chunksize):
+            batch = deleted[start : start + self.chunksize]  # noqa: E203
+            params = {f"k{i}": value for i, value in enumerate(batch)}
+            placeholders = ", ".join(f":{name}" for name in params)
+            conn.execute(
+                text(f"DELETE FROM {table} WHERE {key} IN ({placeholders})"),
+                params,
+            )
+
+        if len(changes.updates):
+            updates = changes.updates.astype(object)
+            updates = updates.where(updates.notna(), None)
+            columns = [col for col in updates.columns if col != key]
+            assignments = ", ".join(f"{col} = :{col}" for col in columns)
+            conn.execute(
+                text(f"UPDATE {table} SET {assignments} WHERE {key} = :{key}"),
+                updates.to_dict(orient="records"),
+            )
+
+        if len(changes.inserts):
+            changes.inserts.to_sql(
+                table,
+                con=conn,
+                index=False,
+                if_exists="append",
+                chunksize=self.chunksize,
+                method=self._insert_method(conn),
+            )
+
+    @staticmethod
+    def _defer_constraints(conn):
+        """Defer the foreign key checks until the swap is complete.
+
+        MySQL disables the checks until ``_restore_constraints``.
+        PostgreSQL defers them to the commit of the transaction, which
+        only affects the foreign keys declared ``DEFERRABLE``, as
+        ``scripts.build_constraints`` does; SQLite does not enforce the
+        foreign keys of the tables it loads.
+        """
+        if conn.dialect.name == "mysql":
+            conn.execute(text("SET FOREIGN_KEY_CHECKS = 0"))
+        elif conn.dialect.name == "postgresql":
+            conn.execute(text("SET CONSTRAINTS ALL DEFERRED"))
+
+    @staticmethod
+    def _restore_constraints(conn):
+        """Restore the foreign key checks disabled by the swap."""
+        if conn.dialect.name == "mysql":
+            conn.execute(text("SET FOREIGN_KEY_CHECKS = 1"))
 
 
 class FarmaciasLoader(BaseLoader):
@@ -71,9 +326,16 @@ class FarmaciasLoader(BaseLoader):
     ----------
     table_name : str, optional (default='farmacias')
         The name of table.
+    key : str, optional (default='id')
+        The column that identifies each row.
+    depends_on : tuple[str], optional
+        The tables referenced by the foreign keys of ``farmacias``
+        (default=('localidades', 'departamentos')).
     """
 
     table_name = FARMACIAS_TABLE_NAME
+    key = "id"
+    depends_on = (LOCALIDADES_TABLE_NAME, DEPARTAMENTOS_TABLE_NAME)
 
     def load_table(self, file_path):
         """Read a csv file from a file path and and load ``farmacias`` table.
@@ -82,8 +344,9 @@ class FarmaciasLoader(BaseLoader):
 
         Parameters
         ----------
-        file_path : str
-            The path of csv file with all ``Farmacias``.
+        file_path : str or ``pandas.DataFrame``
+            The path of the csv, parquet or feather file of ``Farmacias``,
+            or the data frame itself.
 
         Return
         ------
@@ -91,7 +354,7 @@ class FarmaciasLoader(BaseLoader):
             A sql query such that load all ``Farmacias`` in
             the database.
         """
-        df = pd.read_csv(file_path)
+        df = self._as_frame(file_path)
         return super().load_table(df)
 
 
@@ -102,9 +365,12 @@ class LocalidadesLoader(BaseLoader):
     ----------
     table_name : str, optional (default='localidades')
         The name of table.
+    key : str, optional (default='id_localidad')
+        The column that identifies each row.
     """
 
     table_name = LOCALIDADES_TABLE_NAME
+    key = "id_localidad"
 
     def load_table(self, file_path):
         """Read a csv file from a file path and and load ``localidades`` table.
@@ -113,8 +379,9 @@ class LocalidadesLoader(BaseLoader):
 
         Parameters
         ----------
-        file_path : str
-            The path of csv file with all ``Localidades``.
+        file_path : str or ``pandas.DataFrame``
+            The path of the csv, parquet or feather file of ``Localidades``,
+            or the data frame itself.
 
         Return
         ------
@@ -122,7 +389,7 @@ class LocalidadesLoader(BaseLoader):
             A sql query such that load all ``Localidades`` in
             the database.
         """
-        df = pd.read_csv(file_path)
+        df = self._as_frame(file_path)
         return super().load_table(df)
 
 
@@ -133,9 +400,12 @@ class DepartamentosLoader(BaseLoader):
     ----------
     table_name : str, optional (default='departamentos')
         The name of table.
+    key : str, optional (default='id_departamento')
+        The column that identifies each row.
     """
 
     table_name = DEPARTAMENTOS_TABLE_NAME
+    key = "id_departamento"
 
     def load_table(self, file_path):
         """Read a csv file from a file path and load ``departamentos`` table.
@@ -144,8 +414,9 @@ class DepartamentosLoader(BaseLoader):
 
         Parameters
         ----------
-        file_path : str
-            The path of csv file with all ``Departamentos``.
+        file_path : str or ``pandas.DataFrame``
+            The path of the csv, parquet or feather file of ``Departamentos``,
+            or the data frame itself.
 
         Return
         ------
@@ -153,5 +424,127 @@ class DepartamentosLoader(BaseLoader):
             A sql query such that load all ``Departamentos`` in
             the database.
         """
-        df = pd.read_csv(file_path)
+        df = self._as_frame(file_path)
+        return super().load_table(df)
+
+
+class RollupLoader(BaseLoader):
+    """Load a rollup table of ``rollups.ROLLUPS`` in the DB.
+
+    Parameters
+    ----------
+    table_name : str
+        The name of the rollup table.
+    key : str
+        The column the rollup groups by, which identifies each row.
+    """
+
+    def __init__(self, table_name, key) -> None:
+        self.table_name = table_name
+        self.key = key
+
+    def __repr__(self) -> str:
+        """Print a representation of your object."""
+        return f"<RollupLoader of {self.table_name}>"
+
+    def load_table(self, file_path):
+        """Read a rollup from a file path and load its table.
+
+        Parameters
+        ----------
+        file_path : str or ``pandas.DataFrame``
+            The path of the csv, parquet or feather file of the rollup,
+            or the data frame itself.
+
+        Return
+        ------
+        rows : int
+            The number of rows loaded in the database.
+        """
+        df = self._as_frame(file_path)
         return super().load_table(df)
+
+
+def load_tables(
+    sources, incremental=False, max_workers=None, stage=None, upserted=()
+):
+    """Load several tables concurrently, in foreign key order.
+
+    Every loader starts as soon as the tables it ``depends_on`` are
+    committed, and independent tables are loaded at the same time on
+    separate pooled connections, so the load takes about the time of
+    the longest chain of tables and not the sum of all of them.
+
+    Parameters
+    ----------
+    sources : list[tuple[``BaseLoader``, object]]
+        Every loader with the path or data frame it loads.
+    incremental : bool, optional (default=False)
+        If ``True`` ``upsert_table`` is used instead of ``load_table``.
+    max_workers : int, optional (default=None)
+        Number of tables loaded at the same time, by default all the
+        tables that are ready.
+    stage : callable, optional (default=None)
+        A function that takes a stage name (``load_<table>``) and
+        returns a context manager run around each load in its thread,
+        e.g. ``StageProfiler.stage``.
+    upserted : collection[str], optional (default=())
+        The tables upserted even if ``incremental`` is ``False``, e.g.
+        the dimension tables, whose members rarely change.
+
+    Return
+    ------
+    results : dict[str, dict]
+        For every table, the ``result`` of the load (rows loaded or
+        ``ChangeSet``), the ``rows_in`` of its data, the ``rows``
+        written, the wall ``seconds`` and the ``cpu_seconds`` of the
+        thread that loaded it, and the ``peak_rss`` of the process when
+        it was loaded. The tables share the process, so the peak of a
+        table includes the tables loaded before or next to it.
+    """
+    pending = {loader.table_name: (loader, data) for loader, data in sources}
+    results = {}
+
+    def _load(loader, data):
+        start = time.perf_counter()
+        cpu = time.thread_time()
+        with stage(f"load_{loader.table_name}") if stage else nullcontext():
+            data = loader._as_frame(data)
+            if incremental or loader.table_name in upserted:
+                result = loader.upsert_table(data)
+                rows = len(result)
+            else:
+                result = rows = loader.load_table(data)
+        seconds = time.perf_counter() - start
+        log.info(f"Loaded {loader.table_name} in {seconds:.2f}s")
+        return {
+            "result": result,
+            "rows_in": len(data),
+            "rows": rows,
+            "seconds": seconds,
+            "cpu_seconds": time.thread_time() - cpu,
+            "peak_rss": peak_rss(),
+        }
+
+    executor = ThreadPoolExecutor(max_workers=max_workers or len(pending) or 1)
+    running = {}
+    try:
+        while pending or running:
+            for name in list(pending):
+                loader, data = pending[name]
+                waiting = [
+                    dep
+                    for dep in loader.depends_on
+                    if dep in pending or dep in running.values()
+                ]
+                if not waiting:
+                    del pending[name]
+                    running[executor.submit(_load, loader, data)] = name
+            if not running:
+                raise ValueError(f"Circular table dependencies: {pending}")
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future)] = future.result()
+    finally:
+        executor.shutdown(wait=True)
+    return results
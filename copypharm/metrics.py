@@ -0,0 +1,188 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of the CoPyPharm Project
+#     https://github.com/juniors90/CoPyPharm.
+#
+# Copyright (c) 2022. Ferreira Juan David
+# License: MIT
+#   Full Text: https://github.com/pyCellID/CoPyPharm/blob/main/LICENSE
+
+# =============================================================================
+# DOCS
+# =============================================================================
+
+"""
+CoPyPharm.
+
+An extension that registers all pharmacies in Córdoba - Argentina.
+"""
+
+# =============================================================================
+# IMPORTS
+# =============================================================================
+
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+# : the numeric fields of a stage exported as Prometheus gauges.
+PROMETHEUS_FIELDS = {
+    "wall_seconds": "Wall-clock time of the stage in seconds.",
+    "cpu_seconds": "CPU time of the stage in seconds.",
+    "rows_in": "Rows read by the stage.",
+    "rows_out": "Rows produced by the stage.",
+    "bytes_downloaded": "Bytes downloaded by the stage.",
+    "bytes_written": "Bytes written to disk by the stage.",
+    "peak_rss_bytes": "Peak resident set size of the process after the stage.",
+}
+
+
+def peak_rss():
+    """Return the peak resident set size of the process in bytes.
+
+    Return
+    ------
+    peak_rss : int or None
+        The peak RSS, or ``None`` if the platform does not provide it.
+    """
+    if resource is None:  # pragma: no cover
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere.
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def file_size(paths):
+    """Return the total size in bytes of the existing files of ``paths``."""
+    return sum(os.path.getsize(p) for p in paths if os.path.exists(p))
+
+
+def _write_atomic(path, content):
+    """Write a text file through a temporary file and a rename."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+class RunReport(object):
+    """Collect structured metrics of every stage of a pipeline run.
+
+    Parameters
+    ----------
+    date_str : str
+        The date on run with format YYYY-mm-dd.
+
+    Examples
+    --------
+    >>> report = RunReport("2022-03-27")
+    >>> with report.stage("trasform_raws") as stage:
+    ...     stage["rows_out"] = 162
+    >>> report.stages[0]["rows_out"]
+    162
+    """
+
+    def __init__(self, date_str) -> None:
+        self.date_str = date_str
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+        self.stages = []
+
+    def __repr__(self) -> str:
+        """Print a representation of your object."""
+        report = "<RunReport for {date}: {n} stages>"
+        return report.format(date=self.date_str, n=len(self.stages))
+
+    @contextmanager
+    def stage(self, name):
+        """Measure the wall time, CPU time and peak memory of a stage.
+
+        Parameters
+        ----------
+        name : str
+            The name of the stage.
+
+        Return
+        ------
+        metrics : dict
+            The metrics of the stage; the caller may add ``rows_in``,
+            ``rows_out``, ``bytes_downloaded`` and ``bytes_written``.
+        """
+        metrics = {"stage": name}
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield metrics
+        finally:
+            metrics["wall_seconds"] = time.perf_counter() - wall
+            metrics["cpu_seconds"] = time.process_time() - cpu
+            metrics["peak_rss_bytes"] = peak_rss()
+            self.stages.append(metrics)
+
+    def add(self, name, **metrics):
+        """Record the metrics of a stage measured elsewhere.
+
+        Parameters
+        ----------
+        name : str
+            The name of the stage.
+        **metrics
+            The metrics of the stage.
+        """
+        self.stages.append(dict(stage=name, **metrics))
+
+    def to_dict(self):
+        """Return the report as a JSON serializable dict."""
+        return {
+            "date": self.date_str,
+            "started_at": self.started_at,
+            "stages": self.stages,
+        }
+
+    def to_json(self, path):
+        """Write the report as a JSON file.
+
+        Parameters
+        ----------
+        path : str or Path
+            The destination location.
+        """
+        _write_atomic(path, json.dumps(self.to_dict(), indent=2) + "\n")
+
+    def to_prometheus(self, path):
+        """Write the report in the Prometheus textfile exposition format.
+
+        The file is written atomically, as the node exporter textfile
+        collector expects.
+
+        Parameters
+        ----------
+        path : str or Path
+            The destination location, usually ending with ``.prom``.
+        """
+        lines = []
+        for field, help_text in PROMETHEUS_FIELDS.items():
+            metric = f"copypharm_stage_{field}"
+            samples = [
+                (s["stage"], s[field])
+                for s in self.stages
+                if s.get(field) is not None
+            ]
+            if not samples:
+                continue
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} gauge")
+            for stage, value in samples:
+                lines.append(f'{metric}{{stage="{stage}"}} {value}')
+        _write_atomic(path, "\n".join(lines) + "\n")
@@ -0,0 +1,184 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of the CoPyPharm Project
+#     https://github.com/juniors90/CoPyPharm.
+#
+# Copyright (c) 2022. Ferreira Juan David
+# License: MIT
+#   Full Text: https://github.com/pyCellID/CoPyPharm/blob/main/LICENSE
+
+# =============================================================================
+# DOCS
+# =============================================================================
+
+"""
+CoPyPharm.
+
+An extension that registers all pharmacies in Córdoba - Argentina.
+"""
+
+# =============================================================================
+# IMPORTS
+# =============================================================================
+
+import hashlib
+import logging
+import os
+import shutil
+import uuid
+from pathlib import Path
+
+from .constants import DOWNLOAD_CHUNK_SIZE
+
+log = logging.getLogger()
+
+
+def file_sha256(path, chunk_size=DOWNLOAD_CHUNK_SIZE):
+    """Return the hex sha256 digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def link_file(src, dst):
+    """Make ``dst`` a hardlink of ``src``, replacing it atomically.
+
+    The file is copied instead when hardlinks are not available, e.g.
+    across file systems.
+
+    Parameters
+    ----------
+    src : str or Path
+        The existing file.
+    dst : str or Path
+        The destination location.
+
+    Return
+    ------
+    dst : Path
+        The destination location.
+    """
+    src, dst = Path(src), Path(dst)
+    if dst.exists() and os.path.samefile(src, dst):
+        return dst
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = dst.with_name(f".{dst.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        os.link(src, tmp_path)
+    except OSError:
+        shutil.copyfile(src, tmp_path)
+    os.replace(tmp_path, dst)
+    return dst
+
+
+class ObjectStore(object):
+    """Store files by the sha256 of their content.
+
+    Every distinct content is kept once, as ``<root>/<ab>/<sha256>``,
+    and the files of the dated ``data/`` tree are hardlinks to it, so
+    identical daily snapshots take the disk space of a single file.
+    The permissions of the files are left alone, since the ``data/``
+    tree may hold files of the repository; instead, writers of the
+    ``data/`` tree replace files and never write them in place, so an
+    object and its other links are never changed.
+
+    Parameters
+    ----------
+    root : str or Path
+        The directory of the objects.
+    """
+
+    def __init__(self, root) -> None:
+        self.root = Path(root)
+
+    def __repr__(self) -> str:
+        """Print a representation of your object."""
+        return f"<ObjectStore in {self.root}>"
+
+    def __contains__(self, digest) -> bool:
+        """Return whether an object with ``digest`` is stored."""
+        return bool(digest) and self.object_path(digest).exists()
+
+    @classmethod
+    def for_base_dir(cls, base_dir):
+        """Return the store of the ``data/`` tree under ``base_dir``."""
+        return cls(Path(base_dir) / "data" / "objects")
+
+    def object_path(self, digest: str) -> Path:
+        """Return the location of the object with ``digest``."""
+        return self.root / digest[:2] / digest
+
+    def put(self, file_path, digest: str = None) -> str:
+        """Store a file and replace it with a hardlink to its object.
+
+        When the content is already stored the file is dropped in
+        favour of the existing object.
+
+        Parameters
+        ----------
+        file_path : str or Path
+            The file to store.
+        digest : str, optional (default=None)
+            The sha256 of the file, computed if not given.
+
+        Return
+        ------
+        digest : str
+            The sha256 of the file.
+        """
+        digest = digest or file_sha256(file_path)
+        obj = self.object_path(digest)
+        if not obj.exists():
+            link_file(file_path, obj)
+        link_file(obj, file_path)
+        return digest
+
+    def link(self, digest: str, file_path) -> Path:
+        """Make ``file_path`` a hardlink to the object with ``digest``.
+
+        Parameters
+        ----------
+        digest : str
+            The sha256 of a stored object.
+        file_path : str or Path
+            The destination location.
+
+        Return
+        ------
+        file_path : Path
+            The destination location.
+        """
+        if digest not in self:
+            raise KeyError(f"No object {digest} in {self.root}")
+        return link_file(self.object_path(digest), file_path)
+
+    def tag(self, name: str, digest: str) -> None:
+        """Record that ``name`` refers to the object with ``digest``.
+
+        Tags let a stage find the output it derived from an input
+        without reading it again, e.g. the Parquet copy of a raw file.
+        """
+        ref_path = self.root / "refs" / name
+        ref_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = ref_path.with_name(f".{name}.{uuid.uuid4().hex}.tmp")
+        tmp_path.write_text(digest)
+        os.replace(tmp_path, ref_path)
+
+    def resolve(self, name: str):
+        """Return the digest tagged as ``name``, or ``None``.
+
+        A tag whose object is no longer stored resolves to ``None``.
+        """
+        try:
+            digest = (self.root / "refs" / name).read_text().strip()
+        except FileNotFoundError:
+            return None
+        return digest if digest in self else None
+
+    def usage(self):
+        """Return the number of objects and their total size in bytes."""
+        sizes = [p.stat().st_size for p in self.root.glob("??/*")]
+        return {"objects": len(sizes), "bytes": sum(sizes)}
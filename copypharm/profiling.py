@@ -0,0 +1,109 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of the CoPyPharm Project
+#     https://github.com/juniors90/CoPyPharm.
+#
+# Copyright (c) 2022. Ferreira Juan David
+# License: MIT
+#   Full Text: https://github.com/pyCellID/CoPyPharm/blob/main/LICENSE
+
+# =============================================================================
+# DOCS
+# =============================================================================
+
+"""
+CoPyPharm.
+
+An extension that registers all pharmacies in Córdoba - Argentina.
+"""
+
+# =============================================================================
+# IMPORTS
+# =============================================================================
+
+import cProfile
+import logging
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+log = logging.getLogger()
+
+
+class StageProfiler(object):
+    """Profile pipeline stages with cProfile and tracemalloc.
+
+    Every stage dumps a ``<stage>.prof`` file, readable with ``pstats``
+    or ``snakeviz``, and a ``<stage>-allocations.txt`` file with the
+    ``top_n`` source lines that allocated the most memory during it.
+
+    Parameters
+    ----------
+    out_dir : str or Path
+        The directory where the profiles are stored.
+    top_n : int, optional (default=25)
+        Number of allocation sites reported per stage.
+    """
+
+    def __init__(self, out_dir, top_n=25) -> None:
+        self.out_dir = Path(out_dir)
+        self.top_n = top_n
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        """Print a representation of your object."""
+        return f"<StageProfiler in {self.out_dir}>"
+
+    def _start_tracing(self):
+        """Start tracemalloc, shared by the concurrent stages."""
+        with self._lock:
+            if self._active == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+            self._active += 1
+        return tracemalloc.take_snapshot()
+
+    def _stop_tracing(self):
+        """Stop tracemalloc once the last concurrent stage ends."""
+        with self._lock:
+            self._active -= 1
+            if self._active == 0:
+                tracemalloc.stop()
+
+    @contextmanager
+    def stage(self, name):
+        """Profile the code run in the current thread inside the block.
+
+        Parameters
+        ----------
+        name : str
+            The name of the stage, used for the file names.
+        """
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        before = self._start_tracing()
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:  # another profiler is active in this process
+            log.warning(f"cProfile unavailable for stage {name}")
+            profiler = None
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(self.out_dir / f"{name}.prof")
+            after = tracemalloc.take_snapshot()
+            self._stop_tracing()
+            self._dump_allocations(name, after.compare_to(before, "lineno"))
+
+    def _dump_allocations(self, name, stats):
+        """Write the top allocation sites of a stage."""
+        path = self.out_dir / f"{name}-allocations.txt"
+        with open(path, "w") as f:
+            f.write(f"Top {self.top_n} allocation sites of {name}\n")
+            for stat in stats[: self.top_n]:
+                f.write(f"{stat}\n")
+        log.info(f"Profile of {name} stored in {self.out_dir}")
@@ -0,0 +1,174 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of the CoPyPharm Project
+#     https://github.com/juniors90/CoPyPharm.
+#
+# Copyright (c) 2022. Ferreira Juan David
+# License: MIT
+#   Full Text: https://github.com/pyCellID/CoPyPharm/blob/main/LICENSE
+
+# =============================================================================
+# DOCS
+# =============================================================================
+
+"""
+CoPyPharm.
+
+An extension that registers all pharmacies in Córdoba - Argentina.
+"""
+
+# =============================================================================
+# IMPORTS
+# =============================================================================
+
+import logging
+
+import pandas as pd
+
+from .constants import (
+    CODIGO_POSTAL_ROLLUP_TABLE_NAME,
+    DEPARTAMENTO_ROLLUP_TABLE_NAME,
+    LOCALIDAD_ROLLUP_TABLE_NAME,
+)
+
+log = logging.getLogger()
+
+# : the rollup tables, with the ``farmacias`` column they group by.
+ROLLUPS = {
+    LOCALIDAD_ROLLUP_TABLE_NAME: "id_localidad",
+    DEPARTAMENTO_ROLLUP_TABLE_NAME: "id_departamento",
+    CODIGO_POSTAL_ROLLUP_TABLE_NAME: "codigo_postal",
+}
+
+
+def _counts(values) -> pd.Series:
+    """Return the number of rows of every non missing value."""
+    return pd.to_numeric(pd.Series(values)).value_counts()
+
+
+def _with_deltas(counts, previous, column) -> pd.DataFrame:
+    """Build a rollup from the new counts and the previous rollup.
+
+    A group that lost all its farmacias is kept for a day, with
+    ``farmacias`` set to 0, so its negative ``delta`` is visible.
+    """
+    before = pd.Series(dtype="int64")
+    if previous is not None:
+        before = previous["farmacias"]
+    keys = counts.index.union(before.index)
+    counts = counts.reindex(keys, fill_value=0).astype("int64")
+    delta = counts - before.reindex(keys, fill_value=0).astype("int64")
+    rollup = pd.DataFrame({"farmacias": counts, "delta": delta})
+    rollup = rollup[(rollup["farmacias"] > 0) | (rollup["delta"] != 0)]
+    rollup.index = rollup.index.astype("int64")
+    rollup.index.name = column
+    return rollup.sort_index()
+
+
+def _matches(rollup, farmacias, column) -> bool:
+    """Return whether ``rollup`` counts every group of ``farmacias``."""
+    counts = _counts(farmacias[column]).sort_index()
+    kept = rollup.loc[rollup["farmacias"] > 0, "farmacias"]
+    return kept.index.equals(counts.index.astype("int64")) and bool(
+        (kept.to_numpy() == counts.to_numpy()).all()
+    )
+
+
+def build_rollup(farmacias, column: str, previous=None) -> pd.DataFrame:
+    """Count the farmacias by ``column``.
+
+    Parameters
+    ----------
+    farmacias : ``pandas.DataFrame``
+        The ``farmacias`` table.
+    column : str
+        ``"id_localidad"``, ``"id_departamento"`` or ``"codigo_postal"``.
+    previous : ``pandas.DataFrame``, optional (default=None)
+        The rollup of the previous day, to compute the deltas.
+
+    Return
+    ------
+    rollup : ``pandas.DataFrame``
+        The number of ``farmacias`` of every group and its ``delta``
+        since ``previous``, indexed by ``column``.
+    """
+    return _with_deltas(_counts(farmacias[column]), previous, column)
+
+
+def apply_changes(previous, changes, column: str) -> pd.DataFrame:
+    """Update a rollup with a change set of the ``farmacias`` table.
+
+    Only the groups of the inserted, updated and deleted rows are
+    counted, so the work is proportional to the change and not to the
+    table size.
+
+    Parameters
+    ----------
+    previous : ``pandas.DataFrame``
+        The rollup of the snapshot the change set was computed from.
+    changes : ``ChangeSet``
+        The changes of the ``farmacias`` table, with the old values of
+        the updated rows in ``before``.
+    column : str
+        The column the rollup groups by.
+
+    Return
+    ------
+    rollup : ``pandas.DataFrame``
+        The rollup of the new snapshot, with the deltas of the change.
+    """
+    signed = [
+        (changes.inserts, 1),
+        (changes.updates, 1),
+        (changes.before, -1),
+        (changes.deletes, -1),
+    ]
+    parts = [_counts(frame[column]) * sign for frame, sign in signed]
+    parts = [part for part in parts if len(part)]
+    delta = pd.Series(dtype="int64")
+    if parts:
+        delta = pd.concat(parts).groupby(level=0).sum()
+    before = previous["farmacias"]
+    keys = before.index.union(delta.index)
+    counts = before.reindex(keys, fill_value=0) + delta.reindex(
+        keys, fill_value=0
+    )
+    return _with_deltas(counts[counts > 0], previous, column)
+
+
+def rollup_tables(farmacias, previous=None, changes=None):
+    """Build every rollup of the ``farmacias`` table.
+
+    With a change set and the previous rollups, the rollups are updated
+    incrementally; the count of every group is checked against
+    ``farmacias`` and the rollup is rebuilt from scratch if one does not
+    match, e.g. when the change set was not computed from the snapshot
+    of the previous rollups.
+
+    Parameters
+    ----------
+    farmacias : ``pandas.DataFrame``
+        The ``farmacias`` table.
+    previous : dict[str, ``pandas.DataFrame``], optional (default=None)
+        The rollups of the previous day, by table name.
+    changes : ``ChangeSet``, optional (default=None)
+        The changes of the ``farmacias`` table since ``previous``.
+
+    Return
+    ------
+    rollups : dict[str, ``pandas.DataFrame``]
+        Every rollup, by table name.
+    """
+    previous = previous or {}
+    rollups = {}
+    for table, column in ROLLUPS.items():
+        before = previous.get(table)
+        if changes is not None and before is not None:
+            rollup = apply_changes(before, changes, column)
+            if _matches(rollup, farmacias, column):
+                rollups[table] = rollup
+                continue
+            log.warning(f"{table} does not match the change set, rebuilding")
+        rollups[table] = build_rollup(farmacias, column, before)
+    return rollups
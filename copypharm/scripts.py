@@ -24,40 +24,196 @@ An extension that registers all pharmacies in Córdoba - Argentina.
 
 import logging
 
-from sqlalchemy import create_engine
+from sqlalchemy import inspect
 from sqlalchemy.sql import text
 
-from .constants import SQL_DIR, TABLE_NAMES
-from .settings import setup_data
+from .constants import (
+    DEPARTAMENTOS_TABLE_NAME,
+    FARMACIAS_TABLE_NAME,
+    LOCALIDADES_TABLE_NAME,
+    SQL_DIR,
+    TABLE_NAMES,
+)
+from .db import get_engine
+from .loaders import load_tables
+from .rollups import ROLLUPS
 
-engine = create_engine(setup_data["SQLALCHEMY_DATABASE_URI"])
 log = logging.getLogger()
 
-query1 = """ALTER TABLE `farmacias`
-            ADD FOREIGN KEY (id_localidad)
-            REFERENCES localidades (id_localidad);
-        """
+# : the foreign keys of every table, as (column, referenced table,
+# : referenced column). They are added by ``build_constraints``.
+FOREIGN_KEYS = {
+    FARMACIAS_TABLE_NAME: [
+        ("id_localidad", LOCALIDADES_TABLE_NAME, "id_localidad"),
+        ("id_departamento", DEPARTAMENTOS_TABLE_NAME, "id_departamento"),
+    ],
+}
 
-query2 = """ALTER TABLE `farmacias`
-            ADD FOREIGN KEY (id_departamento)
-            REFERENCES departamentos (id_departamento);
-        """
+# : the secondary indexes of the lookups of ``sample_app`` and
+# : ``PharmacyIndex``, and of the keys of the rollup tables, by table.
+# : They are added by ``build_constraints``.
+LOOKUP_INDEXES = {
+    FARMACIAS_TABLE_NAME: ["id_localidad", "id_departamento", "codigo_postal"],
+    **{table: [column] for table, column in ROLLUPS.items()},
+}
+
+
+def _read_ddl(name, conn):
+    """Read ``sql/<name>.sql`` with the identifier quotes of the dialect."""
+    with open(SQL_DIR / f"{name}.sql") as f:
+        ddl = f.read()
+    return ddl.replace("`", conn.dialect.identifier_preparer.initial_quote)
 
 
 def create_table():
-    """Create all table in database."""
-    with engine.connect() as conn:
-        for file in TABLE_NAMES[0:3]:
-            log.info(f"create table {file}")
-            with open(SQL_DIR / f"{file}.sql") as f:
-                query = text(f.read())
+    """Create all table in database.
+
+    The tables are created bare, with their primary key only, so they
+    can be bulk loaded without maintaining the foreign keys and the
+    secondary indexes row by row. Call ``build_constraints`` once the
+    data is loaded, or use ``create_schema``.
+    """
+    with get_engine().begin() as conn:
+        # farmacias references the other tables, so it is dropped first.
+        for name in reversed(TABLE_NAMES):
+            conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+        for name in TABLE_NAMES:
+            log.info(f"create table {name}")
+            conn.execute(text(_read_ddl(name, conn)))
+
+
+def _missing_constraints(insp, table):
+    """Return the declared foreign keys and indexes ``table`` lacks."""
+    existing_fks = {
+        tuple(fk["constrained_columns"]) for fk in insp.get_foreign_keys(table)
+    }
+    fks = []
+    for column, ref_table, ref_column in FOREIGN_KEYS.get(table, []):
+        if (column,) in existing_fks:
+            continue
+        pk = insp.get_pk_constraint(ref_table)["constrained_columns"]
+        if pk != [ref_column]:
+            log.warning(
+                f"Skipping the foreign key {table}.{column}: "
+                f"{ref_table}.{ref_column} is not its primary key"
+            )
+            continue
+        fks.append((column, ref_table, ref_column))
+
+    # an index led by the column already serves its lookups.
+    leading = {index["column_names"][0] for index in insp.get_indexes(table)}
+    indexes = [c for c in LOOKUP_INDEXES.get(table, []) if c not in leading]
+    return fks, indexes
+
+
+def _constraint_statements(dialect, table, fks, indexes):
+    """Return the DDL that adds ``fks`` and ``indexes`` to ``table``.
+
+    MySQL adds everything in a single ``ALTER TABLE``, i.e. a single
+    rebuild of the table; PostgreSQL builds each index with one scan
+    and validates all the foreign keys in one ``ALTER TABLE``. SQLite
+    cannot add foreign keys to an existing table, so only the indexes
+    are built there.
+
+    The PostgreSQL foreign keys are ``DEFERRABLE INITIALLY IMMEDIATE``:
+    they are checked per statement as usual, but the loaders can defer
+    them with ``SET CONSTRAINTS ALL DEFERRED`` while a parent table is
+    swapped.
+    """
+    quote = dialect.identifier_preparer.quote
+    deferrable = ""
+    if dialect.name == "postgresql":
+        deferrable = " DEFERRABLE INITIALLY IMMEDIATE"
+    fk_clauses = [
+        f"ADD CONSTRAINT {quote(f'fk_{table}_{column}')} "
+        f"FOREIGN KEY ({quote(column)}) "
+        f"REFERENCES {quote(ref_table)} ({quote(ref_column)})"
+        f"{deferrable}"
+        for column, ref_table, ref_column in fks
+    ]
+    index_names = {column: quote(f"ix_{table}_{column}") for column in indexes}
+    if dialect.name == "mysql":
+        clauses = fk_clauses + [
+            f"ADD INDEX {name} ({quote(column)})"
+            for column, name in index_names.items()
+        ]
+        if not clauses:
+            return []
+        return [f"ALTER TABLE {quote(table)} {', '.join(clauses)}"]
+
+    statements = [
+        f"CREATE INDEX {name} ON {quote(table)} ({quote(column)})"
+        for column, name in index_names.items()
+    ]
+    if fk_clauses and dialect.name == "sqlite":
+        log.info(f"SQLite cannot add foreign keys to {table}, skipping them")
+    elif fk_clauses:
+        statements.append(
+            f"ALTER TABLE {quote(table)} {', '.join(fk_clauses)}"
+        )
+    return statements
+
+
+def build_constraints(engine=None):
+    """Add the foreign keys and the lookup indexes in one pass.
+
+    Building them once the tables are loaded is far cheaper than
+    maintaining them during the bulk load. The constraints and indexes
+    that already exist are kept, so calling it again is a no-op.
+
+    Parameters
+    ----------
+    engine : ``sqlalchemy.engine.Engine``, optional (default=None)
+        The database, by default the shared engine of ``get_engine``.
+
+    Return
+    ------
+    statements : list[str]
+        The DDL statements executed.
+    """
+    engine = engine or get_engine()
+    executed = []
+    with engine.begin() as conn:
+        insp = inspect(conn)
+        for table in TABLE_NAMES + list(ROLLUPS):
+            if not insp.has_table(table):
+                continue
+            fks, indexes = _missing_constraints(insp, table)
+            for statement in _constraint_statements(
+                conn.dialect, table, fks, indexes
+            ):
+                log.info(statement)
+                conn.execute(text(statement))
+                executed.append(statement)
+    return executed
+
+
+def create_schema(sources=()):
+    """Create the bare tables, bulk load them and build the constraints.
+
+    Parameters
+    ----------
+    sources : list[tuple[``BaseLoader``, object]], optional (default=())
+        Every loader with the path or data frame it loads, as taken by
+        ``loaders.load_tables``.
+
+    Return
+    ------
+    statements : list[str]
+        The DDL statements of ``build_constraints``.
+    """
+    create_table()
+    if sources:
+        load_tables(sources)
+    return build_constraints()
 
-            conn.execute(f"DROP TABLE IF EXISTS {file};")
-            conn.execute(query)
 
-        conn.execute(query1)
-        conn.execute(query2)
+def __getattr__(name):
+    """Keep ``scripts.engine`` available, built on first access."""
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 if __name__ == "__main__":
-    create_table()
+    create_schema()
@@ -0,0 +1,430 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of the CoPyPharm Project
+#     https://github.com/juniors90/CoPyPharm.
+#
+# Copyright (c) 2022. Ferreira Juan David
+# License: MIT
+#   Full Text: https://github.com/pyCellID/CoPyPharm/blob/main/LICENSE
+
+# =============================================================================
+# DOCS
+# =============================================================================
+
+"""
+CoPyPharm.
+
+An extension that registers all pharmacies in Córdoba - Argentina.
+"""
+
+# =============================================================================
+# IMPORTS
+# =============================================================================
+
+import logging
+import re
+import unicodedata
+
+import numpy as np
+
+import pandas as pd
+
+from .changes import diff_frames
+from .index import _encode_strings, load_arrays, save_arrays
+
+log = logging.getLogger()
+
+# : the text columns of the ``farmacias`` table that can be searched.
+SEARCH_FIELDS = ("nombre", "domicilio")
+
+_WORD = re.compile(r"[0-9a-z]+")
+
+
+def normalize(text) -> str:
+    """Return ``text`` without accents, in lower case and single spaced.
+
+    Examples
+    --------
+    >>> normalize("Av. Güemes  N° 1.250")
+    'av guemes n 1 250'
+    """
+    if text is None or text is pd.NA or text != text:
+        return ""
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(_WORD.findall(text.casefold()))
+
+
+def trigrams(text) -> set:
+    """Return the trigrams of the words of ``text``, after ``normalize``.
+
+    Every word is padded with two spaces in front and one behind, as in
+    PostgreSQL's ``pg_trgm``, so short words and word starts also
+    match.
+
+    Examples
+    --------
+    >>> sorted(trigrams("Sol"))
+    ['  s', ' so', 'ol ', 'sol']
+    """
+    grams = set()
+    for word in normalize(text).split():
+        padded = f"  {word} "
+        grams.update(map("".join, zip(padded, padded[1:], padded[2:])))
+    return grams
+
+
+def _take_csr(offsets, values, rows):
+    """Return the ``offsets`` and ``values`` of the CSR ``rows``."""
+    rows = np.asarray(rows, dtype=np.int64)
+    lengths = np.diff(offsets)[rows]
+    new_offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=new_offsets[1:])
+    positions = np.arange(new_offsets[-1]) + np.repeat(
+        offsets[rows] - new_offsets[:-1], lengths
+    )
+    return new_offsets, np.asarray(values)[positions]
+
+
+class SearchIndex(object):
+    """Trigram index for fuzzy search over ``nombre`` and ``domicilio``.
+
+    Every text is normalized (see ``normalize``) and split into
+    trigrams. The index keeps the trigrams of every row and the
+    postings of every trigram as CSR arrays, so a query counts the
+    trigrams it shares with every row in a few vectorized ``numpy``
+    operations and misspelled, accentless or partial queries still
+    match.
+
+    Like ``PharmacyIndex`` it is stored as a directory of ``.npy``
+    files that ``load`` memory maps.
+
+    Parameters
+    ----------
+    arrays : dict[str, ``numpy.ndarray``]
+        The arrays of the index, as built by ``from_frame``.
+
+    Examples
+    --------
+    >>> df = pd.DataFrame(
+    ...     {
+    ...         "id": [1, 2],
+    ...         "nombre": ["FARMACIA CENTRAL", "DEL ÁGUILA"],
+    ...         "domicilio": ["Güemes 214", "Mitre 978"],
+    ...     }
+    ... )
+    >>> index = SearchIndex.from_frame(df)
+    >>> index.search("farmasia sentral").index.tolist()
+    [1]
+    >>> index.search("aguila", field="nombre").index.tolist()
+    [2]
+    """
+
+    def __init__(self, arrays) -> None:
+        self.arrays = arrays
+        self._vocab = None
+
+    def __repr__(self) -> str:
+        """Print a representation of your object."""
+        grams = len(self.arrays["vocab"])
+        return f"<SearchIndex of {len(self)} pharmacies, {grams} trigrams>"
+
+    def __len__(self) -> int:
+        """Return the number of pharmacies."""
+        return len(self.arrays["id"])
+
+    @property
+    def vocab(self):
+        """The id of every trigram of the index."""
+        if self._vocab is None:
+            grams = self.arrays["vocab"].tolist()
+            self._vocab = dict(zip(grams, range(len(grams))))
+        return self._vocab
+
+    @staticmethod
+    def _frame(df):
+        """Return the ``id`` and searched columns of a ``farmacias`` table."""
+        if "id" not in df.columns:
+            df = df.reset_index()
+        return df[["id", *SEARCH_FIELDS]]
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame):
+        """Build the index of a ``farmacias`` table.
+
+        Parameters
+        ----------
+        df : ``pandas.DataFrame``
+            The ``farmacias`` table, as stored by ``trasform_raws``,
+            with ``id`` as index or as a column.
+
+        Return
+        ------
+        index : SearchIndex
+            The index of the table.
+        """
+        empty = {
+            "id": np.empty(0, dtype=np.int64),
+            "vocab": np.empty(0, dtype="<U3"),
+        }
+        for field in SEARCH_FIELDS:
+            empty[f"{field}.data"] = np.empty(0, dtype=np.uint8)
+            empty[f"{field}.grams"] = np.empty(0, dtype=np.int32)
+            for name in ("offsets", "gram_offsets"):
+                empty[f"{field}.{name}"] = np.zeros(1, dtype=np.int64)
+        return cls(empty)._with_rows([], cls._frame(df))
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        """Open an index stored with ``save``.
+
+        Parameters
+        ----------
+        path : str or Path
+            The directory of the index.
+        mmap_mode : str, optional (default="r")
+            The ``numpy.load`` memory map mode; ``None`` reads the
+            arrays into memory.
+
+        Return
+        ------
+        index : SearchIndex
+            The stored index.
+        """
+        arrays, _ = load_arrays(path, mmap_mode)
+        return cls(arrays)
+
+    def save(self, path):
+        """Store the index as a directory of ``.npy`` files.
+
+        Parameters
+        ----------
+        path : str or Path
+            The destination directory.
+
+        Return
+        ------
+        path : Path
+            The destination directory.
+        """
+        return save_arrays(path, self.arrays, rows=len(self))
+
+    def _with_rows(self, keep, df):
+        """Return a new index with the rows ``keep`` and the rows of ``df``.
+
+        Only the rows of ``df`` are normalized and split into trigrams;
+        the trigrams of the kept rows are reused and the postings are
+        rebuilt from them.
+        """
+        keep = np.asarray(keep, dtype=np.int64)
+        vocab = dict(self.vocab)
+        arrays = {
+            "id": np.concatenate(
+                [self.arrays["id"][keep], df["id"].to_numpy(np.int64)]
+            )
+        }
+        for field in SEARCH_FIELDS:
+            old = self.arrays
+            offsets, data = _take_csr(
+                old[f"{field}.offsets"], old[f"{field}.data"], keep
+            )
+            new_data, new_offsets = _encode_strings(df[field])
+            arrays[f"{field}.offsets"] = np.concatenate(
+                [offsets, new_offsets[1:] + offsets[-1]]
+            )
+            arrays[f"{field}.data"] = np.concatenate([data, new_data])
+
+            gram_offsets, grams = _take_csr(
+                old[f"{field}.gram_offsets"], old[f"{field}.grams"], keep
+            )
+            seen = {}
+            new_grams = []
+            for text in df[field]:
+                key = normalize(text)
+                if key not in seen:
+                    seen[key] = sorted(
+                        vocab.setdefault(g, len(vocab)) for g in trigrams(key)
+                    )
+                new_grams.append(seen[key])
+            lengths = np.fromiter(map(len, new_grams), np.int64, len(df))
+            arrays[f"{field}.gram_offsets"] = np.concatenate(
+                [gram_offsets, np.cumsum(lengths) + gram_offsets[-1]]
+            )
+            arrays[f"{field}.grams"] = np.concatenate(
+                [
+                    grams,
+                    np.fromiter(
+                        (g for row in new_grams for g in row),
+                        np.int32,
+                        int(lengths.sum()),
+                    ),
+                ]
+            )
+
+        arrays["vocab"] = np.array(list(vocab), dtype="<U3")
+        for field in SEARCH_FIELDS:
+            postings = self._postings(
+                arrays[f"{field}.gram_offsets"],
+                arrays[f"{field}.grams"],
+                len(vocab),
+            )
+            arrays[f"{field}.post_offsets"], arrays[f"{field}.postings"] = (
+                postings
+            )
+        index = SearchIndex(arrays)
+        index._vocab = vocab
+        return index
+
+    @staticmethod
+    def _postings(gram_offsets, grams, n_grams):
+        """Invert the trigrams of every row into the rows of every trigram."""
+        rows = np.repeat(
+            np.arange(len(gram_offsets) - 1, dtype=np.int32),
+            np.diff(gram_offsets),
+        )
+        order = np.argsort(grams, kind="stable")
+        offsets = np.zeros(n_grams + 1, dtype=np.int64)
+        np.cumsum(np.bincount(grams, minlength=n_grams), out=offsets[1:])
+        return offsets, rows[order]
+
+    def apply_changes(self, changes):
+        """Return the index after the rows of a ``ChangeSet``.
+
+        Deleted and updated rows are dropped; updated and inserted rows
+        are indexed again. The trigrams of the other rows are reused.
+
+        Parameters
+        ----------
+        changes : ChangeSet
+            The changes of the ``farmacias`` table, keyed by ``id``.
+
+        Return
+        ------
+        index : SearchIndex
+            The updated index.
+        """
+        changed = pd.concat([changes.updates, changes.deletes])
+        keep = np.flatnonzero(
+            ~np.isin(self.arrays["id"], changed[changes.key].to_numpy())
+        )
+        rows = pd.concat([changes.updates, changes.inserts])
+        return self._with_rows(keep, self._frame(rows))
+
+    def updated(self, df: pd.DataFrame):
+        """Return the index of a newer snapshot of the same table.
+
+        Only the rows whose ``nombre`` or ``domicilio`` changed are
+        indexed again.
+
+        Parameters
+        ----------
+        df : ``pandas.DataFrame``
+            The new ``farmacias`` table.
+
+        Return
+        ------
+        index : SearchIndex
+            The index of ``df``.
+        """
+        changes = diff_frames(self.to_frame(), self._frame(df), "id")
+        log.info(f"Updating the search index with {changes!r}")
+        return self.apply_changes(changes)
+
+    def _texts(self, field, rows):
+        """Decode the texts of ``field`` at ``rows``."""
+        offsets = self.arrays[f"{field}.offsets"]
+        data = self.arrays[f"{field}.data"]
+        bounds = zip(offsets[rows], offsets[np.asarray(rows) + 1])
+        return [data[a:b].tobytes().decode("utf-8") for a, b in bounds]
+
+    def to_frame(self, rows=None) -> pd.DataFrame:
+        """Return the indexed ``id``, ``nombre`` and ``domicilio`` columns.
+
+        Parameters
+        ----------
+        rows : array-like, optional (default=None)
+            The row positions, by default every row.
+        """
+        if rows is None:
+            rows = np.arange(len(self))
+        data = {"id": np.asarray(self.arrays["id"])[rows]}
+        for field in SEARCH_FIELDS:
+            data[field] = self._texts(field, rows)
+        return pd.DataFrame(data)
+
+    def _similarity(self, query, field):
+        """Return the containment and Jaccard similarity of every row."""
+        fields = SEARCH_FIELDS if field is None else (field,)
+        grams = trigrams(query)
+        containment = np.zeros(len(self))
+        jaccard = np.zeros(len(self))
+        ids = [self.vocab[g] for g in grams if g in self.vocab]
+        if not ids:
+            return containment, jaccard
+        for name in fields:
+            offsets = self.arrays[f"{name}.post_offsets"]
+            postings = self.arrays[f"{name}.postings"]
+            bounds = zip(offsets[ids], offsets[np.asarray(ids) + 1])
+            hits = np.concatenate([postings[a:b] for a, b in bounds])
+            shared = np.bincount(hits, minlength=len(self))
+            lengths = np.diff(self.arrays[f"{name}.gram_offsets"])
+            np.maximum(containment, shared / len(grams), out=containment)
+            np.maximum(
+                jaccard, shared / (len(grams) + lengths - shared), out=jaccard
+            )
+        return containment, jaccard
+
+    def scores(self, query: str, field: str = None) -> np.ndarray:
+        """Return the similarity of every row to ``query``.
+
+        The score of a row is the share of the trigrams of the query
+        found in it, so ``1.0`` means every word of the query appears
+        in the row. With ``field=None`` the best field counts.
+
+        Parameters
+        ----------
+        query : str
+            The searched text.
+        field : str, optional (default=None)
+            ``"nombre"``, ``"domicilio"`` or ``None`` for both.
+
+        Return
+        ------
+        scores : ``numpy.ndarray``
+            The score of every row, between 0 and 1.
+        """
+        return self._similarity(query, field)[0]
+
+    def search(
+        self,
+        query: str,
+        field: str = None,
+        limit: int = 10,
+        threshold: float = 0.5,
+    ) -> pd.DataFrame:
+        """Return the pharmacies that best match ``query``.
+
+        Parameters
+        ----------
+        query : str
+            The searched text, e.g. a misspelled name or address.
+        field : str, optional (default=None)
+            ``"nombre"``, ``"domicilio"`` or ``None`` for both.
+        limit : int, optional (default=10)
+            Maximum number of matches.
+        threshold : float, optional (default=0.5)
+            Minimum score of a match (see ``scores``).
+
+        Return
+        ------
+        matches : ``pandas.DataFrame``
+            The ``nombre``, ``domicilio`` and ``score`` of the matches,
+            indexed by ``id``, best match first. Ties are broken by the
+            Jaccard similarity, so closer texts come first.
+        """
+        scores, jaccard = self._similarity(query, field)
+        rows = np.flatnonzero(scores >= threshold)
+        rows = rows[np.lexsort((-jaccard[rows], -scores[rows]))][:limit]
+        matches = self.to_frame(rows).assign(score=scores[rows])
+        return matches.set_index("id")
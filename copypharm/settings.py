@@ -41,4 +41,13 @@ farmacias_ds = {
     "name": "farmacias",
     "url": cfg["URL_FARMACIAS"],
     "provincia": cfg["PROVINCIA"],
+    "csv_engine": cfg.get("CSV_ENGINE") or None,
+    "storage_format": cfg.get("STORAGE_FORMAT", "csv"),
+}
+
+engine_options = {
+    "pool_size": cfg.getint("POOL_SIZE", 5),
+    "max_overflow": cfg.getint("MAX_OVERFLOW", 10),
+    "pool_recycle": cfg.getint("POOL_RECYCLE", 3600),
+    "pool_pre_ping": cfg.getboolean("POOL_PRE_PING", True),
 }
@@ -1,5 +1,5 @@
 CREATE TABLE IF NOT EXISTS `departamentos` (
-    `id_departamento` INT,
+    `id_departamento` BIGINT,
     `nombre_departamento` VARCHAR(255) NOT NULL,
     CONSTRAINT pk_user_id_departamento PRIMARY KEY (`id_departamento`)
 );
\ No newline at end of file
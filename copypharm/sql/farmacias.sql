@@ -1,9 +1,9 @@
 CREATE TABLE IF NOT EXISTS `farmacias` (
-    `id` INT,
+    `id` BIGINT,
     `nombre` VARCHAR(255) NOT NULL,
-    `id_localidad` INT NOT NULL,
-    `id_departamento` INT NOT NULL,
-    `codigo_postal` INT NOT NULL, 
+    `id_localidad` BIGINT NOT NULL,
+    `id_departamento` BIGINT NOT NULL,
+    `codigo_postal` BIGINT NOT NULL, 
     `domicilio` VARCHAR(255) NOT NULL,
     CONSTRAINT pk_user_id_farmacias PRIMARY KEY (`id`)
 );
\ No newline at end of file
@@ -1,5 +1,5 @@
 CREATE TABLE IF NOT EXISTS `localidades` (
-    `id_localidad` INT,
+    `id_localidad` BIGINT,
     `localidad` VARCHAR(255) NOT NULL,
     CONSTRAINT pk_user_id_localidad PRIMARY KEY (`id_localidad`)
 );
\ No newline at end of file
@@ -0,0 +1,129 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of the CoPyPharm Project
+#     https://github.com/juniors90/CoPyPharm.
+#
+# Copyright (c) 2022. Ferreira Juan David
+# License: MIT
+#   Full Text: https://github.com/pyCellID/CoPyPharm/blob/main/LICENSE
+
+# =============================================================================
+# DOCS
+# =============================================================================
+
+"""
+CoPyPharm.
+
+An extension that registers all pharmacies in Córdoba - Argentina.
+"""
+
+# =============================================================================
+# IMPORTS
+# =============================================================================
+
+from pathlib import Path
+
+import pandas as pd
+
+STORAGE_SUFFIXES = {
+    "csv": ".csv",
+    "parquet": ".parquet",
+    "feather": ".feather",
+}
+
+
+def storage_path(file_path, fmt: str) -> Path:
+    """Return ``file_path`` with the suffix of the storage format ``fmt``.
+
+    Parameters
+    ----------
+    file_path : str or Path
+        A path of the dated ``data/`` tree.
+    fmt : str
+        The storage format: ``"csv"``, ``"parquet"`` or ``"feather"``.
+
+    Return
+    ------
+    path : Path
+        The path with the suffix of ``fmt``.
+    """
+    if fmt not in STORAGE_SUFFIXES:
+        raise ValueError(
+            f"Unknown storage format {fmt!r}, "
+            f"expected one of {list(STORAGE_SUFFIXES)}"
+        )
+    return Path(file_path).with_suffix(STORAGE_SUFFIXES[fmt])
+
+
+def write_frame(df: pd.DataFrame, file_path) -> Path:
+    """Store a data frame in the format given by the suffix of the path.
+
+    A ``.csv`` file is written with ``DataFrame.to_csv``, including the
+    index. Parquet and Feather files keep the dtypes; a named index is
+    stored as a regular column, so every format reads back the same
+    columns. An existing file is replaced and never written in place,
+    since it may be a hardlink to a shared object (see ``ObjectStore``).
+
+    Parameters
+    ----------
+    df : ``pandas.DataFrame``
+        The data frame to store.
+    file_path : str or Path
+        The destination location.
+
+    Return
+    ------
+    file_path : Path
+        The destination location.
+    """
+    file_path = Path(file_path)
+    if file_path.exists():
+        file_path.unlink()
+    suffix = file_path.suffix
+    if suffix == ".csv":
+        df.to_csv(file_path)
+        return file_path
+
+    if any(name is not None for name in df.index.names):
+        df = df.reset_index()
+    else:
+        df = df.reset_index(drop=True)
+
+    if suffix == ".parquet":
+        df.to_parquet(file_path, index=False)
+    elif suffix == ".feather":
+        df.to_feather(file_path)
+    else:
+        raise ValueError(f"Unknown storage format for {file_path}")
+    return file_path
+
+
+def read_frame(file_path) -> pd.DataFrame:
+    """Read a data frame stored with ``write_frame``.
+
+    Parquet and Feather files are memory mapped and read without any
+    text parsing.
+
+    Parameters
+    ----------
+    file_path : str or Path
+        The location of the stored data frame.
+
+    Return
+    ------
+    df : ``pandas.DataFrame``
+        The stored data frame.
+    """
+    suffix = Path(file_path).suffix
+    if suffix == ".csv":
+        return pd.read_csv(file_path)
+    if suffix == ".parquet":
+        from pyarrow import parquet
+
+        return parquet.read_table(file_path, memory_map=True).to_pandas()
+    if suffix == ".feather":
+        from pyarrow import feather
+
+        return feather.read_table(file_path, memory_map=True).to_pandas()
+    raise ValueError(f"Unknown storage format for {file_path}")
@@ -0,0 +1,187 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of the CoPyPharm Project
+#     https://github.com/juniors90/CoPyPharm.
+#
+# Copyright (c) 2022. Ferreira Juan David
+# License: MIT
+#   Full Text: https://github.com/pyCellID/CoPyPharm/blob/main/LICENSE
+
+# =============================================================================
+# DOCS
+# =============================================================================
+
+"""
+CoPyPharm.
+
+An extension that registers all pharmacies in Córdoba - Argentina.
+"""
+
+# =============================================================================
+# IMPORTS
+# =============================================================================
+
+import logging
+from datetime import datetime
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    func,
+    inspect,
+    select,
+)
+from sqlalchemy.exc import DBAPIError
+
+from .cache import content_digest
+from .constants import LOAD_VERSIONS_TABLE_NAME
+
+log = logging.getLogger()
+
+_metadata = MetaData()
+
+# : one row per load that changed a table. ``version`` is assigned by
+# : the database, so it increases across tables and processes.
+load_versions = Table(
+    LOAD_VERSIONS_TABLE_NAME,
+    _metadata,
+    Column("version", Integer, primary_key=True, autoincrement=True),
+    Column("table_name", String(64), nullable=False),
+    Column("content_hash", String(64), nullable=False),
+    Column("row_count", Integer, nullable=False),
+    Column("loaded_at", DateTime, nullable=False),
+    Index("ix_load_versions_table_name", "table_name", "version"),
+    sqlite_autoincrement=True,
+)
+
+
+def _get_engine(engine):
+    """Return ``engine``, or the shared engine of ``get_engine``."""
+    if engine is None:
+        from .db import get_engine
+
+        engine = get_engine()
+    return engine
+
+
+def ensure_versions_table(bind) -> None:
+    """Create the ``load_versions`` table if it does not exist.
+
+    Parameters
+    ----------
+    bind : ``sqlalchemy.engine.Engine`` or ``Connection``
+        The database.
+    """
+    try:
+        load_versions.create(bind, checkfirst=True)
+    except DBAPIError:
+        # concurrent loaders may race to create it.
+        if not inspect(bind).has_table(LOAD_VERSIONS_TABLE_NAME):
+            raise
+
+
+def record_load(conn, table_name: str, df):
+    """Stamp a load of ``table_name`` with a new version.
+
+    Call it inside the transaction of the load, so the version is
+    committed with the data. A load whose content hash equals the last
+    recorded one of the table does not change it and is not stamped.
+
+    Parameters
+    ----------
+    conn : ``sqlalchemy.engine.Connection``
+        The connection of the load transaction.
+    table_name : str
+        The loaded table.
+    df : ``pandas.DataFrame``
+        The content of the table after the load.
+
+    Return
+    ------
+    version : int or None
+        The new version, or ``None`` if the content did not change.
+    """
+    content_hash = content_digest(df)
+    last_hash = conn.execute(
+        select(load_versions.c.content_hash)
+        .where(load_versions.c.table_name == table_name)
+        .order_by(load_versions.c.version.desc())
+        .limit(1)
+    ).scalar()
+    if last_hash == content_hash:
+        log.info(f"{table_name} did not change, keeping its version")
+        return None
+    result = conn.execute(
+        load_versions.insert().values(
+            table_name=table_name,
+            content_hash=content_hash,
+            row_count=len(df),
+            loaded_at=datetime.now(),
+        )
+    )
+    version = result.inserted_primary_key[0]
+    log.info(f"{table_name} loaded as version {version}")
+    return version
+
+
+def load_version(engine=None) -> int:
+    """Return the latest version of the loaded tables.
+
+    It is a single indexed query, so caches and replicas can call it to
+    revalidate instead of reading the tables again: the data changed
+    if and only if the version changed.
+
+    Parameters
+    ----------
+    engine : ``sqlalchemy.engine.Engine``, optional (default=None)
+        The database, by default the shared engine of ``get_engine``.
+
+    Return
+    ------
+    version : int
+        The latest version, or ``0`` if nothing was loaded yet.
+    """
+    try:
+        with _get_engine(engine).connect() as conn:
+            version = conn.execute(
+                select(func.max(load_versions.c.version))
+            ).scalar()
+    except DBAPIError:
+        # the table is created by the first load.
+        return 0
+    return version or 0
+
+
+def table_versions(engine=None) -> dict:
+    """Return the latest version row of every loaded table.
+
+    Parameters
+    ----------
+    engine : ``sqlalchemy.engine.Engine``, optional (default=None)
+        The database, by default the shared engine of ``get_engine``.
+
+    Return
+    ------
+    versions : dict[str, dict]
+        The ``version``, ``content_hash``, ``row_count`` and
+        ``loaded_at`` of the last load of each table, by table name.
+    """
+    latest = select(func.max(load_versions.c.version)).group_by(
+        load_versions.c.table_name
+    )
+    try:
+        with _get_engine(engine).connect() as conn:
+            rows = conn.execute(
+                select(load_versions).where(
+                    load_versions.c.version.in_(latest)
+                )
+            ).mappings()
+            return {row["table_name"]: dict(row) for row in rows}
+    except DBAPIError:
+        return {}
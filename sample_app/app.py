@@ -0,0 +1,244 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of the CoPyPharm Project
+#     https://github.com/juniors90/CoPyPharm.
+#
+# Copyright (c) 2022. Ferreira Juan David
+# License: MIT
+#   Full Text: https://github.com/pyCellID/CoPyPharm/blob/main/LICENSE
+
+# =============================================================================
+# DOCS
+# =============================================================================
+
+"""
+CoPyPharm.
+
+An extension that registers all pharmacies in Córdoba - Argentina.
+"""
+
+# =============================================================================
+# IMPORTS
+# =============================================================================
+
+import json
+import threading
+import time
+import weakref
+
+from copypharm.constants import (
+    CODIGO_POSTAL_ROLLUP_TABLE_NAME,
+    DEPARTAMENTOS_TABLE_NAME,
+    DEPARTAMENTO_ROLLUP_TABLE_NAME,
+    FARMACIAS_TABLE_NAME,
+    LOCALIDADES_TABLE_NAME,
+    LOCALIDAD_ROLLUP_TABLE_NAME,
+)
+from copypharm.db import get_engine
+from copypharm.loaders import add_load_listener
+from copypharm.versions import load_version
+
+from flask import Flask, Response, abort, request
+
+from sqlalchemy.sql import text
+
+from werkzeug.exceptions import HTTPException
+
+from .cache import TTLCache
+
+# : the tables served, with their key and the columns they filter by.
+RESOURCES = {
+    "farmacias": {
+        "table": FARMACIAS_TABLE_NAME,
+        "key": "id",
+        "filters": ("id_localidad", "id_departamento", "codigo_postal"),
+    },
+    "localidades": {
+        "table": LOCALIDADES_TABLE_NAME,
+        "key": "id_localidad",
+        "filters": (),
+    },
+    "departamentos": {
+        "table": DEPARTAMENTOS_TABLE_NAME,
+        "key": "id_departamento",
+        "filters": (),
+    },
+    "farmacias_por_localidad": {
+        "table": LOCALIDAD_ROLLUP_TABLE_NAME,
+        "key": "id_localidad",
+        "filters": (),
+    },
+    "farmacias_por_departamento": {
+        "table": DEPARTAMENTO_ROLLUP_TABLE_NAME,
+        "key": "id_departamento",
+        "filters": (),
+    },
+    "farmacias_por_codigo_postal": {
+        "table": CODIGO_POSTAL_ROLLUP_TABLE_NAME,
+        "key": "codigo_postal",
+        "filters": (),
+    },
+}
+
+# : rows per page, by default and at most.
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 500
+
+# : the caches of the live apps, dropped with their app.
+_caches = weakref.WeakSet()
+
+
+def _clear_caches(table_name):
+    """Clear the cache of every live app after a load."""
+    for cache in list(_caches):
+        cache.clear()
+
+
+# a single listener for every app, so creating apps does not add any.
+add_load_listener(_clear_caches)
+
+
+def _int_arg(name, default=None):
+    """Return an integer query argument, or answer ``400 Bad Request``."""
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        abort(400, f"{name} must be an integer, got {value!r}")
+
+
+def _json(payload, status=200, cache_status=None):
+    """Return a JSON response."""
+    response = Response(payload, status=status, mimetype="application/json")
+    if cache_status:
+        response.headers["X-Cache"] = cache_status
+    return response
+
+
+def create_app(engine=None, cache_size=1024, cache_ttl=60, revalidate=1.0):
+    """Create the read-only pharmacy query service.
+
+    The service answers ``GET /<resource>`` and ``GET /<resource>/<key>``
+    for ``farmacias``, ``localidades``, ``departamentos`` and the rollup
+    tables of ``copypharm.rollups``. Lists are filtered by equality on
+    the ``filters`` of ``RESOURCES`` and paged by key:
+    ``?after=<last key>&limit=<n>`` returns the rows after the given
+    key and the ``next`` key to ask for.
+
+    Queries run on the pooled engine of ``copypharm.db.get_engine``,
+    bounded by its ``POOL_SIZE`` and ``MAX_OVERFLOW`` settings, and the
+    responses are kept in an in-process TTL/LRU cache. The cache is
+    cleared when a loader of this process commits a load and, for loads
+    of other processes, when the version of ``copypharm.versions``
+    changes; the version is read at most once every ``revalidate``
+    seconds.
+
+    Run it with ``flask --app sample_app run`` or any WSGI server.
+
+    Parameters
+    ----------
+    engine : ``sqlalchemy.engine.Engine``, optional (default=None)
+        The database, by default the shared engine of ``get_engine``.
+    cache_size : int, optional (default=1024)
+        Maximum number of cached responses.
+    cache_ttl : float, optional (default=60)
+        Seconds a cached response is served.
+    revalidate : float, optional (default=1.0)
+        Minimum seconds between two reads of the load version; ``0``
+        reads it on every request.
+
+    Return
+    ------
+    app : ``flask.Flask``
+        The application.
+    """
+    app = Flask(__name__)
+    cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+    _caches.add(cache)
+    app.extensions["copypharm_cache"] = cache
+    seen = {"version": None, "checked_at": float("-inf")}
+    seen_lock = threading.Lock()
+
+    def check_version():
+        now = time.monotonic()
+        with seen_lock:
+            if now - seen["checked_at"] < revalidate:
+                return
+            seen["checked_at"] = now
+        version = load_version(engine)
+        with seen_lock:
+            if version != seen["version"]:
+                seen["version"] = version
+                cache.clear()
+
+    def query(sql, params):
+        with (engine or get_engine()).connect() as conn:
+            result = conn.execute(text(sql), params)
+            return [dict(row) for row in result.mappings()]
+
+    def cached(view):
+        def wrapper(**kwargs):
+            check_version()
+            key = request.full_path
+            body = cache.get(key)
+            if body is not None:
+                return _json(body, cache_status="HIT")
+            body = json.dumps(view(**kwargs))
+            cache.put(key, body)
+            return _json(body, cache_status="MISS")
+
+        wrapper.__name__ = view.__name__
+        return wrapper
+
+    @app.errorhandler(HTTPException)
+    def handle_error(error):
+        payload = json.dumps({"error": error.description})
+        return _json(payload, status=error.code)
+
+    @app.route("/<resource>")
+    @cached
+    def list_rows(resource):
+        spec = RESOURCES.get(resource) or abort(404, "Unknown resource")
+        key = spec["key"]
+        limit = min(max(_int_arg("limit", DEFAULT_LIMIT), 1), MAX_LIMIT)
+        conditions, params = [], {"limit": limit + 1}
+
+        after = _int_arg("after")
+        if after is not None:
+            conditions.append(f"{key} > :after")
+            params["after"] = after
+        for col in spec["filters"]:
+            value = _int_arg(col)
+            if value is not None:
+                conditions.append(f"{col} = :{col}")
+                params[col] = value
+
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        rows = query(
+            f"SELECT * FROM {spec['table']} {where}"
+            f"ORDER BY {key} LIMIT :limit",
+            params,
+        )
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        return {
+            "items": rows,
+            "next": rows[-1][key] if has_more else None,
+        }
+
+    @app.route("/<resource>/<int:pk>")
+    @cached
+    def get_row(resource, pk):
+        spec = RESOURCES.get(resource) or abort(404, "Unknown resource")
+        rows = query(
+            f"SELECT * FROM {spec['table']} WHERE {spec['key']} = :pk",
+            {"pk": pk},
+        )
+        if not rows:
+            abort(404, f"No {resource} with {spec['key']} {pk}")
+        return rows[0]
+
+    return app
@@ -0,0 +1,85 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of the CoPyPharm Project
+#     https://github.com/juniors90/CoPyPharm.
+#
+# Copyright (c) 2022. Ferreira Juan David
+# License: MIT
+#   Full Text: https://github.com/pyCellID/CoPyPharm/blob/main/LICENSE
+
+# =============================================================================
+# DOCS
+# =============================================================================
+
+"""
+CoPyPharm.
+
+An extension that registers all pharmacies in Córdoba - Argentina.
+"""
+
+# =============================================================================
+# IMPORTS
+# =============================================================================
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache(object):
+    """Thread-safe LRU cache whose entries expire after ``ttl`` seconds.
+
+    Parameters
+    ----------
+    maxsize : int, optional (default=1024)
+        Maximum number of entries; the least recently used entry is
+        dropped when the cache is full.
+    ttl : float, optional (default=60)
+        Seconds an entry is served before it expires.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        """Print a representation of your object."""
+        return f"<TTLCache {len(self)}/{self.maxsize} entries, ttl={self.ttl}>"
+
+    def __len__(self) -> int:
+        """Return the number of entries, including the expired ones."""
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        """Return the live value of ``key``, or ``default``."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value) -> None:
+        """Store ``value`` as ``key`` for ``ttl`` seconds."""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self, *args) -> None:
+        """Drop every entry; extra arguments are ignored.
+
+        The signature lets the cache be registered as a load listener
+        (see ``copypharm.loaders.add_load_listener``).
+        """
+        with self._lock:
+            self._entries.clear()
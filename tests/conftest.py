@@ -1,4 +1,8 @@
+import hashlib
 import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 import numpy as np
 import pytest
@@ -20,4 +24,144 @@ def invalid_path():
     f_ph = os.path.join(base, "copypharm", f"{sub_folder_n[n]}", f"{f}", date[0:7])
     return f_ph
 
-print(invalid_path())
\ No newline at end of file
+
+def dated(category, day="27-03-2022"):
+    """Return the path of a table of the dated ``data/`` tree."""
+    month = "-".join(reversed(day.split("-")[1:]))
+    return os.path.join(data_path, category, month, f"{category}-{day}.csv")
+
+
+@pytest.fixture
+def sqlite_engine(monkeypatch, tmp_path):
+    """Point the shared engine of ``copypharm.db`` at a new SQLite file."""
+    from sqlalchemy import create_engine
+
+    from copypharm import db
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'farmacias.db'}")
+    monkeypatch.setattr(db, "_engine", engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def sql_dir(monkeypatch):
+    """Let ``scripts.create_table`` find the DDL from any directory."""
+    from pathlib import Path
+
+    from copypharm import scripts
+
+    monkeypatch.setattr(scripts, "SQL_DIR", Path(file_path) / "sql")
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Serve ``server.content`` with ETag, conditional and Range support.
+
+    Every response waits ``server.delay`` seconds, and the peak number
+    of concurrent requests, overall and by ``Host``, is recorded. The
+    first requests are answered with the error statuses queued in
+    ``server.failures``.
+    """
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        host = self.headers.get("Host")
+        with server.lock:
+            server.active[host] = server.active.get(host, 0) + 1
+            server.peak = max(server.peak, sum(server.active.values()))
+            server.peak_per_host[host] = max(
+                server.peak_per_host.get(host, 0), server.active[host]
+            )
+        try:
+            time.sleep(server.delay)
+            self._respond()
+        finally:
+            with server.lock:
+                server.active[host] -= 1
+
+    def _respond(self):
+        server = self.server
+        if server.failures:
+            self.send_response(server.failures.pop(0))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        content = server.content
+        etag = '"{}"'.format(hashlib.sha256(content).hexdigest()[:16])
+
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        start = 0
+        range_header = self.headers.get("Range")
+        if range_header and self.headers.get("If-Range", etag) == etag:
+            start = int(range_header.split("=")[1].split("-")[0])
+            self.send_response(206)
+            self.send_header(
+                "Content-Range",
+                f"bytes {start}-{len(content) - 1}/{len(content)}",
+            )
+        else:
+            self.send_response(200)
+
+        body = content[start:]
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        server.bytes_sent += len(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.content = b""
+    server.requests = []
+    server.bytes_sent = 0
+    server.delay = 0
+    server.failures = []
+    server.lock = threading.Lock()
+    server.active = {}
+    server.peak = 0
+    server.peak_per_host = {}
+    server.url = "http://127.0.0.1:{}/farmacias.csv".format(
+        server.server_address[1]
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def pipeline(monkeypatch, tmp_path, stub_server, sqlite_engine):
+    """Point the pipeline at a stub source, a tmp data tree and SQLite."""
+    from copypharm import core
+    from copypharm.extractor import UrlExtractor
+
+    national_csv = os.path.join(
+        data_path, "farmacias", "2022-03", "farmacias-27-03-2022.csv"
+    )
+    with open(national_csv, "rb") as f:
+        stub_server.content = f.read()
+
+    monkeypatch.setattr(core, "BASE_FILE_DIR", tmp_path)
+    monkeypatch.setattr(core, "provincia", "FORMOSA")
+    monkeypatch.setattr(
+        core,
+        "data_extractors",
+        {
+            "farmacias": UrlExtractor(
+                "farmacias", stub_server.url, base_dir=tmp_path
+            )
+        },
+    )
+    return sqlite_engine
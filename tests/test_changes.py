@@ -0,0 +1,43 @@
+from copypharm.changes import diff_frames
+
+import numpy as np
+
+import pandas as pd
+
+
+def test_diff_frames():
+    old = pd.DataFrame(
+        {
+            "id": [1, 2, 3, 4],
+            "nombre": ["A", "B", "C", "D"],
+            "web": [np.nan, "b.com", np.nan, np.nan],
+        }
+    )
+    new = pd.DataFrame(
+        {
+            "id": [2, 3, 4, 5],
+            "nombre": ["B", "C2", "D", "E"],
+            "web": ["b.com", np.nan, "d.com", np.nan],
+        }
+    )
+
+    changes = diff_frames(old, new, "id")
+
+    assert changes.inserts["id"].tolist() == [5]
+    assert changes.updates["id"].tolist() == [3, 4]
+    assert changes.updates["nombre"].tolist() == ["C2", "D"]
+    assert changes.before["nombre"].tolist() == ["C", "D"]
+    assert changes.deletes["id"].tolist() == [1]
+    assert len(changes) == 4
+    assert changes.to_frame()["op"].tolist() == [
+        "insert",
+        "update",
+        "update",
+        "delete",
+    ]
+
+
+def test_diff_frames_unchanged():
+    df = pd.DataFrame({"id": [1, 2], "nombre": ["A", np.nan]})
+
+    assert len(diff_frames(df, df.copy(), "id")) == 0
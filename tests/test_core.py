@@ -0,0 +1,441 @@
+import json
+import os
+import pstats
+import shutil
+import time
+
+from click.testing import CliRunner
+
+from copypharm import core, db
+from copypharm.changes import diff_frames
+from copypharm.dimensions import KeyMap
+from copypharm.extractor import UrlExtractor
+from copypharm.loaders import FarmaciasLoader
+from copypharm.rollups import ROLLUPS, rollup_tables
+from copypharm.search import SearchIndex
+from copypharm.storage import read_frame
+
+import pandas as pd
+
+import pytest
+
+from sqlalchemy import create_engine
+
+from .conftest import data_path
+from .test_rollups import NEW, OLD
+
+national_csv = os.path.join(
+    data_path, "farmacias", "2022-03", "farmacias-27-03-2022.csv"
+)
+
+
+def count_reads(monkeypatch, extractor):
+    """Record every read of the raw file of ``extractor``."""
+    reads = []
+    iter_raw = extractor.iter_raw
+
+    def counted(file_path, *args, **kwargs):
+        reads.append(file_path)
+        return iter_raw(file_path, *args, **kwargs)
+
+    monkeypatch.setattr(extractor, "iter_raw", counted)
+    return reads
+
+
+def test_trasform_provincias_matches_single_provincia(monkeypatch, tmp_path):
+    monkeypatch.setattr(core, "BASE_FILE_DIR", tmp_path)
+    monkeypatch.setattr(core, "provincia", "FORMOSA")
+    file_paths = {"farmacias": national_csv}
+
+    single = core.trasform_raws("2022-03-27", file_paths)
+    expected = [p.read_bytes() for p in single]
+    index = core.search_index_path("2022-03-27")
+    shutil.rmtree(index)
+    reads = count_reads(monkeypatch, core.data_extractors["farmacias"])
+
+    data_paths, fan_out = core.trasform_provincias(
+        "2022-03-27", file_paths, ["SANTA FE", "FORMOSA"], max_workers=2
+    )
+
+    assert len(reads) == 1
+    assert data_paths == single
+    assert [p.read_bytes() for p in data_paths] == expected
+    assert index.exists()
+    assert set(fan_out) == {"FORMOSA", "SANTA FE"}
+    for one, many in zip(expected, fan_out["FORMOSA"]):
+        assert one == many.read_bytes()
+    localidades = fan_out["FORMOSA"][1]
+    assert localidades.name == "localidades_de_formosa-27-03-2022.csv"
+
+
+def test_run_pipeline_builds_the_provincias_from_one_read(
+    pipeline, monkeypatch, tmp_path
+):
+    reads = count_reads(monkeypatch, core.data_extractors["farmacias"])
+
+    result = CliRunner().invoke(
+        core.run_pipeline, ["--date", "2022-03-27", "--provincia", "CHUBUT"]
+    )
+
+    assert result.exit_code == 0, result.output
+    assert len(reads) == 1
+    chubut = core.dated_path("farmacias_de_chubut", "2022-03-27", tmp_path)
+    assert chubut.exists()
+    with pipeline.connect() as conn:
+        count = conn.exec_driver_sql("SELECT COUNT(*) FROM farmacias")
+        assert count.scalar() == 162
+
+
+def use_extractors(monkeypatch, tmp_path, urls):
+    """Extract one source from every url with ``core.extract_raws``."""
+    extractors = {
+        f"source{i}": UrlExtractor(f"source{i}", url, base_dir=tmp_path)
+        for i, url in enumerate(urls)
+    }
+    monkeypatch.setattr(core, "data_extractors", extractors)
+    return extractors
+
+
+def test_extract_raws_bounds_the_workers(monkeypatch, tmp_path, stub_server):
+    stub_server.content = b"id\n1\n"
+    stub_server.delay = 0.2
+    use_extractors(monkeypatch, tmp_path, [stub_server.url] * 4)
+
+    file_paths = core.extract_raws("2022-03-27", max_workers=2, per_host=4)
+
+    assert len(file_paths) == 4
+    assert len(stub_server.requests) == 4
+    assert stub_server.peak == 2
+
+
+def test_extract_raws_bounds_each_host(monkeypatch, tmp_path, stub_server):
+    stub_server.content = b"id\n1\n"
+    stub_server.delay = 0.2
+    other_host = stub_server.url.replace("127.0.0.1", "localhost")
+    use_extractors(monkeypatch, tmp_path, [stub_server.url, other_host] * 2)
+
+    core.extract_raws("2022-03-27", max_workers=4, per_host=1)
+
+    assert len(stub_server.peak_per_host) == 2
+    assert set(stub_server.peak_per_host.values()) == {1}
+    assert stub_server.peak == 2
+
+
+def test_extract_raws_budget(monkeypatch, tmp_path, stub_server):
+    stub_server.content = b"id\n1\n"
+    stub_server.delay = 0.5
+    extractors = use_extractors(monkeypatch, tmp_path, [stub_server.url] * 3)
+
+    started = time.monotonic()
+    with pytest.raises(TimeoutError, match="source1"):
+        core.extract_raws("2022-03-27", max_workers=1, budget=0.1)
+
+    assert time.monotonic() - started < stub_server.delay
+    assert all(e.session is None for e in extractors.values())
+    # the queued sources were cancelled and never requested.
+    time.sleep(2 * stub_server.delay)
+    assert len(stub_server.requests) == 1
+
+
+def test_extract_raws_cancels_the_abandoned_download(
+    monkeypatch, tmp_path, stub_server
+):
+    stub_server.content = b"id\n1\n"
+    stub_server.delay = 0.5
+    (extractor,) = use_extractors(
+        monkeypatch, tmp_path, [stub_server.url]
+    ).values()
+
+    with pytest.raises(TimeoutError):
+        core.extract_raws("2022-03-27", budget=0.1)
+    # the abandoned download gets its response, and stops.
+    with extractor._lock:
+        pass
+
+    assert len(stub_server.requests) == 1
+    assert [p for p in tmp_path.rglob("*") if p.is_file()] == []
+    stub_server.delay = 0
+    file_paths = core.extract_raws("2022-03-27")
+    assert file_paths["source0"].read_bytes() == stub_server.content
+
+
+def test_run_pipeline_writes_run_report(pipeline, tmp_path):
+    prom = tmp_path / "copypharm.prom"
+
+    result = CliRunner().invoke(
+        core.run_pipeline,
+        ["--date", "2022-03-27", "--prometheus-textfile", str(prom)],
+    )
+
+    assert result.exit_code == 0, result.output
+    report_path = (
+        tmp_path / "data/run_report/2022-03/run_report-27-03-2022.json"
+    )
+    report = json.loads(report_path.read_text())
+    stages = {stage["stage"]: stage for stage in report["stages"]}
+    assert stages["extract_raws"]["bytes_downloaded"] > 0
+    assert stages["trasform_raws"]["rows_in"] == 13677
+    assert stages["trasform_raws"]["rows_out"] == 162
+    assert stages["load_farmacias"]["rows_in"] == 162
+    assert stages["load_farmacias"]["rows_out"] == 162
+    for table in ["farmacias", "localidades", "departamentos"]:
+        load = stages[f"load_{table}"]
+        assert load["rows_in"] == load["rows_out"] > 0
+        assert load["peak_rss_bytes"] > 0
+    assert 'copypharm_stage_wall_seconds{stage="load_tables"}' in (
+        prom.read_text()
+    )
+
+
+def test_run_pipeline_in_memory_loads_the_on_disk_tables(
+    pipeline, monkeypatch, tmp_path
+):
+    def loaded(engine):
+        tables = {}
+        for table, key in [
+            ("farmacias", "id"),
+            ("localidades", "id_localidad"),
+            ("departamentos", "id_departamento"),
+        ]:
+            df = pd.read_sql_table(table, engine)
+            tables[table] = df.sort_values(key, ignore_index=True)
+        return tables
+
+    result = CliRunner().invoke(
+        core.run_pipeline, ["--date", "2022-03-27", "--in-memory"]
+    )
+    assert result.exit_code == 0, result.output
+    in_memory = loaded(pipeline)
+    assert len(in_memory["farmacias"]) == 162
+
+    # the on-disk path loads a database of its own.
+    on_disk_engine = create_engine(f"sqlite:///{tmp_path / 'on_disk.db'}")
+    monkeypatch.setattr(db, "_engine", on_disk_engine)
+    result = CliRunner().invoke(
+        core.run_pipeline, ["--date", "2022-03-27", "--force"]
+    )
+    assert result.exit_code == 0, result.output
+    on_disk = loaded(on_disk_engine)
+    on_disk_engine.dispose()
+    for table, df in on_disk.items():
+        pd.testing.assert_frame_equal(in_memory[table], df)
+
+
+def test_run_pipeline_profile(pipeline, tmp_path):
+    result = CliRunner().invoke(
+        core.run_pipeline, ["--date", "2022-03-27", "--profile"]
+    )
+
+    assert result.exit_code == 0, result.output
+    profile_dir = tmp_path / "data/profile/2022-03/profile-27-03-2022"
+    for stage in ["extract_raws", "trasform_raws", "load_farmacias"]:
+        stats = pstats.Stats(str(profile_dir / f"{stage}.prof"))
+        assert stats.total_calls > 0
+        allocations = profile_dir / f"{stage}-allocations.txt"
+        assert allocations.read_text().startswith("Top 25")
+
+
+def test_backfill_shares_download_and_transform(pipeline, stub_server):
+    dates = core.date_range("2022-03-25", "2022-03-27")
+
+    data_paths = core.backfill(dates, max_workers=2)
+
+    assert len(stub_server.requests) == 1
+    first, *others = [data_paths[d] for d in dates]
+    for paths in others:
+        for one, other in zip(first, paths):
+            assert one != other
+            assert os.path.samefile(one, other)
+    with pipeline.connect() as conn:
+        count = conn.exec_driver_sql("SELECT COUNT(*) FROM farmacias")
+        assert count.scalar() == 162
+
+    # a second run with the same dates resumes from the progress file.
+    assert core.backfill(dates) == data_paths
+    assert len(stub_server.requests) == 1
+
+
+def test_backfill_updates_the_keymaps_in_date_order(pipeline, tmp_path):
+    national = pd.read_csv(national_csv, dtype=str, keep_default_na=False)
+    formosa = national["provincia_nombre"] == "FORMOSA"
+    first = national.index[formosa][0]
+    id_localidad = int(national.at[first, "localidad_id"])
+    localidad = national.at[first, "localidad_nombre"]
+    dates = core.date_range("2022-03-25", "2022-03-28")
+    # every date renames the localidad and adds a new one, so the
+    # workers would race on the key maps if they updated them.
+    for day, date_str in enumerate(dates):
+        raw = national.copy()
+        raw.loc[
+            raw["localidad_id"] == str(id_localidad), "localidad_nombre"
+        ] = f"{localidad} {day}"
+        raw.at[first, "localidad_id"] = str(900000000 + day)
+        raw.at[first, "localidad_nombre"] = f"NUEVA {day}"
+        path = core.dated_path("farmacias", date_str, tmp_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        raw.to_csv(path, index=False)
+
+    data_paths = core.backfill(dates, max_workers=3)
+
+    keymap = KeyMap.load(
+        core.keymap_path("localidades"), "id_localidad", "localidad"
+    )
+    assert keymap.members[id_localidad] == f"{localidad} 0"
+    for day, date_str in enumerate(dates):
+        assert keymap.members[900000000 + day] == f"NUEVA {day}"
+        localidades = read_frame(data_paths[date_str][1])
+        names = localidades.set_index("id_localidad")["localidad"]
+        assert names[id_localidad] == f"{localidad} 0"
+
+
+def test_backfill_builds_the_search_indexes_in_date_order(pipeline, tmp_path):
+    national = pd.read_csv(national_csv, dtype=str, keep_default_na=False)
+    first = national.index[national["provincia_nombre"] == "FORMOSA"][0]
+    dates = core.date_range("2022-03-25", "2022-03-28")
+    # the 25th and the 27th share their content.
+    for date_str, name in zip(dates, ["UNO", "DOS", "UNO", "TRES"]):
+        raw = national.copy()
+        raw.at[first, "establecimiento_nombre"] = f"FARMACIA {name}"
+        path = core.dated_path("farmacias", date_str, tmp_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        raw.to_csv(path, index=False)
+
+    data_paths = core.backfill(dates, max_workers=3)
+
+    for date_str in dates:
+        index = SearchIndex.load(core.search_index_path(date_str))
+        farmacias = read_frame(data_paths[date_str][0])
+        expected = SearchIndex.from_frame(farmacias).to_frame()
+        pd.testing.assert_frame_equal(
+            index.to_frame().sort_values("id", ignore_index=True),
+            expected.sort_values("id", ignore_index=True),
+        )
+
+
+def test_run_pipeline_backfill_dates(pipeline, tmp_path):
+    result = CliRunner().invoke(
+        core.run_pipeline, ["--dates", "2022-03-27,2022-03-29"]
+    )
+
+    assert result.exit_code == 0, result.output
+    progress = json.loads(
+        (
+            tmp_path / "data/backfill/backfill-2022-03-27_2022-03-29.json"
+        ).read_text()
+    )
+    assert set(progress["done"]) == {"2022-03-27", "2022-03-29"}
+    assert progress["loaded"] == ["2022-03-29"]
+
+
+@pytest.mark.parametrize(
+    "option",
+    [
+        ["--provincia", "CHUBUT"],
+        ["--all-provincias"],
+        ["--in-memory"],
+        ["--profile"],
+        ["--metrics-json", "report.json"],
+        ["--prometheus-textfile", "metrics.prom"],
+    ],
+)
+def test_run_pipeline_backfill_rejects_single_date_options(pipeline, option):
+    result = CliRunner().invoke(
+        core.run_pipeline, ["--dates", "2022-03-27"] + option
+    )
+
+    assert result.exit_code == 2
+    assert f"{option[0]} cannot be used with" in result.output
+
+
+def test_run_pipeline_skips_unchanged_stages(pipeline, tmp_path, stub_server):
+    report_path = tmp_path / "report.json"
+    args = ["--date", "2022-03-27", "--metrics-json", str(report_path)]
+
+    def run(*extra):
+        result = CliRunner().invoke(core.run_pipeline, args + list(extra))
+        assert result.exit_code == 0, result.output
+        report = json.loads(report_path.read_text())
+        return {stage["stage"]: stage for stage in report["stages"]}
+
+    run()
+    requests = len(stub_server.requests)
+
+    stages = run()
+    assert len(stub_server.requests) == requests
+    for name in ["extract_raws", "trasform_raws", "load_farmacias"]:
+        assert stages[name]["skipped"]
+
+    stages = run("--force")
+    assert len(stub_server.requests) == requests + 1
+    assert stages["load_farmacias"]["rows_out"] == 162
+
+
+def test_run_pipeline_loads_again_after_another_load(pipeline, tmp_path):
+    report_path = tmp_path / "report.json"
+    args = ["--date", "2022-03-27", "--metrics-json", str(report_path)]
+
+    def run():
+        result = CliRunner().invoke(core.run_pipeline, args)
+        assert result.exit_code == 0, result.output
+        report = json.loads(report_path.read_text())
+        return {stage["stage"]: stage for stage in report["stages"]}
+
+    run()
+    assert run()["load_farmacias"]["skipped"]
+
+    # someone else loads a part of the table in between.
+    farmacias = core.dated_path("farmacias_de_formosa", "2022-03-27", tmp_path)
+    FarmaciasLoader().load_table(read_frame(farmacias).iloc[:10])
+
+    stages = run()
+    assert not stages["load_farmacias"].get("skipped")
+    assert stages["load_localidades"]["skipped"]
+    with pipeline.connect() as conn:
+        count = conn.exec_driver_sql("SELECT COUNT(*) FROM farmacias")
+        assert count.scalar() == 162
+    assert run()["load_farmacias"]["skipped"]
+
+
+def test_run_pipeline_loads_the_rollups(pipeline, caplog):
+    result = CliRunner().invoke(core.run_pipeline, ["--date", "2022-03-27"])
+
+    assert result.exit_code == 0, result.output
+    with pipeline.connect() as conn:
+        for table in ["farmacias_por_departamento", "farmacias_por_localidad"]:
+            total = conn.exec_driver_sql(f"SELECT SUM(farmacias) FROM {table}")
+            assert total.scalar() == 162
+        top = conn.exec_driver_sql(
+            "SELECT id_departamento, farmacias, delta "
+            "FROM farmacias_por_departamento ORDER BY farmacias DESC LIMIT 1"
+        ).one()
+    assert top.farmacias == top.delta
+
+    # an incremental run updates them from the empty change set.
+    result = CliRunner().invoke(
+        core.run_pipeline,
+        ["--date", "2022-03-28", "--incremental", "--force"],
+    )
+    assert result.exit_code == 0, result.output
+    with pipeline.connect() as conn:
+        totals = conn.exec_driver_sql(
+            "SELECT SUM(farmacias), SUM(ABS(delta)) "
+            "FROM farmacias_por_codigo_postal"
+        ).one()
+    assert tuple(totals) == (162, 0)
+    assert "does not match the change set" not in caplog.text
+
+
+def test_store_rollups_updates_the_loaded_rollups(pipeline, caplog):
+    core.load_rollups(core.store_rollups("2022-03-27", OLD))
+    # a later date was stored, but the database still holds OLD.
+    core.store_rollups("2022-03-28", NEW)
+
+    data_paths = core.store_rollups(
+        "2022-03-29", NEW, diff_frames(OLD, NEW, "id")
+    )
+
+    expected = rollup_tables(NEW, rollup_tables(OLD))
+    for table, column in ROLLUPS.items():
+        rollup = read_frame(data_paths[table]).set_index(column)
+        pd.testing.assert_frame_equal(rollup, expected[table])
+    assert "does not match the change set" not in caplog.text
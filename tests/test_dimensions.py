@@ -0,0 +1,66 @@
+from copypharm.dimensions import KeyMap, build_dimension
+
+import pandas as pd
+
+import pytest
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame(
+        {
+            "id": range(6),
+            "id_localidad": [3, 1, 3, 2, 1, None],
+            "localidad": ["C", "A", "C", "B", "A", "X"],
+        }
+    ).astype({"localidad": "category"})
+
+
+def test_matches_the_groupby_and_drops_missing_keys(df, caplog):
+    expected = (
+        df.groupby(
+            ["id_localidad", "localidad"], as_index=False, observed=True
+        )
+        .count()[["id_localidad", "localidad"]]
+        .set_index("id_localidad")
+    )
+
+    table, conflicts = build_dimension(df, "id_localidad", "localidad")
+
+    pd.testing.assert_frame_equal(table, expected)
+    assert conflicts.empty
+    assert "1 rows without id_localidad" in caplog.text
+
+
+def test_most_frequent_spelling_wins(df):
+    df = df.astype({"localidad": object})
+    df.loc[len(df)] = [6, 3, "C."]
+
+    table, conflicts = build_dimension(df, "id_localidad", "localidad")
+
+    assert table["localidad"].to_dict() == {1.0: "A", 2.0: "B", 3.0: "C"}
+    assert conflicts.to_dict("records") == [
+        {"id_localidad": 3.0, "name": "C", "spelling": "C."}
+    ]
+
+
+def test_keymap_keeps_names_and_appends_new_members(df, tmp_path):
+    path = tmp_path / "localidades.csv"
+    keymap = KeyMap.load(path, "id_localidad", "localidad")
+    build_dimension(df.dropna(), "id_localidad", "localidad", keymap)
+    keymap.save(path)
+
+    next_day = pd.DataFrame(
+        {"id_localidad": [1, 2, 4], "localidad": ["A", "B (EST.)", "D"]}
+    )
+    keymap = KeyMap.load(path, "id_localidad", "localidad")
+    table, conflicts = build_dimension(
+        next_day, "id_localidad", "localidad", keymap
+    )
+
+    assert table["localidad"].tolist() == ["A", "B", "D"]
+    assert conflicts.to_dict("records") == [
+        {"id_localidad": 2, "name": "B", "spelling": "B (EST.)"}
+    ]
+    assert keymap.appended == 1
+    assert keymap.members.to_dict() == {1: "A", 2: "B", 3: "C", 4: "D"}
@@ -0,0 +1,287 @@
+import filecmp
+import hashlib
+import json
+import math
+import os
+
+from copypharm.extractor import UrlExtractor, build_session
+
+import pandas as pd
+
+import pytest
+
+import requests
+
+from urllib3.util.retry import Retry
+
+from .conftest import dated
+
+CONTENT = (
+    "establecimiento_id,establecimiento_nombre\n"
+    + "".join(f"{i},FARMACIA {i}\n" for i in range(1000))
+).encode("utf-8")
+
+
+def test_extract_stores_sidecar_metadata(stub_server, tmp_path):
+    stub_server.content = CONTENT
+    extractor = UrlExtractor("farmacias", stub_server.url, base_dir=tmp_path)
+
+    path = extractor.extract("2022-03-27")
+
+    assert path.read_bytes() == CONTENT
+    meta = json.loads(extractor.meta_path.read_text())
+    entry = meta["files"]["2022-03-27"]
+    assert entry["size"] == len(CONTENT)
+    assert entry["etag"]
+    assert len(entry["sha256"]) == 64
+    assert "partial" not in meta
+
+
+def test_extract_streams_bodies_larger_than_a_chunk(
+    monkeypatch, stub_server, tmp_path
+):
+    stub_server.content = CONTENT * 8
+    extractor = UrlExtractor(
+        "farmacias", stub_server.url, chunk_size=1024, base_dir=tmp_path
+    )
+    chunks, responses = [], []
+    iter_content = requests.Response.iter_content
+
+    def recorded(self, chunk_size=1, decode_unicode=False):
+        responses.append(self)
+        for chunk in iter_content(self, chunk_size, decode_unicode):
+            chunks.append(len(chunk))
+            yield chunk
+
+    monkeypatch.setattr(requests.Response, "iter_content", recorded)
+
+    path = extractor.extract("2022-03-27")
+
+    assert path.read_bytes() == stub_server.content
+    assert sum(chunks) == len(stub_server.content)
+    assert len(chunks) >= len(stub_server.content) // 1024
+    assert max(chunks) <= 1024
+    # the body was never read into the response as a whole.
+    assert [r._content for r in responses] == [False]
+    assert not list(path.parent.glob("*.part"))
+    assert "partial" not in json.loads(extractor.meta_path.read_text())
+
+
+def test_build_session_retries_with_backoff(
+    monkeypatch, stub_server, tmp_path
+):
+    stub_server.content = CONTENT
+    stub_server.failures = [503, 503]
+    backoffs = []
+    monkeypatch.setattr(
+        Retry,
+        "sleep",
+        lambda self, response=None: backoffs.append(self.get_backoff_time()),
+    )
+    extractor = UrlExtractor(
+        "farmacias",
+        stub_server.url,
+        base_dir=tmp_path,
+        session=build_session(retries=2, backoff_factor=0.5),
+    )
+
+    path = extractor.extract("2022-03-27")
+
+    assert path.read_bytes() == CONTENT
+    assert len(stub_server.requests) == 3
+    # the backoff doubles on every consecutive error.
+    assert len(backoffs) == 2
+    assert backoffs[-1] == 1.0
+
+    stub_server.failures = [503] * 3
+    with pytest.raises(requests.exceptions.RetryError):
+        extractor.extract("2022-03-28")
+    assert len(stub_server.requests) == 6
+    assert not list(tmp_path.glob("data/farmacias/2022-03/*28-03*"))
+
+
+def test_extract_unchanged_day_transfers_zero_bytes(stub_server, tmp_path):
+    stub_server.content = CONTENT
+    extractor = UrlExtractor("farmacias", stub_server.url, base_dir=tmp_path)
+    first = extractor.extract("2022-03-27")
+    sent = stub_server.bytes_sent
+
+    second = extractor.extract("2022-03-28")
+
+    assert stub_server.bytes_sent == sent
+    assert extractor.stats["status"] == 304
+    assert extractor.stats["bytes"] == 0
+    assert "If-None-Match" in stub_server.requests[-1]
+    assert filecmp.cmp(first, second, shallow=False)
+    assert os.path.samefile(first, second)
+
+
+def test_extract_changed_source_downloads_again(stub_server, tmp_path):
+    stub_server.content = CONTENT
+    extractor = UrlExtractor("farmacias", stub_server.url, base_dir=tmp_path)
+    extractor.extract("2022-03-27")
+
+    stub_server.content = CONTENT + b"1000,FARMACIA NUEVA\n"
+    path = extractor.extract("2022-03-28")
+
+    assert extractor.stats["status"] == 200
+    assert path.read_bytes() == stub_server.content
+
+
+def test_extract_resumes_interrupted_transfer(stub_server, tmp_path):
+    stub_server.content = CONTENT
+    extractor = UrlExtractor("farmacias", stub_server.url, base_dir=tmp_path)
+    extractor.extract("2022-03-27")
+    etag = json.loads(extractor.meta_path.read_text())["latest"]["etag"]
+
+    # simulate a transfer of another day interrupted halfway.
+    stub_server.content = CONTENT + b"1000,FARMACIA NUEVA\n"
+    new_etag = '"{}"'.format(
+        hashlib.sha256(stub_server.content).hexdigest()[:16]
+    )
+    assert new_etag != etag
+    path = tmp_path / "data/farmacias/2022-03/farmacias-28-03-2022.csv"
+    half = len(stub_server.content) // 2
+    path.with_name(path.name + ".part").write_bytes(stub_server.content[:half])
+    meta = json.loads(extractor.meta_path.read_text())
+    meta["partial"] = {
+        "path": "data/farmacias/2022-03/farmacias-28-03-2022.csv",
+        "etag": new_etag,
+        "last_modified": None,
+    }
+    extractor.meta_path.write_text(json.dumps(meta))
+    sent = stub_server.bytes_sent
+
+    result = extractor.extract("2022-03-28")
+
+    assert extractor.stats["status"] == 206
+    assert extractor.stats["resumed_from"] == half
+    assert stub_server.bytes_sent - sent == len(stub_server.content) - half
+    assert result.read_bytes() == stub_server.content
+
+
+@pytest.mark.parametrize("engine", ["c", "pyarrow"])
+def test_read_raw_prunes_columns_with_compact_dtypes(engine):
+    pytest.importorskip("pyarrow")
+    raw = dated("farmacias")
+    extractor = UrlExtractor("farmacias", url=None)
+
+    df = extractor.read_raw(raw, engine=engine)
+
+    assert list(df.columns) == extractor.usecols
+    assert "tipologia_nombre" in pd.read_csv(raw, nrows=0).columns
+    assert "tipologia_nombre" not in df.columns
+    for col in ["establecimiento_id", "localidad_id", "departamento_id"]:
+        assert df[col].dtype == "int64"
+    for col in ["provincia_nombre", "localidad_nombre", "departamento_nombre"]:
+        assert isinstance(df[col].dtype, pd.CategoricalDtype)
+    for col in ["establecimiento_nombre", "domicilio", "sitio_web"]:
+        assert df[col].dtype == "string[pyarrow]"
+    assert len(df) == len(pd.read_csv(raw, usecols=[0]))
+
+
+def test_iter_raw_reads_several_chunks():
+    raw = dated("farmacias")
+    extractor = UrlExtractor("farmacias", url=None)
+    full = extractor.read_raw(raw)
+    formosa = full[full["provincia_nombre"] == "FORMOSA"]
+    chunksize = 5000
+    categories = {
+        col: "category"
+        for col, dtype in extractor.dtypes.items()
+        if dtype == "category"
+    }
+
+    chunks = list(extractor.iter_raw(raw, chunksize=chunksize))
+    df = pd.concat(chunks, ignore_index=True).astype(categories)
+
+    assert len(full) > chunksize
+    assert [len(chunk) for chunk in chunks[:-1]] == [chunksize] * (
+        len(chunks) - 1
+    )
+    pd.testing.assert_frame_equal(df, full)
+    assert extractor.scan_stats == {
+        "rows_scanned": len(full),
+        "rows_kept": len(full),
+        "chunks": math.ceil(len(full) / chunksize),
+    }
+
+    chunks = list(extractor.iter_raw(raw, ["FORMOSA"], chunksize=chunksize))
+    assert sum(len(chunk) for chunk in chunks) == len(formosa)
+    assert extractor.scan_stats == {
+        "rows_scanned": len(full),
+        "rows_kept": len(formosa),
+        "chunks": math.ceil(len(full) / chunksize),
+    }
+
+
+def test_read_provincias_filters_while_streaming(tmp_path):
+    raw = tmp_path / "farmacias.csv"
+    raw.write_text(
+        "establecimiento_id,establecimiento_nombre,localidad_id,"
+        "localidad_nombre,provincia_id,provincia_nombre,departamento_id,"
+        "departamento_nombre,cp,domicilio,sitio_web\n"
+        + "".join(
+            f"{i},F{i},{i % 3},L{i % 3},{i % 2},{'AB'[i % 2]},{i % 5},"
+            f"D{i % 5},5000,Calle {i},\n"
+            for i in range(100)
+        )
+    )
+    extractor = UrlExtractor("farmacias", url=None)
+    full = extractor.read_raw(raw)
+
+    frames = extractor.read_provincias(raw, ["A", "C"], chunksize=7)
+
+    assert set(frames) == {"A", "C"}
+    assert frames["A"]["establecimiento_id"].tolist() == (
+        full[full["provincia_nombre"] == "A"]["establecimiento_id"].tolist()
+    )
+    assert frames["A"]["localidad_nombre"].dtype == "category"
+    assert frames["C"].empty
+
+    assert set(extractor.read_provincias(raw, chunksize=7)) == {"A", "B"}
+
+
+def test_convert_raw_reuses_unchanged_raw(tmp_path):
+    extractor = UrlExtractor("farmacias", url=None, base_dir=tmp_path)
+    first = tmp_path / "farmacias-26-03-2022.csv"
+    second = tmp_path / "farmacias-27-03-2022.csv"
+    raw = (
+        "establecimiento_id,establecimiento_nombre,localidad_id,"
+        "localidad_nombre,provincia_id,provincia_nombre,departamento_id,"
+        "departamento_nombre,cp,domicilio,sitio_web\n"
+        "1,F1,1,L1,34,FORMOSA,14,D14,3600,Calle 1,\n"
+    )
+    first.write_text(raw)
+    second.write_text(raw)
+
+    converted = extractor.convert_raw(first, "parquet")
+    reused = extractor.convert_raw(second, "parquet")
+
+    assert reused.suffix == ".parquet"
+    assert os.path.samefile(converted, reused)
+
+
+def test_iter_raw_pyarrow_column_null_in_the_first_block(tmp_path):
+    # sitio_web is empty for more than one arrow block (1 MB) of rows.
+    raw = tmp_path / "farmacias.csv"
+    rows = 30000
+    raw.write_text(
+        "establecimiento_id,establecimiento_nombre,localidad_id,"
+        "localidad_nombre,provincia_id,provincia_nombre,departamento_id,"
+        "departamento_nombre,cp,domicilio,sitio_web\n"
+        + "".join(
+            f"{i},FARMACIA {i},1,L1,34,FORMOSA,14,D14,3600,Calle {i},"
+            f"{'www.farmacia.com' if i == rows - 1 else ''}\n"
+            for i in range(rows)
+        )
+    )
+    extractor = UrlExtractor("farmacias", url=None)
+
+    chunks = list(extractor.iter_raw(raw, engine="pyarrow"))
+
+    assert len(chunks) > 1
+    assert extractor.scan_stats["rows_kept"] == rows
+    sitio_web = chunks[-1]["sitio_web"]
+    assert sitio_web.iloc[-1] == "www.farmacia.com"
+    assert sitio_web.dtype == extractor.dtypes["sitio_web"]
@@ -0,0 +1,44 @@
+import subprocess
+import sys
+
+# : budget in microseconds for the cumulative import time of the package.
+IMPORT_TIME_BUDGET = 50_000
+
+HEAVY_MODULES = ["pandas", "requests", "click", "sqlalchemy"]
+
+
+def import_times():
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import copypharm"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_import_time_budget():
+    times = import_times()
+
+    assert times["copypharm"] < IMPORT_TIME_BUDGET
+    for module in HEAVY_MODULES:
+        assert module not in times
+
+
+def test_lazy_attributes():
+    code = (
+        "import sys, copypharm; "
+        "copypharm.TABLE_NAMES; "
+        "assert 'pandas' not in sys.modules; "
+        "copypharm.UrlExtractor; "
+        "assert 'pandas' in sys.modules; "
+        "assert 'sqlalchemy' not in sys.modules"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
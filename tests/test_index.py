@@ -0,0 +1,64 @@
+import os
+
+from copypharm.index import PharmacyIndex
+from copypharm.storage import read_frame
+
+import numpy as np
+
+import pandas as pd
+
+import pytest
+
+from .conftest import data_path
+
+farmacias_csv = os.path.join(
+    data_path,
+    "farmacias_de_formosa",
+    "2022-03",
+    "farmacias_de_formosa-27-03-2022.csv",
+)
+
+
+@pytest.fixture
+def farmacias():
+    return read_frame(farmacias_csv).set_index("id")
+
+
+@pytest.mark.parametrize(
+    "col", ["id_localidad", "id_departamento", "codigo_postal"]
+)
+def test_lookups_match_a_scan(farmacias, col):
+    index = PharmacyIndex.from_frame(farmacias)
+
+    for value in farmacias[col].unique():
+        expected = farmacias[farmacias[col] == value]
+        result = index.take(index.rows(col, value))
+        pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+    assert index.rows(col, -42).size == 0
+
+
+def test_save_load_memory_maps(tmp_path, farmacias):
+    index = PharmacyIndex.from_frame(farmacias)
+    path = index.save(tmp_path / "farmacias_de_formosa.index")
+
+    loaded = PharmacyIndex.load(path)
+
+    assert len(loaded) == len(farmacias)
+    assert isinstance(loaded.arrays["id_localidad.rows"], np.memmap)
+    pd.testing.assert_frame_equal(
+        loaded.by_codigo_postal(3600), index.by_codigo_postal(3600)
+    )
+    pharmacy_id = farmacias.index[10]
+    assert loaded.get(pharmacy_id)["nombre"] == farmacias.iloc[10]["nombre"]
+    assert loaded.get(1) is None
+
+
+def test_from_db(sqlite_engine, farmacias):
+    farmacias.to_sql("farmacias", sqlite_engine)
+
+    index = PharmacyIndex.from_db(sqlite_engine)
+
+    assert len(index) == len(farmacias)
+    assert len(index.by_departamento(49)) == (
+        (farmacias["id_departamento"] == 49).sum()
+    )
@@ -0,0 +1,153 @@
+import time
+
+from copypharm import loaders, scripts
+from copypharm.storage import read_frame
+
+import pandas as pd
+
+from sqlalchemy import inspect
+from sqlalchemy.sql import text
+
+from .conftest import dated
+
+# : the largest value of a 32 bit ``INT`` column.
+INT_MAX = 2**31 - 1
+
+
+def localidades_csv(tmp_path, n):
+    path = tmp_path / f"localidades-{n}.csv"
+    pd.DataFrame(
+        {"id_localidad": range(n), "localidad": [f"L{i}" for i in range(n)]}
+    ).to_csv(path, index=False)
+    return path
+
+
+def test_load_table_creates_missing_table(sqlite_engine, tmp_path):
+    rows = loaders.LocalidadesLoader().load_table(localidades_csv(tmp_path, 5))
+
+    assert rows == 5
+    assert inspect(sqlite_engine).has_table("localidades")
+
+
+def test_load_table_keeps_schema_and_swaps_rows(sqlite_engine, tmp_path):
+    with sqlite_engine.begin() as conn:
+        conn.execute(
+            text(
+                "CREATE TABLE localidades ("
+                "id_localidad INT PRIMARY KEY, "
+                "localidad VARCHAR(255) NOT NULL)"
+            )
+        )
+    loader = loaders.LocalidadesLoader()
+    loader.load_table(localidades_csv(tmp_path, 3))
+
+    loader.load_table(localidades_csv(tmp_path, 2500))
+
+    insp = inspect(sqlite_engine)
+    pk = insp.get_pk_constraint("localidades")["constrained_columns"]
+    assert pk == ["id_localidad"]
+    assert not insp.has_table("localidades_staging")
+    with sqlite_engine.connect() as conn:
+        count = conn.execute(text("SELECT COUNT(*) FROM localidades"))
+        assert count.scalar() == 2500
+
+
+def test_upsert_table_writes_only_changes(sqlite_engine, tmp_path):
+    loader = loaders.LocalidadesLoader()
+    loader.load_table(localidades_csv(tmp_path, 5))
+    df = pd.read_csv(localidades_csv(tmp_path, 6))
+    df.loc[0, "localidad"] = "NUEVA"
+    df = df[df["id_localidad"] != 3]
+
+    changes = loader.upsert_table(df)
+
+    assert changes.inserts["id_localidad"].tolist() == [5]
+    assert changes.updates["id_localidad"].tolist() == [0]
+    assert changes.deletes["id_localidad"].tolist() == [3]
+    table = pd.read_sql_table("localidades", sqlite_engine)
+    table = table.sort_values("id_localidad").reset_index(drop=True)
+    pd.testing.assert_frame_equal(table, df.reset_index(drop=True))
+    assert len(loader.upsert_table(df)) == 0
+
+
+def test_load_table_accepts_indexed_frame(sqlite_engine, tmp_path):
+    path = localidades_csv(tmp_path, 4)
+    df = pd.read_csv(path).set_index("id_localidad")
+
+    loaders.LocalidadesLoader().load_table(df)
+
+    table = pd.read_sql_table("localidades", sqlite_engine)
+    pd.testing.assert_frame_equal(table, pd.read_csv(path))
+
+
+def test_load_tables_follows_dependencies(sqlite_engine, monkeypatch):
+    order = []
+
+    def load_table(self, data):
+        order.append(("start", self.table_name))
+        time.sleep(0.05)
+        order.append(("end", self.table_name))
+        return len(data)
+
+    monkeypatch.setattr(loaders.BaseLoader, "load_table", load_table)
+    for cls in (
+        loaders.FarmaciasLoader,
+        loaders.LocalidadesLoader,
+        loaders.DepartamentosLoader,
+    ):
+        monkeypatch.delattr(cls, "load_table")
+    frame = pd.DataFrame({"id": [1, 2]})
+
+    results = loaders.load_tables(
+        [
+            (loaders.FarmaciasLoader(), frame),
+            (loaders.LocalidadesLoader(), frame),
+            (loaders.DepartamentosLoader(), frame),
+        ]
+    )
+
+    assert order[-2:] == [("start", "farmacias"), ("end", "farmacias")]
+    assert {event for event, _ in order[:2]} == {"start"}
+    assert results["farmacias"]["result"] == 2
+    assert results["localidades"]["seconds"] > 0
+
+
+def test_load_tables_upserts_the_given_tables(sqlite_engine, tmp_path):
+    path = localidades_csv(tmp_path, 5)
+    loaders.load_tables([(loaders.LocalidadesLoader(), path)])
+
+    results = loaders.load_tables(
+        [(loaders.LocalidadesLoader(), localidades_csv(tmp_path, 6))],
+        upserted=["localidades"],
+    )
+
+    changes = results["localidades"]["result"]
+    assert len(changes.inserts) == 1
+    assert results["localidades"]["rows"] == 1
+
+
+def test_create_table_holds_real_width_ids(sqlite_engine, sql_dir):
+    scripts.create_table()
+    insp = inspect(sqlite_engine)
+    for table, columns in [
+        ("farmacias", ["id", "id_localidad", "id_departamento"]),
+        ("localidades", ["id_localidad"]),
+        ("departamentos", ["id_departamento"]),
+    ]:
+        types = {c["name"]: str(c["type"]) for c in insp.get_columns(table)}
+        assert all(types[col] == "BIGINT" for col in columns), types
+
+    farmacias = read_frame(dated("farmacias_de_formosa"))
+    localidades = read_frame(dated("localidades"))
+    assert farmacias["id"].max() > INT_MAX
+    assert localidades["id_localidad"].max() > INT_MAX
+    loaders.load_tables(
+        [
+            (loaders.FarmaciasLoader(), farmacias),
+            (loaders.LocalidadesLoader(), localidades),
+            (loaders.DepartamentosLoader(), dated("departamentos")),
+        ]
+    )
+
+    loaded = pd.read_sql_table("farmacias", sqlite_engine)
+    assert sorted(loaded["id"]) == sorted(farmacias["id"])
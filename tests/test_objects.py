@@ -0,0 +1,62 @@
+import os
+import stat
+
+from copypharm.objects import ObjectStore, file_sha256
+from copypharm.storage import write_frame
+
+import pandas as pd
+
+
+def test_put_deduplicates_identical_files(tmp_path):
+    store = ObjectStore(tmp_path / "objects")
+    first = tmp_path / "farmacias-26-03-2022.csv"
+    second = tmp_path / "farmacias-27-03-2022.csv"
+    first.write_bytes(b"id,nombre\n1,CENTRAL\n")
+    second.write_bytes(b"id,nombre\n1,CENTRAL\n")
+
+    digest = store.put(first)
+
+    assert store.put(second) == digest == file_sha256(second)
+    assert os.path.samefile(first, second)
+    assert os.path.samefile(first, store.object_path(digest))
+    assert store.usage() == {"objects": 1, "bytes": first.stat().st_size}
+
+
+def test_put_leaves_the_file_unchanged(tmp_path):
+    store = ObjectStore(tmp_path / "objects")
+    first = tmp_path / "farmacias-26-03-2022.csv"
+    second = tmp_path / "farmacias-27-03-2022.csv"
+    for path in [first, second]:
+        path.write_bytes(b"id,nombre\n1,CENTRAL\n")
+        path.chmod(0o644)
+
+    store.put(first)
+    store.put(second)
+
+    for path in [first, second]:
+        assert stat.S_IMODE(path.stat().st_mode) == 0o644
+        assert path.read_bytes() == b"id,nombre\n1,CENTRAL\n"
+
+
+def test_write_frame_replaces_linked_file(tmp_path):
+    store = ObjectStore(tmp_path / "objects")
+    df = pd.DataFrame({"id": [1], "nombre": ["CENTRAL"]}).set_index("id")
+    first = write_frame(df, tmp_path / "farmacias-26-03-2022.csv")
+    digest = store.put(first)
+    second = store.link(digest, tmp_path / "farmacias-27-03-2022.csv")
+
+    write_frame(df.assign(nombre="NUEVA"), second)
+
+    assert not os.path.samefile(first, second)
+    assert file_sha256(first) == digest
+    assert "NUEVA" in second.read_text()
+
+
+def test_tag_resolve(tmp_path):
+    store = ObjectStore(tmp_path / "objects")
+    path = tmp_path / "farmacias.parquet"
+    path.write_bytes(b"PAR1")
+
+    assert store.resolve("farmacias-parquet") is None
+    store.tag("farmacias-parquet", store.put(path))
+    assert store.resolve("farmacias-parquet") == file_sha256(path)
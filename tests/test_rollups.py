@@ -0,0 +1,83 @@
+from copypharm.changes import diff_frames
+from copypharm.rollups import ROLLUPS, apply_changes, rollup_tables
+
+import pandas as pd
+
+
+def farmacias(rows):
+    return pd.DataFrame(
+        rows,
+        columns=["id", "id_localidad", "id_departamento", "codigo_postal"],
+    )
+
+
+OLD = farmacias(
+    [
+        (1, 10, 1, 3600),
+        (2, 10, 1, 3600),
+        (3, 20, 1, 3610),
+        (4, 30, 2, 3620),
+    ]
+)
+
+# 2 moves to localidad 20, 4 is deleted and 5 is inserted.
+NEW = farmacias(
+    [
+        (1, 10, 1, 3600),
+        (2, 20, 1, 3610),
+        (3, 20, 1, 3610),
+        (5, 40, 2, 3630),
+    ]
+)
+
+
+def test_rollup_counts_and_deltas():
+    previous = rollup_tables(OLD)
+    rollups = rollup_tables(NEW, previous)
+
+    localidades = rollups["farmacias_por_localidad"]
+    assert localidades.index.name == "id_localidad"
+    assert localidades["farmacias"].to_dict() == {10: 1, 20: 2, 30: 0, 40: 1}
+    assert localidades["delta"].to_dict() == {10: -1, 20: 1, 30: -1, 40: 1}
+
+    # a group that lost its farmacias yesterday is not kept again.
+    again = rollup_tables(NEW, rollups)["farmacias_por_localidad"]
+    assert again["farmacias"].to_dict() == {10: 1, 20: 2, 40: 1}
+    assert (again["delta"] == 0).all()
+
+
+def test_apply_changes_matches_a_rebuild():
+    previous = rollup_tables(OLD)
+    changes = diff_frames(OLD, NEW, "id")
+
+    for table, column in ROLLUPS.items():
+        updated = apply_changes(previous[table], changes, column)
+        rebuilt = rollup_tables(NEW, previous)[table]
+        pd.testing.assert_frame_equal(updated, rebuilt)
+
+
+def test_mismatched_change_set_is_rebuilt(caplog):
+    previous = rollup_tables(OLD)
+    changes = diff_frames(OLD.iloc[:2], NEW, "id")
+
+    rollups = rollup_tables(NEW, previous, changes)
+
+    rebuilt = rollup_tables(NEW, previous)
+    for table in ROLLUPS:
+        pd.testing.assert_frame_equal(rollups[table], rebuilt[table])
+    assert "does not match the change set" in caplog.text
+
+
+def test_group_mismatch_with_the_same_total_is_rebuilt(caplog):
+    # the previous rollups move a farmacia to another localidad, so
+    # only the counts by group tell them apart from OLD.
+    swapped = OLD.assign(id_localidad=[10, 20, 20, 30])
+    previous = rollup_tables(swapped)
+    changes = diff_frames(OLD, NEW, "id")
+
+    rollups = rollup_tables(NEW, previous, changes)
+
+    rebuilt = rollup_tables(NEW, previous)
+    table = "farmacias_por_localidad"
+    pd.testing.assert_frame_equal(rollups[table], rebuilt[table])
+    assert "does not match the change set" in caplog.text
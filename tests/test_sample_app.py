@@ -0,0 +1,121 @@
+import gc
+import weakref
+
+from copypharm import loaders
+from copypharm.storage import read_frame
+
+import pytest
+
+import sample_app
+from sample_app import create_app
+from sample_app.cache import TTLCache
+
+from .conftest import dated
+
+
+@pytest.fixture
+def client(sqlite_engine):
+    loaders.load_tables(
+        [
+            (loaders.FarmaciasLoader(), dated("farmacias_de_formosa")),
+            (loaders.LocalidadesLoader(), dated("localidades")),
+            (loaders.DepartamentosLoader(), dated("departamentos")),
+        ]
+    )
+    return create_app().test_client()
+
+
+def test_keyset_pagination_walks_every_row(client):
+    farmacias = read_frame(dated("farmacias_de_formosa"))
+    seen, after = [], None
+    while True:
+        url = "/farmacias?limit=50" + (f"&after={after}" if after else "")
+        page = client.get(url).get_json()
+        seen += [row["id"] for row in page["items"]]
+        after = page["next"]
+        if after is None:
+            break
+
+    assert seen == sorted(farmacias["id"])
+
+
+def test_filters_and_lookup(client):
+    farmacias = read_frame(dated("farmacias_de_formosa"))
+    expected = farmacias[farmacias["codigo_postal"] == 3600]
+
+    page = client.get("/farmacias?codigo_postal=3600&limit=500").get_json()
+    assert len(page["items"]) == len(expected)
+    assert {row["codigo_postal"] for row in page["items"]} == {3600}
+
+    pharmacy = client.get(f"/farmacias/{expected['id'].iloc[0]}").get_json()
+    assert pharmacy["nombre"] == expected["nombre"].iloc[0]
+
+    assert client.get("/farmacias/1").status_code == 404
+    assert client.get("/clinicas").status_code == 404
+    response = client.get("/farmacias?codigo_postal=X5000")
+    assert response.status_code == 400
+    assert "codigo_postal" in response.get_json()["error"]
+
+
+def test_cache_is_cleared_after_a_load(client):
+    url = "/localidades?limit=500"
+    first = client.get(url)
+    second = client.get(url)
+    assert first.headers["X-Cache"] == "MISS"
+    assert second.headers["X-Cache"] == "HIT"
+
+    localidades = read_frame(dated("localidades")).iloc[:3]
+    loaders.LocalidadesLoader().load_table(localidades)
+
+    third = client.get(url)
+    assert third.headers["X-Cache"] == "MISS"
+    assert len(third.get_json()["items"]) == 3
+
+
+def test_cache_revalidates_with_the_load_version(client, monkeypatch):
+    app = create_app(revalidate=0)
+    sample_app.app._caches.discard(app.extensions["copypharm_cache"])
+    other = app.test_client()
+
+    url = "/departamentos?limit=500"
+    assert other.get(url).headers["X-Cache"] == "MISS"
+    assert other.get(url).headers["X-Cache"] == "HIT"
+
+    # a load of another process only shows up as a new version.
+    departamentos = read_frame(dated("departamentos")).iloc[:2]
+    loaders.DepartamentosLoader().load_table(departamentos)
+
+    assert other.get(url).headers["X-Cache"] == "MISS"
+    assert len(other.get(url).get_json()["items"]) == 2
+
+
+def test_create_app_adds_no_load_listener(sqlite_engine):
+    listeners = list(loaders._load_listeners)
+    apps = [create_app(), create_app()]
+
+    assert loaders._load_listeners == listeners
+    caches = [app.extensions["copypharm_cache"] for app in apps]
+    assert all(cache in sample_app.app._caches for cache in caches)
+
+    # the caches go away with their apps.
+    refs = [weakref.ref(cache) for cache in caches]
+    del apps, caches
+    gc.collect()
+    assert all(ref() is None for ref in refs)
+
+
+def test_ttl_cache_put_get_and_expire(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("sample_app.cache.time.monotonic", lambda: now[0])
+    cache = TTLCache(maxsize=2, ttl=10)
+
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+    now[0] = 11
+    assert cache.get("a", "expired") == "expired"
+    assert (cache.hits, cache.misses) == (2, 2)
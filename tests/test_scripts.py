@@ -0,0 +1,94 @@
+from copypharm import loaders, scripts
+
+from sqlalchemy import inspect
+from sqlalchemy.dialects import mysql, postgresql
+from sqlalchemy.sql import text
+
+from .conftest import dated
+
+# : the largest value of a 32 bit ``INT`` column.
+INT_MAX = 2**31 - 1
+
+
+def test_create_schema_builds_the_indexes_after_the_load(
+    sqlite_engine, sql_dir
+):
+    statements = scripts.create_schema(
+        [
+            (loaders.FarmaciasLoader(), dated("farmacias_de_formosa")),
+            (loaders.LocalidadesLoader(), dated("localidades")),
+            (loaders.DepartamentosLoader(), dated("departamentos")),
+        ]
+    )
+
+    assert len(statements) == 3
+    indexes = inspect(sqlite_engine).get_indexes("farmacias")
+    assert {index["column_names"][0] for index in indexes} == {
+        "id_localidad",
+        "id_departamento",
+        "codigo_postal",
+    }
+    pk = inspect(sqlite_engine).get_pk_constraint("farmacias")
+    assert pk["constrained_columns"] == ["id"]
+
+    # the real ids do not fit a 32 bit INT column.
+    columns = inspect(sqlite_engine).get_columns("farmacias")
+    types = {column["name"]: str(column["type"]) for column in columns}
+    assert types["id"] == types["id_localidad"] == "BIGINT"
+    with sqlite_engine.connect() as conn:
+        max_id, max_localidad = conn.execute(
+            text("SELECT MAX(id), MAX(id_localidad) FROM farmacias")
+        ).one()
+    assert max_id > INT_MAX
+    assert max_localidad > INT_MAX
+
+    assert scripts.build_constraints() == []
+
+
+def test_mysql_adds_everything_in_one_alter_table():
+    statements = scripts._constraint_statements(
+        mysql.dialect(),
+        "farmacias",
+        scripts.FOREIGN_KEYS["farmacias"],
+        scripts.LOOKUP_INDEXES["farmacias"],
+    )
+
+    assert len(statements) == 1
+    assert statements[0].startswith("ALTER TABLE farmacias ADD CONSTRAINT")
+    assert statements[0].count("FOREIGN KEY") == 2
+    assert statements[0].count("ADD INDEX") == 3
+
+
+def test_postgresql_builds_indexes_then_foreign_keys():
+    statements = scripts._constraint_statements(
+        postgresql.dialect(),
+        "farmacias",
+        scripts.FOREIGN_KEYS["farmacias"],
+        ["codigo_postal"],
+    )
+
+    assert statements == [
+        "CREATE INDEX ix_farmacias_codigo_postal ON farmacias (codigo_postal)",
+        "ALTER TABLE farmacias "
+        "ADD CONSTRAINT fk_farmacias_id_localidad FOREIGN KEY (id_localidad) "
+        "REFERENCES localidades (id_localidad) "
+        "DEFERRABLE INITIALLY IMMEDIATE, "
+        "ADD CONSTRAINT fk_farmacias_id_departamento "
+        "FOREIGN KEY (id_departamento) "
+        "REFERENCES departamentos (id_departamento) "
+        "DEFERRABLE INITIALLY IMMEDIATE",
+    ]
+
+
+def test_only_postgresql_foreign_keys_are_deferrable():
+    # the loaders defer the checks with SET CONSTRAINTS on PostgreSQL,
+    # which ignores the foreign keys that are not DEFERRABLE.
+    def statements(dialect):
+        return scripts._constraint_statements(
+            dialect, "farmacias", scripts.FOREIGN_KEYS["farmacias"], []
+        )
+
+    (pg_statement,) = statements(postgresql.dialect())
+    assert pg_statement.count("DEFERRABLE INITIALLY IMMEDIATE") == 2
+    (mysql_statement,) = statements(mysql.dialect())
+    assert "DEFERRABLE" not in mysql_statement
@@ -0,0 +1,98 @@
+import os
+
+from copypharm import core
+from copypharm.changes import diff_frames
+from copypharm.extractor import UrlExtractor
+from copypharm.search import SearchIndex, normalize
+from copypharm.storage import read_frame
+
+import numpy as np
+
+import pandas as pd
+
+import pytest
+
+from .conftest import data_path
+
+farmacias_csv = os.path.join(
+    data_path,
+    "farmacias_de_formosa",
+    "2022-03",
+    "farmacias_de_formosa-27-03-2022.csv",
+)
+national_csv = os.path.join(
+    data_path, "farmacias", "2022-03", "farmacias-27-03-2022.csv"
+)
+
+
+@pytest.fixture
+def farmacias():
+    return read_frame(farmacias_csv).set_index("id")
+
+
+def test_normalize_strips_accents_and_case():
+    assert (
+        normalize("FARMACIA  Güemes, Nº 1.250") == "farmacia guemes no 1 250"
+    )
+    assert normalize(None) == normalize(np.nan) == ""
+
+
+def test_search_tolerates_typos_and_accents(farmacias):
+    index = SearchIndex.from_frame(farmacias)
+    expected = farmacias.index[farmacias["nombre"] == "PERALTA HNOS"][0]
+
+    by_name = index.search("peraltta hnos", field="nombre")
+    by_address = index.search("avenida san martín 470")
+
+    assert by_name.index[0] == expected
+    assert by_address.index[0] == expected
+    assert by_address["score"].is_monotonic_decreasing
+    assert index.search("zzzz").empty
+
+
+def test_updated_matches_a_full_build(tmp_path, farmacias):
+    index = SearchIndex.load(SearchIndex.from_frame(farmacias).save(tmp_path))
+    changed = farmacias.iloc[5:].copy()
+    changed.iloc[:3, changed.columns.get_loc("domicilio")] = "Calle Nueva 1"
+    changed.loc[1] = ["NUEVA", 34049010000, 49, 3610, "Mitre 2"]
+
+    updated = index.updated(changed)
+    rebuilt = SearchIndex.from_frame(changed)
+
+    def by_id(idx):
+        return idx.to_frame().sort_values("id").reset_index(drop=True)
+
+    pd.testing.assert_frame_equal(by_id(updated), by_id(rebuilt))
+    assert updated.search("calle nueva").index[0] in changed.index[:3]
+    assert len(diff_frames(by_id(updated), by_id(rebuilt), "id")) == 0
+
+
+def test_trasform_raws_stores_search_index(monkeypatch, tmp_path):
+    monkeypatch.setattr(core, "BASE_FILE_DIR", tmp_path)
+    monkeypatch.setattr(core, "provincia", "FORMOSA")
+    file_paths = {"farmacias": national_csv}
+
+    core.trasform_raws("2022-03-26", file_paths)
+    core.trasform_raws("2022-03-27", file_paths)
+
+    index = SearchIndex.load(core.search_index_path("2022-03-27"))
+    assert len(index) == 162
+    assert index.search("peralta").index[0] == 70340492347884
+
+
+def test_search_index_covers_the_configured_provincia(monkeypatch, tmp_path):
+    monkeypatch.setattr(core, "BASE_FILE_DIR", tmp_path)
+    monkeypatch.setattr(core, "provincia", "FORMOSA")
+    extractor = UrlExtractor("farmacias", url=None)
+    national = extractor.transform(extractor.read_raw(national_csv))
+    formosa = national[national["provincia"] == "FORMOSA"]
+
+    core.trasform_raws("2022-03-27", {"farmacias": national_csv})
+
+    index = SearchIndex.load(core.search_index_path("2022-03-27"))
+    assert sorted(index.to_frame()["id"]) == sorted(formosa["id"])
+    assert 70260072329721 not in index.search("pujol").index
+    # the same index scales to the national data.
+    national_index = SearchIndex.from_frame(national)
+    assert len(national_index) == len(national)
+    assert national_index.search("pujol").index[0] == 70260072329721
@@ -0,0 +1,27 @@
+from copypharm.storage import read_frame, storage_path, write_frame
+
+import pandas as pd
+
+import pytest
+
+
+@pytest.mark.parametrize("fmt", ["csv", "parquet", "feather"])
+def test_write_read_frame_roundtrip(tmp_path, fmt):
+    df = pd.DataFrame(
+        {
+            "id_localidad": [34014020000, 34028010000],
+            "localidad": ["FORMOSA", "INGENIERO GUILLERMO N. JUAREZ"],
+        }
+    ).set_index("id_localidad")
+    path = storage_path(tmp_path / "localidades-27-03-2022.csv", fmt)
+
+    write_frame(df, path)
+    result = read_frame(path)
+
+    assert path.suffix == f".{fmt}"
+    pd.testing.assert_frame_equal(result, df.reset_index())
+
+
+def test_storage_path_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        storage_path(tmp_path / "localidades.csv", "xlsx")
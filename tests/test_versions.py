@@ -0,0 +1,47 @@
+from copypharm import loaders, versions
+
+import pandas as pd
+
+
+def localidades(n):
+    return pd.DataFrame(
+        {"id_localidad": range(n), "localidad": [f"L{i}" for i in range(n)]}
+    )
+
+
+def test_version_is_zero_before_any_load(sqlite_engine):
+    assert versions.load_version() == 0
+    assert versions.table_versions() == {}
+
+
+def test_loads_are_stamped_only_when_the_content_changes(sqlite_engine):
+    loader = loaders.LocalidadesLoader()
+    loader.load_table(localidades(5))
+    assert versions.load_version() == 1
+
+    loader.load_table(localidades(5))
+    assert versions.load_version() == 1
+
+    loaders.DepartamentosLoader().load_table(
+        pd.DataFrame({"id_departamento": [7], "departamento": ["D7"]})
+    )
+    changed = localidades(6)
+    changes = loader.upsert_table(changed)
+    assert len(changes.inserts) == 1
+    assert versions.load_version() == 3
+
+    latest = versions.table_versions()
+    assert latest["localidades"]["version"] == 3
+    assert latest["localidades"]["row_count"] == 6
+    assert latest["localidades"]["content_hash"] == (
+        versions.content_digest(changed)
+    )
+    assert latest["departamentos"]["version"] == 2
+
+
+def test_upsert_without_changes_keeps_the_version(sqlite_engine):
+    loader = loaders.LocalidadesLoader()
+    loader.load_table(localidades(5))
+    loader.upsert_table(localidades(5))
+
+    assert versions.load_version() == 1